@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark równoległych analiz dobowych
+======================================
+
+Zapisuje odczyty z podanej liczby dni do świeżej bazy, a następnie porównuje
+pętlę get_daily_statistics + analyze_color_spectrum po dniach (jeden rdzeń)
+z services.batch_analytics.BatchAnalytics dla różnej liczby procesów.
+Raportowany jest czas i przyspieszenie względem najmniejszej liczby
+procesów (domyślnie 1); przy skalowaniu bliskim liniowemu przyspieszenie
+rośnie proporcjonalnie do liczby procesów. Obok podawana jest liczba
+dostępnych rdzeni, udział czasu zadań w przebiegu jednoprocesowym i górna
+granica przyspieszenia z prawa Amdahla; liczba procesów większa od liczby
+rdzeni nie mierzy skalowania.
+
+Użycie:
+    python benchmarks/batch_analytics.py --days 365 --rows-per-day 2000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Dodaj ścieżkę do katalogu src do PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from database import db
+from database.operations import insert_sensor_rows
+from database.timeutils import to_epoch_us
+from services.analysis import SensorAnalysis
+from services.batch_analytics import BatchAnalytics, _aggregate_task, split_range
+from db_concurrency import make_rows
+
+def serial_loop(start: datetime, days: int) -> None:
+    """Dotychczasowy raport: wywołania dla każdego dnia po kolei."""
+    for day in range(days):
+        date = start + timedelta(days=day)
+        SensorAnalysis.get_daily_statistics(date)
+        SensorAnalysis.analyze_color_spectrum(date, date + timedelta(days=1))
+
+def available_cores() -> int:
+    """Liczba rdzeni dostępnych dla procesu (z uwzględnieniem przypisania do CPU)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def aggregate_tasks(start: datetime, end: datetime, unit: str) -> None:
+    """Zadania agregacji liczone po kolei (część zrównoleglana przez pulę)."""
+    for lo, hi in split_range(to_epoch_us(start), to_epoch_us(end), unit):
+        _aggregate_task((lo, hi, None))
+
+def timed(function, *args) -> float:
+    """Czas wywołania w sekundach."""
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+def main():
+    """Funkcja główna."""
+    parser = argparse.ArgumentParser(description="Benchmark równoległych analiz dobowych")
+    parser.add_argument('--days', type=int, default=365, help="Liczba dni danych")
+    parser.add_argument('--rows-per-day', type=int, default=2000, help="Odczyty na dzień")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--unit', default='day', help="Jednostka zadań (day/partition)")
+    args = parser.parse_args()
+
+    start = datetime(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", 'analytics-heavy')
+        db.init_db()
+        for day in range(args.days):
+            insert_sensor_rows(make_rows(start + timedelta(days=day), args.rows_per_day))
+        end = start + timedelta(days=args.days)
+
+        cores = available_cores()
+        print(f"rdzenie: {cores}, dni: {args.days}, odczyty na dzień: {args.rows_per_day}")
+        started = time.perf_counter()
+        serial_loop(start, args.days)
+        print(f"pętla po dniach: {time.perf_counter() - started:.2f} s")
+
+        single = min(timed(BatchAnalytics(1, args.unit).daily_report, start, end) for _ in range(3))
+        # Udział zadań w przebiegu jednoprocesowym; reszta (łączenie, raport) jest sekwencyjna
+        tasks = min(timed(aggregate_tasks, start, end, args.unit) for _ in range(3))
+        parallel = min(tasks / single, 1.0)
+        print(f"1 proces: {single:.2f} s, udział zadań: {parallel:.1%}")
+
+        print(f"{'procesy':>8} {'czas s':>8} {'przyspieszenie':>15} {'Amdahl':>8}")
+        baseline = None
+        for workers in sorted(set(args.workers)):
+            started = time.perf_counter()
+            BatchAnalytics(workers, args.unit).daily_report(start, end)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            bound = 1 / ((1 - parallel) + parallel / workers)
+            note = '' if workers <= cores else '  (więcej procesów niż rdzeni)'
+            print(f"{workers:>8} {elapsed:>8.2f} {baseline / elapsed:>15.2f} {bound:>8.2f}{note}")
+        db.get_engine().dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark współbieżnego zapisu i odczytu SQLite
+===============================================
+
+Porównuje profile strojenia silnika z database.db.ENGINE_PROFILES.
+Jeden wątek zapisuje paczki odczytów (jak IngestWriter), a kilka wątków
+czytelników wykonuje zapytania zakresowe o ostatnie odczyty (jak
+SensorAnalysis i RealTimeVisualizer). Dla każdego profilu raportowana jest
+przepustowość zapisu, liczba zapytań/s oraz liczba błędów blokady.
+
+Użycie:
+    python benchmarks/db_concurrency.py --duration 10 --readers 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Dodaj ścieżkę do katalogu src do PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import db
+from database.operations import insert_sensor_rows
+from database.timeutils import to_epoch_us
+
+def make_rows(start: datetime, count: int) -> list:
+    """Generuje syntetyczne wiersze sensor_readings co 1 s."""
+    rows = []
+    for i in range(count):
+        timestamp = start + timedelta(seconds=i)
+        rows.append({
+            'timestamp': timestamp,
+            'timestamp_us': to_epoch_us(timestamp),
+            'as7262_450nm': random.uniform(100, 1000),
+            'as7262_500nm': random.uniform(100, 1000),
+            'as7262_550nm': random.uniform(100, 1000),
+            'as7262_570nm': random.uniform(100, 1000),
+            'as7262_600nm': random.uniform(100, 1000),
+            'as7262_650nm': random.uniform(100, 1000),
+            'as7262_temperature': random.uniform(20, 40),
+            'tsl2591_lux': random.uniform(0, 60000),
+            'tsl2591_ir': random.uniform(0, 100),
+            'tsl2591_full': random.uniform(0, 1000),
+            'sen0611_cct': random.gauss(5500, 300),
+            'sen0611_als': random.uniform(0, 1000),
+            'latitude': 52.2297,
+            'longitude': 21.0122,
+            'altitude': 100.0,
+            'satellites': 8,
+            'ambient_temperature': random.uniform(10, 30)
+        })
+    return rows
+
+def run_profile(profile: str, duration: float, readers: int, batch_size: int) -> dict:
+    """Uruchamia benchmark dla jednego profilu na świeżej bazie."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile)
+        db.init_db()
+        start = datetime(2024, 1, 1)
+        insert_sensor_rows(make_rows(start, 10000))
+
+        stop = threading.Event()
+        counters = {'rows': 10000, 'commits': 0, 'queries': 0, 'busy': 0}
+        lock = threading.Lock()
+
+        def writer():
+            written = counters['rows']
+            while not stop.is_set():
+                rows = make_rows(start + timedelta(seconds=written), batch_size)
+                try:
+                    insert_sensor_rows(rows)
+                except OperationalError:
+                    with lock:
+                        counters['busy'] += 1
+                    continue
+                written += batch_size
+                with lock:
+                    counters['rows'] = written
+                    counters['commits'] += 1
+
+        def reader():
+            query = text(
+                "SELECT sen0611_cct, tsl2591_lux FROM sensor_readings "
+                "ORDER BY id DESC LIMIT 1000"
+            )
+            while not stop.is_set():
+                try:
+                    with db.get_engine().connect() as conn:
+                        conn.execute(query).fetchall()
+                except OperationalError:
+                    with lock:
+                        counters['busy'] += 1
+                    continue
+                with lock:
+                    counters['queries'] += 1
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        db.get_engine().dispose()
+
+        return {
+            'profile': profile,
+            'rows_per_second': (counters['rows'] - 10000) / duration,
+            'commits_per_second': counters['commits'] / duration,
+            'queries_per_second': counters['queries'] / duration,
+            'busy_errors': counters['busy']
+        }
+
+def main():
+    """Funkcja główna."""
+    parser = argparse.ArgumentParser(description="Benchmark profili silnika SQLite")
+    parser.add_argument('--duration', type=float, default=5.0, help="Czas trwania (s) na profil")
+    parser.add_argument('--readers', type=int, default=3, help="Liczba wątków czytelników")
+    parser.add_argument('--batch-size', type=int, default=50, help="Wiersze na commit")
+    parser.add_argument('--profiles', nargs='+',
+                        default=[name for name in db.ENGINE_PROFILES if name != 'read-only'])
+    args = parser.parse_args()
+
+    print(f"{'profil':<16} {'wiersze/s':>12} {'commity/s':>10} {'zapytania/s':>12} {'busy':>6}")
+    for profile in args.profiles:
+        result = run_profile(profile, args.duration, args.readers, args.batch_size)
+        print(f"{result['profile']:<16} {result['rows_per_second']:>12.0f} "
+              f"{result['commits_per_second']:>10.1f} {result['queries_per_second']:>12.1f} "
+              f"{result['busy_errors']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark układu zapisu partycji: wide vs packed
+================================================
+
+Dla każdego układu z database.packed.STORAGE_LAYOUTS zapisuje te same
+odczyty do partycji dziennych świeżej bazy, a następnie raportuje rozmiar
+tabel partycji na wiersz (z indeksami) oraz czas pełnego skanu wszystkich
+pomiarów i dwóch kolumn przez database.query.fetch_columns.
+
+Użycie:
+    python benchmarks/db_layout.py --rows 200000 --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Dodaj ścieżkę do katalogu src do PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import db, partitions
+from database.operations import insert_sensor_rows
+from database.packed import PACKED_COLUMNS, STORAGE_LAYOUTS
+from database.query import fetch_columns
+from db_concurrency import make_rows
+
+def partition_bytes(conn) -> int:
+    """Rozmiar tabel i indeksów partycji (dbstat) lub, bez dbstat, całego pliku bazy."""
+    try:
+        return conn.execute(text(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sensor_partitions) "
+            "OR tbl_name IN (SELECT name FROM sensor_partitions)"
+        )).scalar()
+    except OperationalError:
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        return page_size * conn.execute(text("PRAGMA page_count")).scalar()
+
+def best_time(func, repeat: int) -> float:
+    """Najkrótszy czas wykonania funkcji (s) z kilku powtórzeń."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def run_layout(layout: str, rows: list, repeat: int) -> dict:
+    """Uruchamia benchmark dla jednego układu na świeżej bazie."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", 'analytics-heavy')
+        db.init_db()
+        partitions.configure_partitioning('day')
+        partitions.configure_storage_layout(layout)
+        started = time.perf_counter()
+        for offset in range(0, len(rows), 5000):
+            insert_sensor_rows(rows[offset:offset + 5000])
+        insert_time = time.perf_counter() - started
+
+        with db.get_engine().connect() as conn:
+            conn.execute(text("VACUUM"))
+            size = partition_bytes(conn)
+
+        scan_all = best_time(lambda: fetch_columns(['timestamp'] + PACKED_COLUMNS), repeat)
+        scan_two = best_time(lambda: fetch_columns(['timestamp', 'sen0611_cct', 'tsl2591_lux']), repeat)
+        db.get_engine().dispose()
+
+    return {
+        'layout': layout,
+        'bytes_per_row': size / len(rows),
+        'insert_rows_per_second': len(rows) / insert_time,
+        'scan_all_rows_per_second': len(rows) / scan_all,
+        'scan_two_rows_per_second': len(rows) / scan_two
+    }
+
+def main():
+    """Funkcja główna."""
+    parser = argparse.ArgumentParser(description="Benchmark układu zapisu partycji (wide/packed)")
+    parser.add_argument('--rows', type=int, default=100000, help="Liczba odczytów")
+    parser.add_argument('--repeat', type=int, default=3, help="Powtórzenia skanu")
+    parser.add_argument('--layouts', nargs='+', default=list(STORAGE_LAYOUTS))
+    args = parser.parse_args()
+
+    rows = make_rows(datetime(2024, 1, 1), args.rows)
+    print(f"{'układ':<8} {'bajty/wiersz':>13} {'zapis w/s':>11} "
+          f"{'skan 13 kol. w/s':>17} {'skan 2 kol. w/s':>16}")
+    for layout in args.layouts:
+        result = run_layout(layout, rows, args.repeat)
+        print(f"{result['layout']:<8} {result['bytes_per_row']:>13.1f} "
+              f"{result['insert_rows_per_second']:>11.0f} "
+              f"{result['scan_all_rows_per_second']:>17.0f} {result['scan_two_rows_per_second']:>16.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,14 @@ import socket
 import json
 import logging
 from datetime import datetime
+from typing import Optional
 import sys
 import os
 
 # Dodaj ścieżkę do katalogu src do PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.operations import save_sensor_reading
+from database.ingest import IngestWriter
 from database.db import init_db
 
 # Konfiguracja logowania
@@ -23,18 +24,25 @@ logging.basicConfig(
 logger = logging.getLogger("DatabaseClient")
 
 class DatabaseClient:
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(self, host: str = "localhost", port: int = 8765,
+                 batch_size: int = 500, max_delay: float = 0.2,
+                 device_id: Optional[str] = None):
         """
         Inicjalizacja klienta bazy danych.
         
         Args:
             host: Adres hosta symulatora
             port: Port symulatora
+            batch_size: Liczba odczytów zapisywanych w jednym commicie
+            max_delay: Maksymalny czas (s) buforowania odczytu przed zapisem
+            device_id: Identyfikator urządzenia dla odczytów, które go nie zawierają
         """
         self.host = host
         self.port = port
+        self.device_id = device_id
         self.socket = None
         self.running = False
+        self.writer = IngestWriter(max_batch_size=batch_size, max_delay=max_delay)
         
         # Inicjalizacja bazy danych
         init_db()
@@ -54,6 +62,7 @@ class DatabaseClient:
     def start(self):
         """Rozpoczęcie odbierania i zapisywania danych."""
         self.running = True
+        self.writer.start()
         logger.info("Rozpoczęto odbieranie danych")
         
         while self.running:
@@ -68,10 +77,12 @@ class DatabaseClient:
                     try:
                         # Parsuj JSON
                         reading = json.loads(line)
+                        if self.device_id:
+                            reading.setdefault('device_id', self.device_id)
                         
-                        # Zapisz do bazy danych
-                        save_sensor_reading(reading)
-                        logger.debug(f"Zapisano odczyt: {reading['timestamp']}")
+                        # Dodaj do bufora zapisu (commit grupowy)
+                        self.writer.add(reading)
+                        logger.debug(f"Zbuforowano odczyt: {reading['timestamp']}")
                         
                     except json.JSONDecodeError as e:
                         logger.error(f"Błąd parsowania JSON: {e}")
@@ -89,13 +100,14 @@ class DatabaseClient:
     def stop(self):
         """Zatrzymanie klienta."""
         self.running = False
+        self.writer.stop()
         if self.socket:
             self.socket.close()
         logger.info("Zatrzymano klienta bazy danych")
 
 def main():
     """Funkcja główna."""
-    client = DatabaseClient()
+    client = DatabaseClient(device_id=os.environ.get('COLORSENSE_DEVICE_ID'))
     
     if client.connect():
         try:
@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+from database.query import fetch_columns
+from database.schema import ZONE_MAP_COLUMNS
+from utils.downsampling import DOWNSAMPLING_METHODS, downsample_indices
+
+logger = logging.getLogger("SeriesAPI")
+
+# Liczba punktów szeregu zwracana domyślnie i maksymalnie (koszt renderowania
+# wykresu po stronie dashboardu nie zależy od długości okna)
+DEFAULT_SERIES_POINTS = 1000
+MAX_SERIES_POINTS = 10000
+
+SERIES_PATH = '/api/series'
+
+# Kolumny pomiarowe dostępne jako szeregi (bez id, czasu i urządzenia)
+SERIES_COLUMNS = ZONE_MAP_COLUMNS
+
+def get_series(columns: List[str], start: datetime, end: datetime,
+               points: int = DEFAULT_SERIES_POINTS, method: str = 'minmax',
+               device_id: Optional[str] = None) -> dict:
+    """
+    Pobiera szeregi czasowe kolumn z okna, zredukowane do najwyżej points punktów.
+
+    Args:
+        columns: Kolumny pomiarowe z SERIES_COLUMNS
+        start: Początek okna (UTC)
+        end: Koniec okna (UTC, włącznie)
+        points: Maksymalna liczba punktów każdego szeregu
+        method: Metoda redukcji z DOWNSAMPLING_METHODS
+        device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+
+    Returns:
+        Dict z parametrami zapytania, liczbą odczytów w oknie ('source_points')
+        i 'series': kolumna -> {'timestamp_us': [...], 'values': [...]}
+    """
+    unknown = [column for column in columns if column not in SERIES_COLUMNS]
+    if unknown:
+        raise ValueError(f"Kolumny spoza pomiarów: {', '.join(unknown)}")
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Nieznana metoda redukcji punktów: {method}")
+    if not 3 <= points <= MAX_SERIES_POINTS:
+        raise ValueError(f"Liczba punktów musi być z zakresu 3-{MAX_SERIES_POINTS}")
+    data = fetch_columns(['timestamp_us'] + list(columns), start, end, device_id=device_id)
+    timestamps = data['timestamp_us']
+    series = {}
+    for column in columns:
+        indices = downsample_indices(timestamps, data[column], points, method)
+        series[column] = {
+            'timestamp_us': timestamps[indices].tolist(),
+            'values': data[column][indices].astype(float).tolist()
+        }
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'method': method,
+        'source_points': len(timestamps),
+        'series': series
+    }
+
+class SeriesRequestHandler(BaseHTTPRequestHandler):
+    """
+    Obsługa GET /api/series dla wykresów dashboardu.
+
+    Parametry: columns (lista rozdzielona przecinkami), start i end (ISO 8601,
+    UTC), opcjonalnie points, method i device_id.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != SERIES_PATH:
+            self._send_json(404, {'error': f"Nieznana ścieżka: {url.path}"})
+            return
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            columns = [name for name in params.get('columns', '').split(',') if name]
+            if not columns:
+                raise ValueError("Brak parametru columns")
+            if 'start' not in params or 'end' not in params:
+                raise ValueError("Wymagane parametry start i end")
+            result = get_series(
+                columns,
+                datetime.fromisoformat(params['start']),
+                datetime.fromisoformat(params['end']),
+                int(params.get('points', DEFAULT_SERIES_POINTS)),
+                params.get('method', 'minmax'),
+                params.get('device_id')
+            )
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Błąd zapytania {self.path}: {e}")
+            self._send_json(500, {'error': "Błąd serwera"})
+            return
+        self._send_json(200, result)
+
+    def _send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        # Dashboard jest serwowany statycznie z innego źródła
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def main():
+    """Uruchomienie serwera danych wykresów."""
+    parser = argparse.ArgumentParser(description="Serwer szeregów czasowych dla dashboardu")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ThreadingHTTPServer((args.host, args.port), SeriesRequestHandler)
+    logger.info(f"Serwer szeregów czasowych: http://{args.host}:{args.port}{SERIES_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
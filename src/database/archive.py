@@ -0,0 +1,466 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import delete, func, select, text
+from .db import DATA_DIR, get_engine
+from .packed import PACKED_COLUMN, table_columns, unpack_blobs
+from .partitions import CATALOG, drop_partition, partition_table
+from .schema import DEFAULT_DEVICE_ID, SensorReading
+from .timeutils import to_epoch_us, from_epoch_us
+from .zonemaps import zone_map_from_arrays
+
+logger = logging.getLogger("Archive")
+
+READINGS = SensorReading.__table__
+
+# Katalog archiwum kolumnowego (można nadpisać zmienną COLORSENSE_ARCHIVE_DIR)
+ARCHIVE_DIR = os.environ.get('COLORSENSE_ARCHIVE_DIR', os.path.join(DATA_DIR, 'archive'))
+
+# Archiwizowane kolumny; tekstowy timestamp jest odtwarzany z timestamp_us
+ARCHIVE_COLUMNS = [c.name for c in READINGS.columns if c.name != 'timestamp']
+
+DAY_US = 86400 * 1_000_000
+
+# Przyrostek katalogu segmentu, który nie jest jeszcze widoczny dla odczytów
+PENDING_SUFFIX = '.tmp'
+
+# Kolumny GPS zapisywane jako float64: float32 (ok. 7 cyfr znaczących) nie
+# zachowałby położenia z dokładnością do metrów (zob. database.packed)
+ARCHIVE_FLOAT64_COLUMNS = {'latitude', 'longitude', 'altitude'}
+
+def archive_dtype(name: str) -> np.dtype:
+    """
+    Typ kolumny w archiwum: int64 dla identyfikatora i czasu, int32 dla kodów
+    urządzeń (kodowanie słownikowe, słownik w meta.json), float64 dla GPS
+    i float32 dla pozostałych pomiarów.
+    """
+    if name in ('id', 'timestamp_us'):
+        return np.dtype(np.int64)
+    if name == 'device_id':
+        return np.dtype(np.int32)
+    if name in ARCHIVE_FLOAT64_COLUMNS:
+        return np.dtype(np.float64)
+    return np.dtype(np.float32)
+
+class ArchiveSegment:
+    """
+    Segment archiwum: katalog z plikami .npy (po jednym na kolumnę) i meta.json.
+
+    Kolumny są otwierane przez np.load(mmap_mode='r'), więc odczyt fragmentu
+    segmentu nie kopiuje danych, a system operacyjny wczytuje tylko dotknięte strony.
+    Wiersze są posortowane po timestamp_us.
+    """
+
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self.meta = meta
+        self.name = meta['name']
+        self.start_us = meta['start_us']
+        self.end_us = meta['end_us']
+        self.row_count = meta['row_count']
+        # Słownik urządzeń; segmenty sprzed device_id należą do urządzenia domyślnego
+        self.devices = meta.get('devices', [DEFAULT_DEVICE_ID])
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Zwraca kolumnę jako tablicę mapowaną w pamięci (tylko do odczytu).
+
+        Dla device_id zwracane są kody urządzeń (indeksy w self.devices).
+        """
+        if name not in self._columns:
+            path = os.path.join(self.path, f'{name}.npy')
+            if name == 'device_id' and not os.path.exists(path):
+                self._columns[name] = np.zeros(self.row_count, dtype=archive_dtype(name))
+            else:
+                self._columns[name] = np.load(path, mmap_mode='r')
+        return self._columns[name]
+
+    def device_code(self, device_id: str) -> Optional[int]:
+        """Kod urządzenia w słowniku segmentu lub None, jeśli segment nie ma jego odczytów."""
+        try:
+            return self.devices.index(device_id)
+        except ValueError:
+            return None
+
+    def decode_devices(self, codes: np.ndarray) -> np.ndarray:
+        """Zamienia kody urządzeń na identyfikatory (tablica object)."""
+        return np.array(self.devices, dtype=object)[codes]
+
+    @property
+    def zone_map(self) -> Dict[str, dict]:
+        """Mapa stref segmentu: kolumna -> {'min', 'max', 'count', 'null_count'}."""
+        if 'zone_map' not in self.meta:
+            # Segmenty zapisane przed wprowadzeniem map stref: liczone raz z plików
+            self.meta['zone_map'] = zone_map_from_arrays({
+                name: self.column(name) for name in self.meta['columns'] if archive_dtype(name).kind == 'f'
+            })
+        return self.meta['zone_map']
+
+    def slice_bounds(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                     end_inclusive: bool = True) -> tuple:
+        """Zwraca zakres indeksów wierszy z przedziału czasu (wyszukiwanie binarne)."""
+        timestamps = self.column('timestamp_us')
+        lo = 0 if start_us is None else int(np.searchsorted(timestamps, start_us, side='left'))
+        if end_us is None:
+            hi = len(timestamps)
+        else:
+            hi = int(np.searchsorted(timestamps, end_us, side='right' if end_inclusive else 'left'))
+        return lo, hi
+
+    def device_mask(self, lo: int, hi: int, device_id: str) -> np.ndarray:
+        """Maska wierszy urządzenia w zakresie indeksów [lo, hi)."""
+        code = self.device_code(device_id)
+        if code is None:
+            return np.zeros(hi - lo, dtype=bool)
+        return self.column('device_id')[lo:hi] == code
+
+    def count(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+              end_inclusive: bool = True, device_id: Optional[str] = None) -> int:
+        """Liczba wierszy z przedziału czasu (opcjonalnie jednego urządzenia)."""
+        lo, hi = self.slice_bounds(start_us, end_us, end_inclusive)
+        if device_id is None:
+            return hi - lo
+        return int(np.count_nonzero(self.device_mask(lo, hi, device_id)))
+
+    def read(self, columns: Sequence[str], start_us: Optional[int] = None,
+             end_us: Optional[int] = None, end_inclusive: bool = True,
+             device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Zwraca wybrane kolumny z przedziału czasu.
+
+        Bez filtra urządzenia kolumny pomiarowe są widokami (bez kopiowania);
+        device_id jest zwracane jako identyfikatory urządzeń.
+        """
+        lo, hi = self.slice_bounds(start_us, end_us, end_inclusive)
+        return self.read_rows(columns, lo, hi, device_id)
+
+    def read_rows(self, columns: Sequence[str], lo: int, hi: int,
+                  device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Jak read, ale dla zakresu indeksów wierszy [lo, hi)."""
+        mask = self.device_mask(lo, hi, device_id) if device_id is not None else None
+        arrays = {}
+        for name in columns:
+            values = self.column(name)[lo:hi]
+            if mask is not None:
+                values = values[mask]
+            arrays[name] = self.decode_devices(values) if name == 'device_id' else values
+        return arrays
+
+_segments_cache = {'mtime': None, 'segments': []}
+
+def list_segments() -> List[ArchiveSegment]:
+    """Zwraca segmenty archiwum posortowane po czasie (odczyt meta.json, z cache)."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    mtime = os.stat(ARCHIVE_DIR).st_mtime_ns
+    if _segments_cache['mtime'] != mtime:
+        segments = []
+        for entry in os.listdir(ARCHIVE_DIR):
+            if entry.endswith(PENDING_SUFFIX):
+                continue
+            meta_path = os.path.join(ARCHIVE_DIR, entry, 'meta.json')
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r') as f:
+                    segments.append(ArchiveSegment(os.path.join(ARCHIVE_DIR, entry), json.load(f)))
+        segments.sort(key=lambda segment: (segment.start_us, segment.name))
+        _segments_cache.update(mtime=mtime, segments=segments)
+    return _segments_cache['segments']
+
+def segments_in_range(start_us: Optional[int] = None, end_us: Optional[int] = None,
+                      device_id: Optional[str] = None) -> List[ArchiveSegment]:
+    """Zwraca segmenty nakładające się na zakres [start_us, end_us] (z odczytami urządzenia)."""
+    return [
+        segment for segment in list_segments()
+        if (start_us is None or segment.end_us > start_us)
+        and (end_us is None or segment.start_us <= end_us)
+        and (device_id is None or device_id in segment.devices)
+    ]
+
+def existing_keys(keys: Sequence[tuple]) -> set:
+    """
+    Zwraca klucze (device_id, timestamp_us) z listy, które są już w archiwum.
+
+    Dla każdego segmentu obejmującego klucze wykonywane jest wyszukiwanie
+    binarne po timestamp_us, więc koszt zależy od liczby kluczy, nie od
+    rozmiaru archiwum.
+    """
+    if not keys:
+        return set()
+    found = set()
+    timestamps = np.array([timestamp_us for _, timestamp_us in keys], dtype=np.int64)
+    for segment in segments_in_range(int(timestamps.min()), int(timestamps.max())):
+        inside = np.nonzero((timestamps >= segment.start_us) & (timestamps < segment.end_us))[0]
+        if not len(inside):
+            continue
+        column = segment.column('timestamp_us')
+        lo = np.searchsorted(column, timestamps[inside], side='left')
+        hi = np.searchsorted(column, timestamps[inside], side='right')
+        codes = segment.column('device_id')
+        for index, start, stop in zip(inside, lo, hi):
+            if start == stop:
+                continue
+            device_id = keys[index][0]
+            code = segment.device_code(device_id)
+            if code is not None and (codes[start:stop] == code).any():
+                found.add(keys[index])
+    return found
+
+def archive_horizon_us() -> Optional[int]:
+    """
+    Koniec najnowszego zarchiwizowanego zakresu.
+
+    Zapytania kończące się przed tą chwilą są obsługiwane wyłącznie z archiwum,
+    jeśli SQLite nie ma odczytów z ich zakresu (zob. query.archive_only).
+    """
+    segments = list_segments()
+    return max(segment.end_us for segment in segments) if segments else None
+
+def drop_segments_before(cutoff_us: int) -> Dict[str, int]:
+    """
+    Usuwa segmenty archiwum kończące się przed podaną chwilą (retencja).
+
+    Returns:
+        Dict nazwa segmentu -> liczba usuniętych odczytów
+    """
+    dropped = {}
+    for segment in list_segments():
+        if segment.end_us <= cutoff_us:
+            shutil.rmtree(segment.path)
+            dropped[segment.name] = segment.row_count
+    if dropped:
+        logger.info(f"Usunięto {len(dropped)} segmentów archiwum ({sum(dropped.values())} odczytów)")
+    return dropped
+
+def _read_table(conn, table, start_us: Optional[int], end_us: Optional[int]) -> Dict[str, np.ndarray]:
+    names = table_columns(table, ARCHIVE_COLUMNS)
+    query = select(*[table.c[name] for name in names])\
+        .where(table.c.timestamp_us.isnot(None))\
+        .order_by(table.c.timestamp_us, table.c.id)
+    if start_us is not None:
+        query = query.where(table.c.timestamp_us >= start_us)
+    if end_us is not None:
+        query = query.where(table.c.timestamp_us < end_us)
+    rows = conn.execute(query).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    # Wartości NULL stają się NaN w kolumnach zmiennoprzecinkowych
+    arrays = {}
+    for name, values in zip(names, columns):
+        if name == PACKED_COLUMN:
+            arrays.update(unpack_blobs(values))
+        else:
+            arrays[name] = np.array(values, dtype=object if name == 'device_id' else archive_dtype(name))
+    return arrays
+
+def write_segment(label: str, arrays: Dict[str, np.ndarray], start_us: int, end_us: int,
+                  publish: bool = True, source: Optional[dict] = None) -> ArchiveSegment:
+    """
+    Zapisuje segment archiwum (najpierw do katalogu tymczasowego, potem rename).
+
+    Args:
+        label: Etykieta segmentu (np. nazwa partycji lub dzień)
+        arrays: Kolumny segmentu posortowane po timestamp_us (device_id jako identyfikatory)
+        start_us: Początek zakresu segmentu (włącznie)
+        end_us: Koniec zakresu segmentu (wyłącznie)
+        publish: Czy od razu udostępnić segment; bez tego zostaje w katalogu
+            tymczasowym do publish_segment lub discard_segment
+        source: Tabela SQLite, z której pochodzą wiersze (do recover_pending_segments)
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    name = f'{label}_{time.time_ns() // 1000}'
+    tmp_path = os.path.join(ARCHIVE_DIR, name) + PENDING_SUFFIX
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    devices, codes = np.unique(arrays['device_id'].astype(str), return_inverse=True)
+    arrays = dict(arrays, device_id=codes.astype(archive_dtype('device_id')))
+    for column, values in arrays.items():
+        np.save(os.path.join(tmp_path, f'{column}.npy'), np.ascontiguousarray(values))
+    meta = {
+        'name': name,
+        'start_us': start_us,
+        'end_us': end_us,
+        'row_count': int(len(arrays['timestamp_us'])),
+        'devices': devices.tolist(),
+        'columns': {column: str(values.dtype) for column, values in arrays.items()},
+        'zone_map': zone_map_from_arrays(arrays),
+        'created_at': datetime.utcnow().isoformat()
+    }
+    if source is not None:
+        meta['source'] = source
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=4)
+    segment = ArchiveSegment(tmp_path, meta)
+    return publish_segment(segment) if publish else segment
+
+def publish_segment(segment: ArchiveSegment) -> ArchiveSegment:
+    """Udostępnia segment zapisany z publish=False (rename katalogu tymczasowego)."""
+    final_path = os.path.join(ARCHIVE_DIR, segment.name)
+    os.rename(segment.path, final_path)
+    return ArchiveSegment(final_path, segment.meta)
+
+def discard_segment(segment: ArchiveSegment) -> None:
+    """Usuwa segment zapisany z publish=False (np. po wycofaniu transakcji)."""
+    shutil.rmtree(segment.path, ignore_errors=True)
+
+def _source_has_rows(conn, source: dict) -> bool:
+    """Czy tabela źródłowa segmentu nadal zawiera jego pierwszy odczyt (transakcja niezatwierdzona)."""
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': source['table']}
+    ).first()
+    if exists is None:
+        return False
+    return conn.execute(
+        text(f'SELECT 1 FROM "{source["table"]}" WHERE device_id = :device_id AND timestamp_us = :timestamp_us'),
+        {'device_id': source['device_id'], 'timestamp_us': source['timestamp_us']}
+    ).first() is not None
+
+def recover_pending_segments() -> Dict[str, str]:
+    """
+    Kończy segmenty pozostawione przez przerwaną archiwizację.
+
+    Segment jest udostępniany, jeśli jego pierwszego odczytu nie ma już
+    w tabeli źródłowej (transakcja usuwająca wiersze została zatwierdzona),
+    a w przeciwnym razie usuwany (wiersze zostały w SQLite). Niekompletne
+    katalogi tymczasowe są usuwane.
+
+    Returns:
+        Dict nazwa segmentu -> 'published' lub 'discarded'
+    """
+    if not os.path.isdir(ARCHIVE_DIR):
+        return {}
+    recovered = {}
+    with get_engine().connect() as conn:
+        for entry in os.listdir(ARCHIVE_DIR):
+            if not entry.endswith(PENDING_SUFFIX):
+                continue
+            path = os.path.join(ARCHIVE_DIR, entry)
+            meta_path = os.path.join(path, 'meta.json')
+            if not os.path.exists(meta_path):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            with open(meta_path, 'r') as f:
+                segment = ArchiveSegment(path, json.load(f))
+            if 'source' not in segment.meta or _source_has_rows(conn, segment.meta['source']):
+                discard_segment(segment)
+                recovered[segment.name] = 'discarded'
+            else:
+                publish_segment(segment)
+                recovered[segment.name] = 'published'
+    if recovered:
+        logger.warning(f"Dokończono przerwaną archiwizację: {recovered}")
+    return recovered
+
+def _archive_rows(table, start_us: Optional[int], end_us: Optional[int], label: str,
+                  segment_start_us: int, segment_end_us: int, remove) -> Optional[ArchiveSegment]:
+    """
+    Archiwizuje wiersze tabeli z zakresu czasu i usuwa je z SQLite.
+
+    Segment jest zapisywany w katalogu tymczasowym przed usunięciem wierszy
+    (remove(conn)) i udostępniany dopiero po commicie, a przy wycofaniu
+    transakcji usuwany, więc wiersze nigdy nie są widoczne jednocześnie
+    w archiwum i w SQLite. Przerwanie procesu między commitem a rename
+    dokańcza recover_pending_segments.
+    """
+    pending = None
+    try:
+        with get_engine().begin() as conn:
+            arrays = _read_table(conn, table, start_us, end_us)
+            if len(arrays['timestamp_us']):
+                source = {
+                    'table': table.name,
+                    'device_id': str(arrays['device_id'][0]),
+                    'timestamp_us': int(arrays['timestamp_us'][0])
+                }
+                pending = write_segment(label, arrays, segment_start_us, segment_end_us,
+                                        publish=False, source=source)
+            remove(conn)
+    except BaseException:
+        if pending is not None:
+            discard_segment(pending)
+        raise
+    return publish_segment(pending) if pending is not None else None
+
+def archive_before(cutoff: datetime) -> Dict[str, int]:
+    """
+    Przenosi odczyty starsze niż cutoff z SQLite do archiwum kolumnowego.
+
+    Zamknięte partycje z katalogu (kończące się przed cutoff) stają się
+    osobnymi segmentami, a odczyty z sensor_readings są archiwizowane po
+    dniach; dni bez odczytów są pomijane (wyszukiwanie po indeksie
+    timestamp_us). Segment staje się widoczny dopiero po commicie
+    transakcji usuwającej jego wiersze (zob. _archive_rows).
+
+    Wartości kanałów (sensor_channel_values) nie są archiwizowane: zostają
+    w SQLite, gdzie czyta je fetch_channel_matrix, do czasu usunięcia przez
+    retencję (maintenance.expire_raw).
+
+    Args:
+        cutoff: Granica archiwizacji (zaokrąglana w dół do pełnej doby)
+
+    Returns:
+        Dict nazwa segmentu -> liczba zarchiwizowanych odczytów
+    """
+    cutoff_us = to_epoch_us(cutoff)
+    cutoff_us -= cutoff_us % DAY_US
+    archived = {}
+    recover_pending_segments()
+
+    with get_engine().connect() as conn:
+        partitions = conn.execute(
+            select(CATALOG.c.name, CATALOG.c.start_us, CATALOG.c.end_us)
+            .where(CATALOG.c.end_us <= cutoff_us)
+            .order_by(CATALOG.c.start_us)
+        ).fetchall()
+    for name, start_us, end_us in partitions:
+        segment = _archive_rows(partition_table(name), None, None, name, start_us, end_us,
+                                lambda conn, name=name: drop_partition(conn, name))
+        if segment is not None:
+            archived[segment.name] = segment.row_count
+
+    day_us = _next_reading_day(None, cutoff_us)
+    while day_us is not None:
+        def remove(conn, day_us=day_us):
+            conn.execute(delete(READINGS).where(
+                READINGS.c.timestamp_us >= day_us, READINGS.c.timestamp_us < day_us + DAY_US
+            ))
+
+        label = f'{READINGS.name}_{from_epoch_us(day_us):%Y%m%d}'
+        segment = _archive_rows(READINGS, day_us, day_us + DAY_US, label, day_us, day_us + DAY_US, remove)
+        if segment is not None:
+            archived[segment.name] = segment.row_count
+        day_us = _next_reading_day(day_us + DAY_US, cutoff_us)
+
+    if archived:
+        logger.info(f"Zarchiwizowano {sum(archived.values())} odczytów w {len(archived)} segmentach")
+    return archived
+
+def _next_reading_day(after_us: Optional[int], cutoff_us: int) -> Optional[int]:
+    """Początek najbliższego dnia z odczytami w sensor_readings od after_us i przed cutoff_us."""
+    query = select(func.min(READINGS.c.timestamp_us)).where(READINGS.c.timestamp_us < cutoff_us)
+    if after_us is not None:
+        query = query.where(READINGS.c.timestamp_us >= after_us)
+    with get_engine().connect() as conn:
+        oldest_us = conn.execute(query).scalar()
+    return oldest_us - oldest_us % DAY_US if oldest_us is not None else None
+
+def main():
+    """Archiwizacja z linii poleceń."""
+    from datetime import timedelta
+    from .db import init_db
+    parser = argparse.ArgumentParser(description="Archiwizacja starych odczytów do formatu kolumnowego")
+    parser.add_argument('--days', type=int, default=30, help="Archiwizuj odczyty starsze niż N dni")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    archive_before(datetime.utcnow() - timedelta(days=args.days))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from . import operations
+from .query import count_rows, fetch_columns, fetch_matching
+
+logger = logging.getLogger("AsyncDatabase")
+
+class AsyncDatabase:
+    """
+    Asynchroniczny odpowiednik database.operations dla usług opartych na asyncio.
+
+    Zapisy trafiają do kolejki asyncio.Queue; zadanie zbierające łączy je
+    w paczki (max_batch_size wierszy lub max_delay sekund) i zapisuje w jednym
+    dedykowanym wątku, więc SQLite ma zawsze jednego pisarza, a pętla
+    zdarzeń nie jest blokowana. Odczyty wykonuje pula wątków.
+    Pełna kolejka wstrzymuje producentów (backpressure).
+
+    Jeśli zapis paczki kilku żądań się nie powiedzie, każde żądanie jest
+    zapisywane ponownie osobno, więc błędny wiersz jednego wywołującego
+    nie powoduje błędu u pozostałych.
+    """
+
+    def __init__(self, max_batch_size: int = 500, max_delay: float = 0.2,
+                 read_workers: int = 4, queue_size: int = 10000,
+                 write_groups: Callable[[List[List[dict]]], List[int]] = operations.upsert_sensor_row_groups):
+        """
+        Args:
+            max_batch_size: Liczba wierszy wymuszająca commit
+            max_delay: Maksymalny czas (s) oczekiwania wiersza w kolejce
+            read_workers: Liczba wątków wykonujących odczyty
+            queue_size: Maksymalna liczba oczekujących żądań zapisu
+            write_groups: Funkcja zapisująca paczkę żądań (list wierszy) w jednej
+                transakcji; zwraca liczbę nowych wierszy każdego żądania
+        """
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.read_workers = read_workers
+        self.queue_size = queue_size
+        self.write_groups = write_groups
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+
+        # Statystyki zapisu
+        self._rows_submitted = 0
+        self._rows_written = 0
+        self._commits = 0
+        self._failed_rows = 0
+        self._duplicate_rows = 0
+
+    async def start(self) -> None:
+        """Uruchamia wątek zapisu, pulę odczytów i zadanie zbierające paczki."""
+        if self._writer_task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncDatabaseWriter")
+        self._read_executor = ThreadPoolExecutor(max_workers=self.read_workers,
+                                                 thread_name_prefix="AsyncDatabaseReader")
+        self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop())
+
+    async def stop(self) -> None:
+        """Zapisuje oczekujące odczyty i zatrzymuje wątki."""
+        if self._writer_task is None:
+            return
+        await self._queue.join()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+        self._writer_task = None
+        # Czekanie na trwające odczyty w osobnym wątku, aby nie blokować pętli zdarzeń
+        write_executor, read_executor = self._write_executor, self._read_executor
+        self._write_executor = self._read_executor = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(write_executor.shutdown, wait=True))
+        await loop.run_in_executor(None, functools.partial(read_executor.shutdown, wait=True))
+        logger.info(f"Statystyki zapisu: {self.get_stats()}")
+
+    async def __aenter__(self) -> "AsyncDatabase":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.stop()
+
+    # Zapis
+
+    async def _submit(self, rows: List[dict]) -> int:
+        if self._writer_task is None:
+            raise RuntimeError("AsyncDatabase nie jest uruchomiony (wywołaj start())")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        self._rows_submitted += len(rows)
+        return await future
+
+    async def save_sensor_reading(self, reading_data: dict) -> None:
+        """Zapisuje odczyt; kończy się po commicie paczki, do której trafił."""
+        await self._submit([operations.reading_to_row(reading_data)])
+
+    async def save_sensor_readings_bulk(self, readings: List[dict]) -> int:
+        """
+        Zapisuje wiele odczytów; kończy się po commicie paczki, do której trafiły.
+
+        Returns:
+            Liczba nowych (zapisanych) odczytów, jak operations.save_sensor_readings_bulk
+        """
+        rows = [operations.reading_to_row(r) for r in readings]
+        if not rows:
+            return 0
+        return await self._submit(rows)
+
+    async def _writer_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            rows, future = await self._queue.get()
+            batch = [(rows, future)]
+            size = len(rows)
+            deadline = loop.time() + self.max_delay
+            # Dobierz kolejne żądania do paczki, aż do limitu wierszy lub czasu
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    rows, future = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append((rows, future))
+                size += len(rows)
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: list) -> None:
+        try:
+            await self._write_requests(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _write_requests(self, batch: list) -> None:
+        """Zapisuje żądania (wiersze, future) jedną transakcją i rozwiązuje ich future."""
+        try:
+            written = await asyncio.get_running_loop().run_in_executor(
+                self._write_executor, self.write_groups, [rows for rows, _ in batch]
+            )
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning(f"Błąd zapisu paczki {len(batch)} żądań, zapis każdego osobno: {e}")
+                for request in batch:
+                    await self._write_requests([request])
+                return
+            rows, future = batch[0]
+            self._failed_rows += len(rows)
+            logger.error(f"Błąd zapisu {len(rows)} odczytów: {e}")
+            if not future.done():
+                future.set_exception(e)
+            return
+        self._commits += 1
+        for (rows, future), count in zip(batch, written):
+            self._rows_written += count
+            self._duplicate_rows += len(rows) - count
+            if not future.done():
+                future.set_result(count)
+
+    async def _write(self, func: Callable, *args, **kwargs) -> Any:
+        """Wykonuje operację zapisu w wątku pisarza (po kolei z paczkami odczytów)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_executor, functools.partial(func, *args, **kwargs))
+
+    async def save_calibration_data(self, sensor_type: str, parameters: dict) -> None:
+        """Zapisuje dane kalibracyjne dla czujnika."""
+        await self._write(operations.save_calibration_data, sensor_type, parameters)
+
+    async def save_ml_model(self, name: str, version: str, path: str,
+                            parameters: dict, metrics: dict) -> None:
+        """Zapisuje informacje o modelu ML."""
+        await self._write(operations.save_ml_model, name, version, path, parameters, metrics)
+
+    # Odczyt
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Wykonuje dowolną synchroniczną funkcję odczytu w puli wątków."""
+        if self._read_executor is None:
+            raise RuntimeError("AsyncDatabase nie jest uruchomiony (wywołaj start())")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, functools.partial(func, *args, **kwargs))
+
+    async def get_latest_readings(self, limit: int = 100, device_id: Optional[str] = None) -> list:
+        """Pobiera ostatnie odczyty z czujników."""
+        return await self.run(operations.get_latest_readings, limit, device_id)
+
+    async def get_latest_columns(self, columns: List[str], limit: int = 100,
+                                 device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Pobiera wybrane kolumny ostatnich odczytów jako tablice NumPy."""
+        return await self.run(operations.get_latest_columns, columns, limit, device_id)
+
+    async def fetch_columns(self, columns: List[str], start: Optional[datetime] = None,
+                            end: Optional[datetime] = None, **kwargs) -> Dict[str, np.ndarray]:
+        """Asynchroniczny odpowiednik query.fetch_columns."""
+        return await self.run(fetch_columns, columns, start, end, **kwargs)
+
+    async def fetch_matching(self, columns: List[str], predicates: list,
+                             start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             **kwargs) -> Dict[str, np.ndarray]:
+        """Asynchroniczny odpowiednik query.fetch_matching."""
+        return await self.run(fetch_matching, columns, predicates, start, end, **kwargs)
+
+    async def count_rows(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         **kwargs) -> int:
+        """Asynchroniczny odpowiednik query.count_rows."""
+        return await self.run(count_rows, start, end, **kwargs)
+
+    async def get_active_calibration(self, sensor_type: str) -> dict:
+        """Pobiera aktywne dane kalibracyjne dla czujnika."""
+        return await self.run(operations.get_active_calibration, sensor_type)
+
+    async def get_active_ml_model(self, name: str):
+        """Pobiera aktywny model ML."""
+        return await self.run(operations.get_active_ml_model, name)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Zwraca statystyki zapisu.
+
+        Returns:
+            Dict z liczbą przekazanych, zapisanych (nowych), zduplikowanych
+            i błędnych wierszy, liczbą commitów oraz długością kolejki
+        """
+        return {
+            'rows_submitted': self._rows_submitted,
+            'rows_written': self._rows_written,
+            'duplicate_rows': self._duplicate_rows,
+            'failed_rows': self._failed_rows,
+            'commits': self._commits,
+            'queued_requests': self._queue.qsize() if self._queue is not None else 0
+        }
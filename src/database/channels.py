@@ -0,0 +1,176 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .db import get_engine
+from .schema import DEFAULT_DEVICE_ID, SensorChannel, SensorChannelValue, SensorReading
+from .timeutils import to_epoch_us
+
+CHANNELS = SensorChannel.__table__
+CHANNEL_VALUES = SensorChannelValue.__table__
+
+# Klucz wiersza odczytu (w formacie reading_to_row) z wartościami kanałów: nazwa -> wartość
+CHANNELS_KEY = 'channels'
+
+# Cache rejestru kanałów w procesie: nazwa -> id (kanały nie są usuwane ani przemianowywane)
+_channel_ids: Dict[str, int] = {}
+_channel_lock = threading.Lock()
+
+def reset_channel_cache() -> None:
+    """Czyści cache identyfikatorów kanałów (np. po zmianie pliku bazy)."""
+    with _channel_lock:
+        _channel_ids.clear()
+
+def validate_channel_name(name: str) -> None:
+    """Zgłasza ValueError, jeśli nazwa nie może być kanałem (np. powtarza kolumnę sensor_readings)."""
+    if not isinstance(name, str) or not name:
+        raise ValueError(f"Nieprawidłowa nazwa kanału: {name!r}")
+    if name in SensorReading.__table__.c:
+        raise ValueError(f"Kanał {name} jest kolumną sensor_readings")
+
+def _register(conn, name: str, sensor: Optional[str] = None, unit: Optional[str] = None) -> int:
+    validate_channel_name(name)
+    conn.execute(
+        sqlite_insert(CHANNELS)
+        .values(name=name, sensor=sensor, unit=unit, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=['name'])
+    )
+    return conn.execute(select(CHANNELS.c.id).where(CHANNELS.c.name == name)).scalar()
+
+def register_channel(name: str, sensor: Optional[str] = None, unit: Optional[str] = None) -> int:
+    """
+    Rejestruje kanał pomiarowy (idempotentnie) i zwraca jego identyfikator.
+
+    Args:
+        name: Nazwa kanału (np. as7341_415nm); nie może powtarzać kolumny sensor_readings
+        sensor: Czujnik, do którego należy kanał
+        unit: Jednostka wartości
+
+    Returns:
+        Identyfikator kanału
+    """
+    if name in _channel_ids:
+        return _channel_ids[name]
+    with get_engine().begin() as conn:
+        channel_id = _register(conn, name, sensor, unit)
+    with _channel_lock:
+        _channel_ids[name] = channel_id
+    return channel_id
+
+def channel_ids(names: Sequence[str]) -> Dict[str, int]:
+    """Zwraca identyfikatory zarejestrowanych kanałów (ValueError dla nieznanych)."""
+    missing = [name for name in names if name not in _channel_ids]
+    if missing:
+        with get_engine().connect() as conn:
+            found = dict(conn.execute(
+                select(CHANNELS.c.name, CHANNELS.c.id).where(CHANNELS.c.name.in_(missing))
+            ).fetchall())
+        unknown = [name for name in missing if name not in found]
+        if unknown:
+            raise ValueError(f"Nieznane kanały: {', '.join(unknown)}")
+        with _channel_lock:
+            _channel_ids.update(found)
+    return {name: _channel_ids[name] for name in names}
+
+def list_channels() -> List[dict]:
+    """Zwraca zarejestrowane kanały (id, nazwa, czujnik, jednostka)."""
+    with get_engine().connect() as conn:
+        rows = conn.execute(select(CHANNELS).order_by(CHANNELS.c.id)).mappings().fetchall()
+    return [dict(row) for row in rows]
+
+def insert_channel_values(conn, rows: Sequence[dict], ignore_duplicates: bool = False) -> int:
+    """
+    Zapisuje wartości kanałów z wierszy odczytów (klucz 'channels') w wąskiej tabeli.
+
+    Wywoływane w transakcji zapisu odczytów; kanały nieobecne w rejestrze
+    są rejestrowane automatycznie (bez czujnika i jednostki) w tej samej
+    transakcji, więc trafiają do cache dopiero przy kolejnym odczycie rejestru.
+
+    Returns:
+        Liczba zapisanych wartości
+    """
+    registered: Dict[str, int] = {}
+    values = []
+    for row in rows:
+        channels = row.get(CHANNELS_KEY)
+        if not channels:
+            continue
+        device_id = row.get('device_id') or DEFAULT_DEVICE_ID
+        for name, value in channels.items():
+            channel_id = _channel_ids.get(name) or registered.get(name)
+            if channel_id is None:
+                channel_id = registered[name] = _register(conn, name)
+            values.append({
+                'channel_id': channel_id, 'timestamp_us': row['timestamp_us'],
+                'device_id': device_id, 'value': value
+            })
+    if values:
+        stmt = sqlite_insert(CHANNEL_VALUES)
+        conn.execute(stmt.on_conflict_do_nothing() if ignore_duplicates else stmt, values)
+    return len(values)
+
+def fetch_channel_matrix(channels: Sequence[str], start: Optional[datetime] = None,
+                         end: Optional[datetime] = None, end_inclusive: bool = True,
+                         device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Pobiera wartości kanałów z zakresu czasu jako gęstą macierz NumPy.
+
+    Wiersze wąskiej tabeli są obracane (pivot) wektorowo: każdy odczyt
+    (timestamp_us, device_id) to jeden wiersz macierzy, każdy kanał jedna
+    kolumna, a brakujące wartości to NaN.
+
+    Args:
+        channels: Nazwy kanałów (kolejność kolumn macierzy)
+        start: Początek zakresu (włącznie)
+        end: Koniec zakresu
+        end_inclusive: Czy koniec zakresu jest włączony
+        device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+
+    Returns:
+        Dict z 'timestamp' (datetime64[us]), 'timestamp_us', 'device_id'
+        (po jednym na wiersz, rosnąco po czasie) oraz 'values' (wiersze x kanały, float64)
+    """
+    ids = channel_ids(channels)
+    table = CHANNEL_VALUES
+    query = select(table.c.timestamp_us, table.c.device_id, table.c.channel_id, table.c.value)\
+        .where(table.c.channel_id.in_(list(ids.values())))\
+        .order_by(table.c.timestamp_us, table.c.device_id)
+    if device_id is not None:
+        query = query.where(table.c.device_id == device_id)
+    if start is not None:
+        query = query.where(table.c.timestamp_us >= to_epoch_us(start))
+    if end is not None:
+        end_us = to_epoch_us(end)
+        query = query.where(table.c.timestamp_us <= end_us if end_inclusive else table.c.timestamp_us < end_us)
+    with get_engine().connect() as conn:
+        rows = conn.execute(query).fetchall()
+
+    if rows:
+        timestamps, devices, channel_column, values = zip(*rows)
+    else:
+        timestamps, devices, channel_column, values = (), (), (), ()
+    timestamps = np.array(timestamps, dtype=np.int64)
+    devices = np.array(devices, dtype=object)
+    values = np.array(values, dtype=np.float64)
+
+    # Nowy wiersz macierzy zaczyna się przy każdej zmianie klucza (czas, urządzenie)
+    new_row = np.ones(len(timestamps), dtype=bool)
+    new_row[1:] = (timestamps[1:] != timestamps[:-1]) | (devices[1:] != devices[:-1])
+    row_index = np.cumsum(new_row) - 1
+    # Kolumna macierzy: pozycja identyfikatora kanału na liście channels
+    id_array = np.array([ids[name] for name in channels], dtype=np.int64)
+    order = np.argsort(id_array)
+    sorted_ids = id_array[order]
+    column_index = order[np.searchsorted(sorted_ids, np.array(channel_column, dtype=np.int64))]
+
+    matrix = np.full((int(new_row.sum()), len(channels)), np.nan)
+    matrix[row_index, column_index] = values
+    timestamps = timestamps[new_row]
+    return {
+        'timestamp': timestamps.view('datetime64[us]'),
+        'timestamp_us': timestamps,
+        'device_id': devices[new_row],
+        'values': matrix
+    }
@@ -1,25 +1,160 @@
 import os
-from sqlalchemy import create_engine
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from .schema import Base
+from .migrations import migrate_db
 
 # Ścieżka do katalogu data w głównym katalogu projektu
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-# Ścieżka do pliku bazy danych
-DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'colorsense.db')}"
+# Ścieżka do pliku bazy danych (można nadpisać zmienną COLORSENSE_DATABASE_URL)
+DATABASE_URL = os.environ.get(
+    'COLORSENSE_DATABASE_URL',
+    f"sqlite:///{os.path.join(DATA_DIR, 'colorsense.db')}"
+)
+
+# Profile strojenia SQLite ustawiane przez PRAGMA przy każdym połączeniu.
+#
+# legacy          - domyślne ustawienia SQLite (rollback journal, synchronous=FULL);
+#                   punkt odniesienia dla benchmarków
+# ingest-heavy    - WAL + synchronous=NORMAL: zapis nie blokuje czytelników, a commit
+#                   nie wymusza fsync (fsync tylko przy checkpoincie WAL); umiarkowany
+#                   cache i mmap, rzadszy autocheckpoint dla dużych paczek zapisu
+# analytics-heavy - WAL + synchronous=NORMAL z dużym cache stron i mmap dla skanów
+#                   zakresowych; dłuższy busy_timeout dla długich zapytań
+# read-only       - połączenia tylko do odczytu (adres z read_only_url) dla procesów
+#                   roboczych analiz; bez PRAGMA zmieniających plik bazy
+#
+# auto_vacuum=INCREMENTAL działa tylko dla nowych plików bazy (przed utworzeniem
+# pierwszej tabeli); istniejące pliki przełącza database.maintenance.
+ENGINE_PROFILES = {
+    'legacy': {},
+    'ingest-heavy': {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64 * 1024,          # 64 MiB (wartość ujemna = KiB)
+        'mmap_size': 256 * 1024 * 1024,    # 256 MiB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,              # ms
+        'wal_autocheckpoint': 4000,        # strony
+    },
+    'analytics-heavy': {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -256 * 1024,         # 256 MiB
+        'mmap_size': 1024 * 1024 * 1024,   # 1 GiB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,
+        'wal_autocheckpoint': 1000,
+    },
+    'read-only': {
+        'query_only': 'ON',
+        'cache_size': -64 * 1024,          # 64 MiB
+        'mmap_size': 1024 * 1024 * 1024,   # 1 GiB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get('COLORSENSE_DB_PROFILE', 'ingest-heavy')
+
+def _install_pragmas(engine, pragmas: dict) -> None:
+    """Rejestruje ustawianie PRAGMA przy każdym nowym połączeniu SQLite."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def create_db_engine(database_url: str = DATABASE_URL, profile: str = DEFAULT_PROFILE, **pragmas):
+    """
+    Tworzy silnik bazy danych z wybranym profilem strojenia SQLite.
+
+    Args:
+        database_url: Adres bazy danych
+        profile: Nazwa profilu z ENGINE_PROFILES
+        **pragmas: Dodatkowe lub nadpisujące wartości PRAGMA
+
+    Returns:
+        Silnik SQLAlchemy
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Nieznany profil bazy danych: {profile}")
+    new_engine = create_engine(database_url)
+    _install_pragmas(new_engine, {**ENGINE_PROFILES[profile], **pragmas})
+    return new_engine
 
 # Utworzenie silnika bazy danych
-engine = create_engine(DATABASE_URL)
+engine = create_db_engine()
 
 # Utworzenie sesji
 Session = sessionmaker(bind=engine)
 
+def configure_engine(database_url: Optional[str] = None, profile: Optional[str] = None, **pragmas):
+    """
+    Zastępuje globalny silnik bazy danych (np. zmiana profilu lub pliku bazy).
+
+    Args:
+        database_url: Adres bazy danych (domyślnie bieżący)
+        profile: Nazwa profilu z ENGINE_PROFILES (domyślnie DEFAULT_PROFILE)
+        **pragmas: Dodatkowe lub nadpisujące wartości PRAGMA
+
+    Returns:
+        Nowy silnik SQLAlchemy
+    """
+    global engine
+    from .channels import reset_channel_cache
+    from .operations import invalidate_active_cache
+    from .partitions import reset_known_partitions
+    from .window_cache import invalidate_window_cache
+    url = database_url or engine.url.render_as_string(hide_password=False)
+    new_engine = create_db_engine(url, profile or DEFAULT_PROFILE, **pragmas)
+    engine.dispose()
+    engine = new_engine
+    Session.configure(bind=engine)
+    # Partycje, kanały, kalibracje, modele i okna odczytów zapamiętane dla
+    # poprzedniego pliku bazy nie muszą istnieć w nowym
+    reset_known_partitions()
+    reset_channel_cache()
+    invalidate_active_cache()
+    invalidate_window_cache()
+    return engine
+
+def read_only_url(database_url: Optional[str] = None) -> str:
+    """
+    Zwraca adres pliku bazy SQLite otwieranego tylko do odczytu (URI mode=ro).
+
+    Args:
+        database_url: Adres bazy danych (domyślnie bieżący)
+    """
+    url = make_url(database_url or engine.url.render_as_string(hide_password=False))
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise ValueError(f"Tryb tylko do odczytu wymaga pliku bazy SQLite: {url}")
+    path = url.database
+    if path.startswith('file:'):
+        path = path[len('file:'):].split('?', 1)[0]
+    return f"sqlite:///file:{os.path.abspath(path)}?mode=ro&uri=true"
+
 def init_db():
-    """Inicjalizacja bazy danych i utworzenie wszystkich tabel."""
+    """Inicjalizacja bazy danych, utworzenie wszystkich tabel i migracja schematu."""
     Base.metadata.create_all(engine)
+    migrate_db(engine)
+
+def get_engine():
+    """Zwraca silnik bazy danych."""
+    return engine
 
 def get_session():
     """Zwraca nową sesję bazy danych."""
@@ -27,4 +162,4 @@ def get_session():
 
 def close_session(session):
     """Zamyka sesję bazy danych."""
-    session.close() 
\ No newline at end of file
+    session.close()
@@ -0,0 +1,333 @@
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .db import get_engine
+from .query import iter_column_chunks, oldest_reading_us
+from .schema import DEFAULT_DEVICE_ID, ROLLUP_RESOLUTIONS, ROLLUP_TABLES, SensorHistogram
+from .timeutils import to_epoch_us, from_epoch_us
+
+logger = logging.getLogger("Histograms")
+
+HISTOGRAMS = SensorHistogram.__table__
+
+# Szerokość kubełka histogramów (godzina, jak rollup 1h)
+HISTOGRAM_WIDTH_US = ROLLUP_RESOLUTIONS['1h']
+
+# Przedziały histogramów: kolumna -> (skala, dolna granica, górna granica, liczba przedziałów).
+# Skala log daje stały błąd względny kwantyla (dla 256 przedziałów na 6 rzędów
+# wielkości szerokość przedziału to ~5,5% wartości); wartości spoza zakresu
+# trafiają do skrajnych przedziałów.
+HISTOGRAM_BINS = {
+    'as7262_450nm': ('log', 0.1, 1e5, 256),
+    'as7262_500nm': ('log', 0.1, 1e5, 256),
+    'as7262_550nm': ('log', 0.1, 1e5, 256),
+    'as7262_570nm': ('log', 0.1, 1e5, 256),
+    'as7262_600nm': ('log', 0.1, 1e5, 256),
+    'as7262_650nm': ('log', 0.1, 1e5, 256),
+    'sen0611_cct': ('linear', 1000.0, 20000.0, 380),   # przedziały po 50 K
+}
+HISTOGRAM_COLUMNS = list(HISTOGRAM_BINS)
+
+COUNT_DTYPE = np.dtype('<u4')
+
+# Liczba kluczy w jednym zapytaniu o istniejące histogramy (3 parametry na klucz)
+KEY_LOOKUP_BATCH = 300
+
+_edges: Dict[str, np.ndarray] = {}
+
+def bin_edges(column: str) -> np.ndarray:
+    """Zwraca granice przedziałów histogramu kolumny (liczba przedziałów + 1)."""
+    if column not in _edges:
+        if column not in HISTOGRAM_BINS:
+            raise ValueError(f"Brak histogramu dla kolumny: {column}")
+        scale, low, high, bins = HISTOGRAM_BINS[column]
+        space = np.geomspace if scale == 'log' else np.linspace
+        _edges[column] = space(low, high, bins + 1)
+    return _edges[column]
+
+def bin_index(column: str, values: np.ndarray) -> np.ndarray:
+    """Zwraca numery przedziałów dla wartości (bez NaN); wartości spoza zakresu są przycinane."""
+    scale, low, high, bins = HISTOGRAM_BINS[column]
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if scale == 'log':
+            position = np.log(values / low) / np.log(high / low)
+        else:
+            position = (values - low) / (high - low)
+    position = np.nan_to_num(position, nan=0.0, neginf=0.0, posinf=1.0)
+    return np.clip((position * bins).astype(np.int64), 0, bins - 1)
+
+def _encode(counts: np.ndarray) -> tuple:
+    """Zwraca (first_bin, blob) dla zakresu niepustych przedziałów."""
+    nonzero = np.flatnonzero(counts)
+    if not len(nonzero):
+        return 0, b''
+    first, last = nonzero[0], nonzero[-1]
+    return int(first), counts[first:last + 1].astype(COUNT_DTYPE).tobytes()
+
+def _add_encoded(target: np.ndarray, first_bin: int, blob: bytes) -> None:
+    """Dodaje zapisane liczności do pełnej tablicy przedziałów."""
+    counts = np.frombuffer(blob, dtype=COUNT_DTYPE)
+    target[first_bin:first_bin + len(counts)] += counts
+
+def histogram_arrays(arrays: Dict[str, np.ndarray]) -> Dict[tuple, np.ndarray]:
+    """
+    Liczy histogramy kubełków godzinnych z kolumn NumPy.
+
+    Args:
+        arrays: Kolumny 'timestamp_us', 'device_id' i HISTOGRAM_COLUMNS (NaN = brak wartości)
+
+    Returns:
+        Dict (kolumna, początek godziny µs, urządzenie) -> liczności przedziałów (int64)
+    """
+    timestamps = np.asarray(arrays['timestamp_us'], dtype=np.int64)
+    if not len(timestamps):
+        return {}
+    buckets = timestamps - timestamps % HISTOGRAM_WIDTH_US
+    # Grupy (kubełek, urządzenie) numerowane w kolejności pierwszego wystąpienia
+    groups: Dict[tuple, int] = {}
+    group_index = np.fromiter(
+        (groups.setdefault(key, len(groups)) for key in zip(buckets.tolist(), arrays['device_id'])),
+        dtype=np.int64, count=len(timestamps)
+    )
+    result = {}
+    for column in HISTOGRAM_COLUMNS:
+        values = np.asarray(arrays[column], dtype=np.float64)
+        valid = ~np.isnan(values)
+        bins = HISTOGRAM_BINS[column][3]
+        flat = group_index[valid] * bins + bin_index(column, values[valid])
+        counts = np.bincount(flat, minlength=len(groups) * bins).reshape(len(groups), bins)
+        for (bucket_us, device_id), group in groups.items():
+            if counts[group].any():
+                result[(column, bucket_us, device_id)] = counts[group]
+    return result
+
+def _rows_to_arrays(rows: List[dict]) -> Dict[str, np.ndarray]:
+    arrays = {
+        'timestamp_us': np.fromiter((row['timestamp_us'] for row in rows), dtype=np.int64, count=len(rows)),
+        'device_id': [row.get('device_id') or DEFAULT_DEVICE_ID for row in rows]
+    }
+    for column in HISTOGRAM_COLUMNS:
+        arrays[column] = np.array([row.get(column) for row in rows], dtype=np.float64)
+    return arrays
+
+_upsert = sqlite_insert(HISTOGRAMS)
+_upsert = _upsert.on_conflict_do_update(
+    index_elements=['column_name', 'bucket_us', 'device_id'],
+    set_={'first_bin': _upsert.excluded.first_bin, 'counts': _upsert.excluded.counts,
+          'count': _upsert.excluded['count']}
+)
+
+def _write(conn, histograms: Dict[tuple, np.ndarray], merge: bool) -> None:
+    """Zapisuje histogramy kubełków; z merge=True dodaje je do już zapisanych."""
+    keys = list(histograms)
+    if merge:
+        for offset in range(0, len(keys), KEY_LOOKUP_BATCH):
+            batch = keys[offset:offset + KEY_LOOKUP_BATCH]
+            key = tuple_(HISTOGRAMS.c.column_name, HISTOGRAMS.c.bucket_us, HISTOGRAMS.c.device_id)
+            existing = conn.execute(
+                select(HISTOGRAMS.c.column_name, HISTOGRAMS.c.bucket_us, HISTOGRAMS.c.device_id,
+                       HISTOGRAMS.c.first_bin, HISTOGRAMS.c.counts)
+                .where(key.in_(batch))
+            )
+            for column, bucket_us, device_id, first_bin, blob in existing:
+                _add_encoded(histograms[(column, bucket_us, device_id)], first_bin, blob)
+    values = []
+    for (column, bucket_us, device_id), counts in histograms.items():
+        first_bin, blob = _encode(counts)
+        values.append({
+            'column_name': column, 'bucket_us': bucket_us, 'device_id': device_id,
+            'first_bin': first_bin, 'counts': blob, 'count': int(counts.sum())
+        })
+    if values:
+        conn.execute(_upsert, values)
+
+def update_histograms(conn, rows: List[dict]) -> None:
+    """
+    Przyrostowo aktualizuje histogramy godzinne o paczkę nowych wierszy.
+
+    Wywoływane w tej samej transakcji co zapis odczytów (jak update_rollups).
+    """
+    if rows:
+        _write(conn, histogram_arrays(_rows_to_arrays(rows)), merge=True)
+
+def history_range(conn) -> Optional[tuple]:
+    """
+    Zakres dób z odczytami według rollupu dobowego (obejmuje też archiwum).
+
+    Returns:
+        (początek, koniec wyłącznie) w µs lub None, jeśli nie ma odczytów
+    """
+    rollup = ROLLUP_TABLES['1d']
+    first_us, last_us = conn.execute(select(func.min(rollup.c.bucket_us), func.max(rollup.c.bucket_us))).first()
+    if first_us is None:
+        return None
+    return first_us, last_us + ROLLUP_RESOLUTIONS['1d']
+
+def rebuild_histograms(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       chunk_size: int = 50000, conn=None) -> int:
+    """
+    Przelicza histogramy od nowa z odczytów (SQLite, partycje i archiwum).
+
+    Zakres jest rozszerzany do pełnych godzin i przetwarzany po jednej dobie,
+    więc pamięć zależy od liczby kubełków doby, a nie od długości zakresu.
+    Zaczyna się najwcześniej od godziny najstarszego zachowanego odczytu:
+    histogramy dni usuniętych przez retencję nie są kasowane.
+
+    Args:
+        start: Początek zakresu (domyślnie pierwsza doba z odczytami)
+        end: Koniec zakresu, wyłącznie (domyślnie koniec ostatniej doby z odczytami)
+        chunk_size: Liczba odczytów w paczce odczytu
+        conn: Połączenie z otwartą transakcją (np. w migracji), używane do
+            odczytu i zapisu; domyślnie osobna transakcja na każdą dobę
+
+    Returns:
+        Liczba zapisanych histogramów kubełków
+    """
+    if conn is not None:
+        oldest_us, bounds = oldest_reading_us(conn), history_range(conn)
+    else:
+        with get_engine().connect() as read_conn:
+            oldest_us, bounds = oldest_reading_us(read_conn), history_range(read_conn)
+    if oldest_us is None or bounds is None and (start is None or end is None):
+        return 0
+    explicit_start = start is not None
+    if start is None or end is None:
+        start = start or from_epoch_us(bounds[0])
+        end = end or from_epoch_us(bounds[1])
+    start_us = to_epoch_us(start)
+    start_us -= start_us % HISTOGRAM_WIDTH_US
+    end_us = to_epoch_us(end)
+    if end_us % HISTOGRAM_WIDTH_US:
+        end_us += HISTOGRAM_WIDTH_US - end_us % HISTOGRAM_WIDTH_US
+    # Rollup dobowy przeżywa retencję surowych odczytów: godziny sprzed
+    # najstarszego odczytu nie mają z czego zostać przeliczone, więc ich
+    # histogramy pozostają bez zmian (jak w rebuild_rollups)
+    oldest_us -= oldest_us % HISTOGRAM_WIDTH_US
+    if start_us < oldest_us:
+        if explicit_start:
+            logger.warning(f"Zakres przebudowy histogramów obcięty do najstarszego odczytu ({from_epoch_us(oldest_us)})")
+        start_us = oldest_us
+    if end_us <= start_us:
+        return 0
+    day_us = ROLLUP_RESOLUTIONS['1d']
+    written = 0
+    for lo in range(start_us, end_us, day_us):
+        hi = min(lo + day_us, end_us)
+        histograms: Dict[tuple, np.ndarray] = {}
+        for arrays in iter_column_chunks(['timestamp_us', 'device_id'] + HISTOGRAM_COLUMNS,
+                                         from_epoch_us(lo), from_epoch_us(hi), end_inclusive=False,
+                                         chunk_size=chunk_size, conn=conn):
+            for key, counts in histogram_arrays(arrays).items():
+                if key in histograms:
+                    histograms[key] += counts
+                else:
+                    histograms[key] = counts
+        if conn is not None:
+            _replace_day(conn, lo, hi, histograms)
+        else:
+            with get_engine().begin() as day_conn:
+                _replace_day(day_conn, lo, hi, histograms)
+        written += len(histograms)
+    logger.info(f"Przebudowano histogramy: {written} kubełków")
+    return written
+
+def _replace_day(conn, lo: int, hi: int, histograms: Dict[tuple, np.ndarray]) -> None:
+    conn.execute(delete(HISTOGRAMS).where(HISTOGRAMS.c.bucket_us >= lo, HISTOGRAMS.c.bucket_us < hi))
+    _write(conn, histograms, merge=False)
+
+def get_histograms(columns: Sequence[str], start: datetime, end: datetime,
+                   device_id: Optional[str] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Łączy histogramy kubełków godzinnych okna w jeden histogram na kolumnę.
+
+    Uwzględniane są kubełki zaczynające się w [początek godziny start, end),
+    więc niepełne godziny na krańcach okna są liczone w całości. Wiersze
+    są sumowane strumieniowo: pamięć to O(przedziały), czas O(kubełki).
+
+    Args:
+        columns: Kolumny z HISTOGRAM_COLUMNS
+        start: Początek okna
+        end: Koniec okna (wyłącznie)
+        device_id: Urządzenie (domyślnie wszystkie urządzenia łącznie)
+
+    Returns:
+        Dict kolumna -> {'edges': granice przedziałów, 'counts': liczności (int64)}
+    """
+    start_us = to_epoch_us(start)
+    start_us -= start_us % HISTOGRAM_WIDTH_US
+    result = {
+        column: {'edges': bin_edges(column), 'counts': np.zeros(HISTOGRAM_BINS[column][3], dtype=np.int64)}
+        for column in columns
+    }
+    query = select(HISTOGRAMS.c.column_name, HISTOGRAMS.c.first_bin, HISTOGRAMS.c.counts)\
+        .where(HISTOGRAMS.c.column_name.in_(list(columns)),
+               HISTOGRAMS.c.bucket_us >= start_us, HISTOGRAMS.c.bucket_us < to_epoch_us(end))
+    if device_id is not None:
+        query = query.where(HISTOGRAMS.c.device_id == device_id)
+    with get_engine().connect() as conn:
+        for column, first_bin, blob in conn.execute(query):
+            _add_encoded(result[column]['counts'], first_bin, blob)
+    return result
+
+def histogram_quantiles(counts: np.ndarray, edges: np.ndarray, quantiles: Sequence[float],
+                        log_scale: bool = False) -> List[float]:
+    """
+    Szacuje kwantyle z histogramu (interpolacja wewnątrz przedziału).
+
+    Błąd oszacowania nie przekracza szerokości przedziału zawierającego kwantyl.
+
+    Returns:
+        Wartości kwantyli (NaN dla pustego histogramu)
+    """
+    total = counts.sum()
+    if not total:
+        return [float('nan')] * len(quantiles)
+    cumulative = np.cumsum(counts)
+    targets = np.clip(np.asarray(quantiles, dtype=np.float64), 0.0, 1.0) * total
+    index = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(counts) - 1)
+    before = cumulative[index] - counts[index]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.nan_to_num((targets - before) / counts[index], nan=0.0)
+    low, high = edges[index], edges[index + 1]
+    if log_scale:
+        values = low * (high / low) ** fraction
+    else:
+        values = low + (high - low) * fraction
+    return values.tolist()
+
+def get_quantiles(columns: Sequence[str], start: datetime, end: datetime,
+                  quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+                  device_id: Optional[str] = None) -> Dict[str, List[float]]:
+    """
+    Szacuje kwantyle kolumn w oknie z histogramów kubełków godzinnych (zob. get_histograms).
+
+    Returns:
+        Dict kolumna -> wartości kwantyli w kolejności quantiles
+    """
+    histograms = get_histograms(columns, start, end, device_id)
+    return {
+        column: histogram_quantiles(
+            histogram['counts'], histogram['edges'], quantiles, HISTOGRAM_BINS[column][0] == 'log'
+        )
+        for column, histogram in histograms.items()
+    }
+
+def main():
+    """Przebudowa histogramów z linii poleceń."""
+    from .db import init_db
+    parser = argparse.ArgumentParser(description="Przebudowa histogramów godzinnych z odczytów")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Początek zakresu (ISO 8601)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Koniec zakresu (ISO 8601)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    rebuild_histograms(args.start, args.end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.exc import OperationalError
+from .operations import reading_to_row, upsert_sensor_rows
+
+logger = logging.getLogger("IngestWriter")
+
+# Komunikaty SQLite błędów przejściowych (blokada zajęta przez innego pisarza);
+# pozostałe OperationalError (np. no such table, disk I/O error) są trwałe
+TRANSIENT_ERROR_MESSAGES = ('database is locked', 'database table is locked')
+
+def is_transient_error(error: Exception) -> bool:
+    """Czy błąd zapisu jest przejściowy, tzn. ponowienie może się powieść."""
+    if not isinstance(error, OperationalError):
+        return False
+    message = str(error.orig if error.orig is not None else error).lower()
+    return any(text in message for text in TRANSIENT_ERROR_MESSAGES)
+
+class IngestWriter:
+    """
+    Bufor zapisu odczytów grupujący commity według rozmiaru lub czasu.
+
+    Odczyty są mapowane na wiersze w momencie dodania (błędy danych trafiają
+    od razu do wywołującego), a zapis odbywa się paczkami przez
+    upsert_sensor_rows, gdy bufor osiągnie max_batch_size wierszy lub gdy
+    od pierwszego buforowanego wiersza minie max_delay sekund. Powtórzone
+    odczyty (ten sam device_id i czas) są pomijane i liczone jako duplikaty.
+
+    Przejściowy błąd zapisu (blokada bazy, zob. is_transient_error)
+    nie gubi paczki: wiersze wracają na początek bufora, a zapis jest
+    ponawiany z wykładniczo rosnącym odstępem. Bufor jest ograniczony do
+    max_buffered_rows wierszy; przy przepełnieniu odrzucane są najstarsze.
+
+    Błąd trwały nie jest zgłaszany do wywołującego add() ani stop() (pętla
+    akwizycji działa dalej): paczka jest logowana, liczona jako błędna
+    i przekazywana do on_failed (np. kwarantanna do pliku), a potem odrzucana.
+    """
+
+    def __init__(self, max_batch_size: int = 500, max_delay: float = 0.2,
+                 write_rows: Callable[[List[dict]], int] = upsert_sensor_rows,
+                 stats_interval: float = 10.0, max_buffered_rows: int = 100_000,
+                 retry_delay: float = 0.5, max_retry_delay: float = 30.0,
+                 on_failed: Optional[Callable[[List[dict], Exception], None]] = None):
+        """
+        Inicjalizacja bufora zapisu.
+
+        Args:
+            max_batch_size: Liczba wierszy wymuszająca commit
+            max_delay: Maksymalny czas (s) oczekiwania wiersza w buforze
+            write_rows: Funkcja zapisująca paczkę wierszy (zwraca liczbę nowych wierszy)
+            stats_interval: Co ile sekund logować statystyki (0 wyłącza)
+            max_buffered_rows: Maksymalna liczba wierszy w buforze (także przy ponawianiu)
+            retry_delay: Odstęp (s) pierwszego ponowienia po błędzie przejściowym
+            max_retry_delay: Maksymalny odstęp (s) między ponowieniami
+            on_failed: Funkcja wywoływana z paczką odrzuconą po błędzie trwałym i tym błędem
+        """
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.write_rows = write_rows
+        self.stats_interval = stats_interval
+        self.max_buffered_rows = max(max_buffered_rows, max_batch_size)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.on_failed = on_failed
+        # Ostatni błąd trwały (paczka odrzucona)
+        self.last_error: Optional[Exception] = None
+
+        self._buffer: List[dict] = []
+        self._first_buffered_at: Optional[float] = None
+        # Ponawianie po błędzie przejściowym: kolejna próba nie wcześniej niż _retry_at
+        self._retry_at: Optional[float] = None
+        self._retry_attempts = 0
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Statystyki zapisu
+        self._started_at = time.monotonic()
+        self._last_stats_log = self._started_at
+        self._rows_written = 0
+        self._commits = 0
+        self._failed_rows = 0
+        self._failed_batches = 0
+        self._duplicate_rows = 0
+        self._retries = 0
+        self._commit_latencies = deque(maxlen=1000)
+
+    def add(self, reading_data: dict) -> None:
+        """Dodaje odczyt do bufora; zapisuje paczkę, jeśli bufor jest pełny."""
+        self.add_row(reading_to_row(reading_data))
+
+    def add_row(self, row: dict) -> None:
+        """Dodaje gotowy wiersz sensor_readings do bufora."""
+        with self._buffer_lock:
+            if not self._buffer:
+                self._first_buffered_at = time.monotonic()
+            self._buffer.append(row)
+            self._trim_buffer()
+            full = len(self._buffer) >= self.max_batch_size
+        if (full and not self._backing_off()) or self._is_due():
+            self.flush()
+
+    def _backing_off(self) -> bool:
+        return self._retry_at is not None and time.monotonic() < self._retry_at
+
+    def _is_due(self) -> bool:
+        first = self._first_buffered_at
+        return first is not None and time.monotonic() - first >= self.max_delay and not self._backing_off()
+
+    def _trim_buffer(self) -> None:
+        """Odrzuca najstarsze wiersze ponad max_buffered_rows (wywoływane pod _buffer_lock)."""
+        overflow = len(self._buffer) - self.max_buffered_rows
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self._failed_rows += overflow
+            logger.error(f"Bufor zapisu przepełniony: odrzucono {overflow} najstarszych odczytów")
+
+    def flush(self) -> int:
+        """
+        Zapisuje zawartość bufora w jednej transakcji.
+
+        Przy błędzie przejściowym wiersze wracają do bufora, a przy błędzie
+        trwałym paczka jest odrzucana (zob. _drop_failed); w obu przypadkach
+        zwraca 0 bez zgłaszania błędu.
+
+        Returns:
+            Liczba zapisanych (nowych) wierszy
+        """
+        with self._write_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+                self._first_buffered_at = None
+            if not rows:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                written = self.write_rows(rows)
+            except Exception as e:
+                if is_transient_error(e):
+                    self._requeue(rows, e)
+                    return 0
+                self._drop_failed(rows, e)
+                return 0
+            latency = time.perf_counter() - started
+
+            self._rows_written += written
+            self._duplicate_rows += len(rows) - written
+            self._commits += 1
+            self._commit_latencies.append(latency)
+            self._retry_at = None
+            self._retry_attempts = 0
+
+        self._maybe_log_stats()
+        return written
+
+    def _drop_failed(self, rows: List[dict], error: Exception) -> None:
+        """Liczy paczkę jako błędną i przekazuje ją do on_failed (błąd trwały)."""
+        self._failed_rows += len(rows)
+        self._failed_batches += 1
+        self.last_error = error
+        logger.error(f"Błąd zapisu paczki {len(rows)} odczytów; paczka odrzucona: {error}")
+        if self.on_failed is not None:
+            try:
+                self.on_failed(rows, error)
+            except Exception as e:
+                logger.error(f"Błąd obsługi odrzuconej paczki: {e}")
+
+    def _requeue(self, rows: List[dict], error: Exception) -> None:
+        """Przywraca paczkę na początek bufora i planuje ponowienie zapisu."""
+        delay = min(self.retry_delay * 2 ** self._retry_attempts, self.max_retry_delay)
+        self._retry_attempts += 1
+        self._retries += 1
+        self._retry_at = time.monotonic() + delay
+        with self._buffer_lock:
+            self._buffer[:0] = rows
+            self._first_buffered_at = time.monotonic()
+            self._trim_buffer()
+        logger.warning(
+            f"Przejściowy błąd zapisu paczki {len(rows)} odczytów ({error}); "
+            f"ponowienie za {delay:.1f} s (próba {self._retry_attempts})"
+        )
+
+    def start(self) -> None:
+        """Uruchamia wątek zapisujący bufor po upływie max_delay."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="IngestWriter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.max_delay / 2):
+            if self._is_due():
+                self.flush()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """
+        Zatrzymuje wątek i zapisuje pozostałe odczyty.
+
+        Wątek jest zatrzymywany zawsze, także gdy zapis się nie powiedzie;
+        odczyty niezapisane przed upływem timeout są liczone jako błędne.
+
+        Args:
+            timeout: Jak długo (s) ponawiać zapis po błędach przejściowych
+        """
+        self._stop_event.set()
+        try:
+            if self._thread is not None:
+                self._thread.join()
+            deadline = time.monotonic() + timeout
+            while True:
+                self.flush()
+                if not self._buffer or time.monotonic() >= deadline:
+                    break
+                retry_at = self._retry_at or time.monotonic()
+                time.sleep(max(min(retry_at, deadline) - time.monotonic(), 0))
+        finally:
+            self._thread = None
+            with self._buffer_lock:
+                unsaved, self._buffer = len(self._buffer), []
+                self._first_buffered_at = None
+            if unsaved:
+                self._failed_rows += unsaved
+                logger.error(f"Nie zapisano {unsaved} odczytów przed zatrzymaniem")
+        logger.info(f"Statystyki zapisu: {self.get_stats()}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Zwraca statystyki zapisu.
+
+        Returns:
+            Dict z liczbą wierszy (zapisanych, błędnych, zduplikowanych),
+            commitów, odrzuconych paczek i ponowień po błędach przejściowych, przepustowością (wiersze/s)
+            oraz średnim, p95 i maksymalnym czasem commita (ms)
+        """
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        latencies = sorted(self._commit_latencies)
+        if latencies:
+            mean_ms = 1000 * sum(latencies) / len(latencies)
+            p95_ms = 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            max_ms = 1000 * latencies[-1]
+        else:
+            mean_ms = p95_ms = max_ms = 0.0
+        return {
+            'rows_written': self._rows_written,
+            'commits': self._commits,
+            'failed_rows': self._failed_rows,
+            'failed_batches': self._failed_batches,
+            'duplicate_rows': self._duplicate_rows,
+            'retries': self._retries,
+            'buffered_rows': len(self._buffer),
+            'rows_per_second': self._rows_written / elapsed,
+            'commit_latency_mean_ms': mean_ms,
+            'commit_latency_p95_ms': p95_ms,
+            'commit_latency_max_ms': max_ms
+        }
+
+    def _maybe_log_stats(self) -> None:
+        if not self.stats_interval:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_log >= self.stats_interval:
+            self._last_stats_log = now
+            stats = self.get_stats()
+            logger.info(
+                f"Zapisano {stats['rows_written']} odczytów "
+                f"({stats['rows_per_second']:.0f} wierszy/s, duplikaty: {stats['duplicate_rows']}), "
+                f"commit śr. {stats['commit_latency_mean_ms']:.1f} ms, "
+                f"p95 {stats['commit_latency_p95_ms']:.1f} ms"
+            )
+
+    def __enter__(self) -> "IngestWriter":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
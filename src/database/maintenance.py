@@ -0,0 +1,274 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import delete, func, select, text, tuple_, update
+from .archive import drop_segments_before
+from .channels import CHANNEL_VALUES
+from .db import get_engine
+from .partitions import CATALOG, drop_partitions_before, partition_table
+from .query import reading_sources
+from .rollups import rebuild_rollups
+from .schema import ROLLUP_RESOLUTIONS, ROLLUP_TABLES, SensorReading
+from .timeutils import to_epoch_us, from_epoch_us
+from .window_cache import invalidate_window_cache
+
+logger = logging.getLogger("Maintenance")
+
+READINGS = SensorReading.__table__
+
+DAY_US = ROLLUP_RESOLUTIONS['1d']
+
+# Retencja (dni): surowe odczyty, potem rollupy minutowe; rollupy godzinowe
+# i dzienne są przechowywane bezterminowo. Wartość 0 wyłącza usuwanie.
+RAW_RETENTION_DAYS = int(os.environ.get('COLORSENSE_RAW_RETENTION_DAYS', '90'))
+MINUTE_ROLLUP_RETENTION_DAYS = int(os.environ.get('COLORSENSE_MINUTE_ROLLUP_RETENTION_DAYS', '365'))
+
+# Liczba wierszy usuwanych w jednej transakcji (krótkie blokady zapisu)
+DELETE_BATCH_SIZE = 5000
+
+# Liczba stron zwalnianych przez jedno PRAGMA incremental_vacuum (0 = wszystkie wolne)
+VACUUM_PAGES = 0
+
+def database_size(conn) -> Dict[str, int]:
+    """Zwraca rozmiar pliku bazy i wolnego miejsca (bajty) na podstawie PRAGMA."""
+    page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    page_count = conn.execute(text("PRAGMA page_count")).scalar()
+    freelist = conn.execute(text("PRAGMA freelist_count")).scalar()
+    return {'size_bytes': page_size * page_count, 'free_bytes': page_size * freelist}
+
+def _verify_rollups(conn, start_us: Optional[int], end_us: int) -> int:
+    """
+    Sprawdza, czy rollupy dzienne obejmują wszystkie odczyty z dni przed end_us.
+
+    Dni, dla których liczba odczytów nie zgadza się z rollupem, są
+    przeliczane z surowych danych przed ich usunięciem.
+
+    Returns:
+        Liczba przeliczonych dni
+    """
+    counts: Dict[int, int] = {}
+    for table in reading_sources(conn, from_epoch_us(start_us) if start_us is not None else None,
+                                 from_epoch_us(end_us)):
+        day = (table.c.timestamp_us - table.c.timestamp_us % DAY_US).label('day_us')
+        query = select(day, func.count()).where(table.c.timestamp_us < end_us).group_by(day)
+        for day_us, count in conn.execute(query):
+            if day_us is not None:
+                counts[day_us] = counts.get(day_us, 0) + count
+    if not counts:
+        return 0
+
+    rollup = ROLLUP_TABLES['1d']
+    query = select(rollup.c.bucket_us, func.sum(rollup.c['count']))\
+        .where(rollup.c.bucket_us >= min(counts), rollup.c.bucket_us <= max(counts))\
+        .group_by(rollup.c.bucket_us)
+    rolled = dict(conn.execute(query).fetchall())
+    rebuilt = 0
+    for day_us, count in sorted(counts.items()):
+        if rolled.get(day_us) != count:
+            logger.warning(f"Rollup dnia {from_epoch_us(day_us):%Y-%m-%d} niekompletny, przeliczanie")
+            rebuild_rollups(from_epoch_us(day_us), from_epoch_us(day_us + DAY_US), conn=conn)
+            rebuilt += 1
+    return rebuilt
+
+def _delete_in_batches(table, condition, batch_size: int, partition: Optional[str] = None) -> int:
+    """
+    Usuwa wiersze spełniające warunek paczkami (osobna transakcja na paczkę),
+    aby nie blokować zapisu na długo.
+
+    Args:
+        table: Tabela odczytów, partycji, wartości kanałów lub rollupu
+        condition: Warunek WHERE
+        batch_size: Liczba wierszy w paczce
+        partition: Nazwa partycji, której licznik w katalogu należy zmniejszyć
+    """
+    # Paczka wskazywana kluczem głównym (tabele WITHOUT ROWID nie mają rowid)
+    key = list(table.primary_key.columns)
+    deleted = 0
+    while True:
+        with get_engine().begin() as conn:
+            batch = select(*key).where(condition).limit(batch_size)
+            count = conn.execute(delete(table).where(tuple_(*key).in_(batch))).rowcount or 0
+            if count and partition is not None:
+                conn.execute(
+                    update(CATALOG).where(CATALOG.c.name == partition)
+                    .values(row_count=CATALOG.c.row_count - count)
+                )
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+def expire_raw(cutoff: datetime, batch_size: int = DELETE_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Usuwa surowe odczyty starsze niż cutoff, zachowując ich rollupy.
+
+    Przed usunięciem rollupy wygasających dni są weryfikowane (downsampling);
+    całe partycje i segmenty archiwum są usuwane bez skanowania, pozostałe
+    odczyty paczkami.
+
+    Returns:
+        Dict z liczbą usuniętych odczytów, partycji, segmentów archiwum
+        i wartości kanałów
+    """
+    cutoff_us = to_epoch_us(cutoff)
+    cutoff_us -= cutoff_us % DAY_US
+    with get_engine().begin() as conn:
+        rebuilt_days = _verify_rollups(conn, None, cutoff_us)
+
+    partitions = drop_partitions_before(from_epoch_us(cutoff_us))
+    segments = drop_segments_before(cutoff_us)
+    raw_rows = sum(partitions.values()) + sum(segments.values())
+
+    with get_engine().connect() as conn:
+        straddling = [
+            row[0] for row in conn.execute(select(CATALOG.c.name).where(CATALOG.c.start_us < cutoff_us))
+        ]
+    raw_rows += _delete_in_batches(READINGS, READINGS.c.timestamp_us < cutoff_us, batch_size)
+    channel_values = _delete_in_batches(CHANNEL_VALUES, CHANNEL_VALUES.c.timestamp_us < cutoff_us, batch_size)
+    for name in straddling:
+        table = partition_table(name)
+        raw_rows += _delete_in_batches(table, table.c.timestamp_us < cutoff_us, batch_size, partition=name)
+    if raw_rows:
+        invalidate_window_cache()
+
+    return {
+        'raw_rows': raw_rows,
+        'partitions': len(partitions),
+        'archive_segments': len(segments),
+        'channel_values': channel_values,
+        'rebuilt_days': rebuilt_days
+    }
+
+def expire_minute_rollups(cutoff: datetime, batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """Usuwa kubełki rollupu minutowego starsze niż cutoff (godzinowe zostają)."""
+    table = ROLLUP_TABLES['1m']
+    cutoff_us = to_epoch_us(cutoff)
+    cutoff_us -= cutoff_us % ROLLUP_RESOLUTIONS['1h']
+    return _delete_in_batches(table, table.c.bucket_us < cutoff_us, batch_size)
+
+def vacuum(pages: int = VACUUM_PAGES) -> Dict[str, int]:
+    """
+    Zwalnia wolne strony pliku bazy (incremental_vacuum) i odświeża statystyki (ANALYZE).
+
+    Plik utworzony bez auto_vacuum=INCREMENTAL jest jednorazowo przełączany
+    pełnym VACUUM (może potrwać i wymaga wolnego miejsca na kopię pliku).
+
+    Returns:
+        Dict z rozmiarem pliku przed i po oraz liczbą odzyskanych bajtów
+    """
+    with get_engine().connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        before = database_size(conn)
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            logger.info("Przełączanie bazy na auto_vacuum=INCREMENTAL (pełny VACUUM)")
+            conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+        else:
+            # execute() sterownika sqlite3 wykonuje tylko pierwszy krok PRAGMA (jedna
+            # strona); executescript wykonuje polecenie do końca
+            conn.connection.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({pages})" if pages else "PRAGMA incremental_vacuum"
+            )
+        conn.execute(text("ANALYZE"))
+        after = database_size(conn)
+    return {
+        'size_before_bytes': before['size_bytes'],
+        'size_after_bytes': after['size_bytes'],
+        'reclaimed_bytes': before['size_bytes'] - after['size_bytes']
+    }
+
+def run_maintenance(raw_days: int = RAW_RETENTION_DAYS,
+                    minute_days: int = MINUTE_ROLLUP_RETENTION_DAYS,
+                    run_vacuum: bool = True, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Wykonuje pełny cykl utrzymania bazy: retencja, usuwanie i VACUUM/ANALYZE.
+
+    Args:
+        raw_days: Ile dni przechowywać surowe odczyty (0 = bez limitu)
+        minute_days: Ile dni przechowywać rollupy minutowe (0 = bez limitu)
+        run_vacuum: Czy zwolnić miejsce i odświeżyć statystyki
+        now: Chwila odniesienia (domyślnie bieżący czas UTC)
+
+    Returns:
+        Raport: liczby usuniętych odczytów, partycji, segmentów, kubełków
+        oraz rozmiar pliku i odzyskane miejsce
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    report = {
+        'raw_rows': 0, 'partitions': 0, 'archive_segments': 0, 'channel_values': 0,
+        'rebuilt_days': 0, 'minute_buckets': 0
+    }
+    if raw_days:
+        report.update(expire_raw(now - timedelta(days=raw_days)))
+    if minute_days:
+        report['minute_buckets'] = expire_minute_rollups(now - timedelta(days=minute_days))
+    if run_vacuum:
+        report.update(vacuum())
+    report['duration_s'] = time.perf_counter() - started
+    logger.info(
+        f"Utrzymanie bazy: usunięto {report['raw_rows']} odczytów i {report['minute_buckets']} "
+        f"kubełków 1m, odzyskano {report.get('reclaimed_bytes', 0) / 1024 / 1024:.1f} MiB "
+        f"w {report['duration_s']:.1f} s"
+    )
+    return report
+
+class MaintenanceScheduler:
+    """Wątek uruchamiający run_maintenance co zadany czas."""
+
+    def __init__(self, interval_hours: float = 24.0, **options):
+        """
+        Args:
+            interval_hours: Odstęp między kolejnymi cyklami utrzymania
+            **options: Argumenty przekazywane do run_maintenance
+        """
+        self.interval = interval_hours * 3600
+        self.options = options
+        self.last_report: Optional[Dict[str, int]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Uruchamia wątek utrzymania."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="Maintenance", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.last_report = run_maintenance(**self.options)
+            except Exception as e:
+                logger.error(f"Błąd utrzymania bazy: {e}")
+
+    def stop(self) -> None:
+        """Zatrzymuje wątek utrzymania."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+def main():
+    """Utrzymanie bazy z linii poleceń."""
+    from .db import init_db
+    parser = argparse.ArgumentParser(description="Retencja, downsampling i VACUUM bazy colorsense.db")
+    parser.add_argument('--raw-days', type=int, default=RAW_RETENTION_DAYS,
+                        help="Przechowuj surowe odczyty przez N dni (0 = bez limitu)")
+    parser.add_argument('--minute-days', type=int, default=MINUTE_ROLLUP_RETENTION_DAYS,
+                        help="Przechowuj rollupy minutowe przez M dni (0 = bez limitu)")
+    parser.add_argument('--no-vacuum', action='store_true', help="Pomiń VACUUM/ANALYZE")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    report = run_maintenance(args.raw_days, args.minute_days, not args.no_vacuum)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
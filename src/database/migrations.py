@@ -0,0 +1,159 @@
+import logging
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger("DatabaseMigrations")
+
+# Wylicza mikrosekundy od epoki z tekstowej kolumny timestamp SQLite
+# ('YYYY-MM-DD HH:MM:SS[.ffffff]'); część ułamkowa jest dopełniana zerami.
+TIMESTAMP_US_SQL = (
+    "CAST(strftime('%s', timestamp) AS INTEGER) * 1000000 + "
+    "CAST(substr(substr(timestamp, 21) || '000000', 1, 6) AS INTEGER)"
+)
+
+def _column_names(conn, table: str) -> set:
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+def add_timestamp_us(conn) -> None:
+    """Dodaje i uzupełnia kolumnę timestamp_us wraz z indeksem."""
+    if 'timestamp_us' not in _column_names(conn, 'sensor_readings'):
+        logger.info("Dodawanie kolumny sensor_readings.timestamp_us")
+        conn.execute(text("ALTER TABLE sensor_readings ADD COLUMN timestamp_us BIGINT"))
+    result = conn.execute(text(
+        f"UPDATE sensor_readings SET timestamp_us = {TIMESTAMP_US_SQL} "
+        "WHERE timestamp_us IS NULL AND timestamp IS NOT NULL"
+    ))
+    if result.rowcount:
+        logger.info(f"Uzupełniono timestamp_us dla {result.rowcount} odczytów")
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_sensor_readings_timestamp_us "
+        "ON sensor_readings (timestamp_us)"
+    ))
+
+def add_device_id(conn) -> None:
+    """Dodaje kolumnę device_id do odczytów i partycji (indeks tworzy add_unique_device_time)."""
+    from .schema import DEFAULT_DEVICE_ID
+    for table in _reading_tables(conn):
+        if 'device_id' not in _column_names(conn, table):
+            logger.info(f"Dodawanie kolumny {table}.device_id")
+            conn.execute(text(
+                f"ALTER TABLE \"{table}\" ADD COLUMN device_id VARCHAR NOT NULL DEFAULT '{DEFAULT_DEVICE_ID}'"
+            ))
+
+def _reading_tables(conn) -> list:
+    return ['sensor_readings'] + [row[0] for row in conn.execute(text("SELECT name FROM sensor_partitions"))]
+
+def _is_unique_index(conn, table: str, index: str) -> bool:
+    for row in conn.execute(text(f'PRAGMA index_list("{table}")')):
+        if row[1] == index:
+            return bool(row[2])
+    return False
+
+def add_unique_device_time(conn) -> None:
+    """
+    Tworzy unikalny indeks (device_id, timestamp_us) w odczytach i partycjach.
+
+    Przed utworzeniem indeksu usuwane są duplikaty (zostaje najstarszy wiersz),
+    a po usunięciu rollupy są przeliczane. Pełny skan wykonywany jest tylko
+    dla tabel, które nie mają jeszcze unikalnego indeksu.
+    """
+    removed = 0
+    for table in _reading_tables(conn):
+        index = f'ix_{table}_device_time'
+        if _is_unique_index(conn, table, index):
+            continue
+        result = conn.execute(text(
+            f'DELETE FROM "{table}" WHERE timestamp_us IS NOT NULL AND id NOT IN '
+            f'(SELECT MIN(id) FROM "{table}" WHERE timestamp_us IS NOT NULL GROUP BY device_id, timestamp_us)'
+        ))
+        if result.rowcount:
+            logger.info(f"Usunięto {result.rowcount} zduplikowanych odczytów z {table}")
+            removed += result.rowcount
+            conn.execute(
+                text("UPDATE sensor_partitions SET row_count = row_count - :removed WHERE name = :name"),
+                {'removed': result.rowcount, 'name': table}
+            )
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index}"'))
+        conn.execute(text(f'CREATE UNIQUE INDEX "{index}" ON "{table}" (device_id, timestamp_us)'))
+    if removed:
+        from .rollups import rebuild_rollups
+        rebuild_rollups(conn=conn)
+
+def add_rollup_device_id(conn) -> None:
+    """
+    Przebudowuje tabele rollup do klucza (device_id, bucket_us).
+
+    SQLite nie pozwala zmienić klucza głównego, więc tabela jest tworzona od
+    nowa, a istniejące kubełki są kopiowane jako kubełki urządzenia domyślnego
+    (także te z zakresu archiwum, których nie da się już przeliczyć z odczytów).
+    """
+    from .schema import DEFAULT_DEVICE_ID, ROLLUP_TABLES
+    for table in ROLLUP_TABLES.values():
+        if 'device_id' in _column_names(conn, table.name):
+            continue
+        logger.info(f"Przebudowa tabeli {table.name} z kluczem (device_id, bucket_us)")
+        old_name = f'{table.name}_old'
+        conn.execute(text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+        table.create(conn)
+        columns = ', '.join(f'"{c.name}"' for c in table.columns if c.name != 'device_id')
+        conn.execute(text(
+            f"INSERT INTO {table.name} (device_id, {columns}) "
+            f"SELECT '{DEFAULT_DEVICE_ID}', {columns} FROM {old_name}"
+        ))
+        conn.execute(text(f'DROP TABLE {old_name}'))
+
+def backfill_rollups(conn) -> None:
+    """Wypełnia puste tabele rollup na podstawie istniejących odczytów."""
+    from .rollups import rebuild_rollups
+    has_rollups = conn.execute(text("SELECT 1 FROM sensor_rollup_1d LIMIT 1")).first()
+    has_readings = conn.execute(text("SELECT 1 FROM sensor_readings LIMIT 1")).first()
+    if has_readings and not has_rollups:
+        logger.info("Wypełnianie tabel rollup z istniejących odczytów")
+        rebuild_rollups(conn=conn)
+
+def backfill_partition_zones(conn) -> None:
+    """Wylicza mapy stref dla partycji utworzonych przed ich wprowadzeniem."""
+    from .partitions import partition_table
+    from .zonemaps import rebuild_partition_zones
+    missing = conn.execute(text(
+        "SELECT name FROM sensor_partitions WHERE name NOT IN "
+        "(SELECT DISTINCT partition FROM sensor_partition_zones)"
+    )).fetchall()
+    for (name,) in missing:
+        logger.info(f"Wyliczanie mapy stref partycji {name}")
+        rebuild_partition_zones(conn, name, partition_table(name))
+
+def backfill_histograms(conn) -> None:
+    """Wylicza histogramy godzinne z istniejących odczytów, jeśli tabela jest pusta."""
+    from .histograms import rebuild_histograms
+    has_histograms = conn.execute(text("SELECT 1 FROM sensor_histograms LIMIT 1")).first()
+    has_rollups = conn.execute(text("SELECT 1 FROM sensor_rollup_1d LIMIT 1")).first()
+    if has_rollups and not has_histograms:
+        logger.info("Wypełnianie histogramów z istniejących odczytów")
+        rebuild_histograms(conn=conn)
+
+# Kroki migracji wykonywane po kolei; każdy musi być idempotentny
+MIGRATIONS = [
+    add_timestamp_us,
+    add_device_id,
+    add_rollup_device_id,
+    add_unique_device_time,
+    backfill_rollups,
+    backfill_partition_zones,
+    backfill_histograms,
+]
+
+def migrate_db(engine) -> None:
+    """
+    Dostosowuje istniejącą bazę danych do bieżącego schematu.
+
+    Wywoływane przez init_db po create_all, więc działa zarówno dla nowych,
+    jak i starszych plików data/colorsense.db.
+    """
+    with engine.begin() as conn:
+        for migration in MIGRATIONS:
+            migration(conn)
+
+if __name__ == "__main__":
+    from .db import init_db
+    logging.basicConfig(level=logging.INFO)
+    init_db()
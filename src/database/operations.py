@@ -1,41 +1,218 @@
 import json
+import logging
+import threading
 from datetime import datetime
-from .db import get_session
-from .schema import SensorReading, CalibrationData, MLModel
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .channels import CHANNELS_KEY, insert_channel_values, validate_channel_name
+from .db import get_session, get_engine
+from .histograms import update_histograms
+from .schema import DEFAULT_DEVICE_ID, SensorReading, CalibrationData, MLModel
+from .packed import is_packed, unpack_readings
+from .partitions import insert_partitioned, partitioning_enabled
+from .query import existing_reading_keys, fetch_columns, range_conditions, reading_sources
+from .rollups import update_rollups
+from .timeutils import to_epoch_us
+
+logger = logging.getLogger("DatabaseOperations")
+
+# Cache aktywnych kalibracji i modeli ML w procesie; unieważniany przez podbicie
+# wersji w save_calibration_data / save_ml_model
+_active_cache = {'version': 0, 'calibration': {}, 'model': {}}
+_active_cache_lock = threading.Lock()
+
+def invalidate_active_cache() -> None:
+    """Unieważnia cache aktywnych kalibracji i modeli (np. po zmianie z innego procesu)."""
+    with _active_cache_lock:
+        _active_cache['version'] += 1
+        _active_cache['calibration'] = {}
+        _active_cache['model'] = {}
+
+def _cached_active(kind: str, key: str, load):
+    """Zwraca wartość z cache lub wczytuje ją i zapamiętuje, jeśli wersja się nie zmieniła."""
+    entries = _active_cache[kind]
+    if key in entries:
+        return entries[key]
+    version = _active_cache['version']
+    value = load()
+    with _active_cache_lock:
+        # Zapis w trakcie wczytywania mógł unieważnić cache; wtedy nie zapamiętujemy
+        if _active_cache['version'] == version:
+            _active_cache[kind][key] = value
+    return value
+
+# Funkcje wywoływane po commicie z nowo zapisanymi wierszami odczytów
+# (np. cache okien czasu); dotyczą tylko zapisów w tym procesie
+_write_listeners: List[Callable[[List[dict]], None]] = []
+
+def add_write_listener(listener: Callable[[List[dict]], None]) -> None:
+    """Rejestruje funkcję wywoływaną z nowymi wierszami po każdym zapisie odczytów."""
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+def remove_write_listener(listener: Callable[[List[dict]], None]) -> None:
+    """Wyrejestrowuje funkcję dodaną przez add_write_listener."""
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+def _notify_written(rows: List[dict]) -> None:
+    # Dane są już zapisane, więc błąd słuchacza nie może przerwać zapisu
+    for listener in list(_write_listeners):
+        try:
+            listener(rows)
+        except Exception as e:
+            logger.error(f"Błąd słuchacza zapisu odczytów: {e}")
+
+def reading_to_row(reading_data: dict) -> dict:
+    """
+    Mapuje odczyt w formacie symulatora na wiersz tabeli sensor_readings.
+
+    Opcjonalny klucz 'channels' (nazwa kanału -> wartość) przenosi pomiary
+    czujników spoza SensorReading do wąskiej tabeli kanałów. Nazwy kanałów
+    są sprawdzane tutaj (ValueError), aby błędny odczyt został odrzucony
+    przed buforowaniem, zamiast wycofać całą paczkę zapisu.
+    """
+    timestamp = datetime.fromisoformat(reading_data['timestamp'])
+    row = {
+        'timestamp': timestamp,
+        'timestamp_us': to_epoch_us(timestamp),
+        'device_id': reading_data.get('device_id') or DEFAULT_DEVICE_ID,
+        # AS7262
+        'as7262_450nm': reading_data['as7262']['450nm'],
+        'as7262_500nm': reading_data['as7262']['500nm'],
+        'as7262_550nm': reading_data['as7262']['550nm'],
+        'as7262_570nm': reading_data['as7262']['570nm'],
+        'as7262_600nm': reading_data['as7262']['600nm'],
+        'as7262_650nm': reading_data['as7262']['650nm'],
+        'as7262_temperature': reading_data['as7262']['temperature'],
+        # TSL2591
+        'tsl2591_lux': reading_data['tsl2591']['lux'],
+        'tsl2591_ir': reading_data['tsl2591']['ir'],
+        'tsl2591_full': reading_data['tsl2591']['full'],
+        # SEN0611
+        'sen0611_cct': reading_data['sen0611']['cct'],
+        'sen0611_als': reading_data['sen0611']['als'],
+        # GPS
+        'latitude': reading_data['gps']['latitude'],
+        'longitude': reading_data['gps']['longitude'],
+        'altitude': reading_data['gps']['altitude'],
+        'satellites': reading_data['gps']['satellites'],
+        # Environmental
+        'ambient_temperature': reading_data['ambient_temperature']
+    }
+    if reading_data.get(CHANNELS_KEY):
+        for name in reading_data[CHANNELS_KEY]:
+            validate_channel_name(name)
+        row[CHANNELS_KEY] = reading_data[CHANNELS_KEY]
+    return row
 
 def save_sensor_reading(reading_data: dict) -> None:
-    """Zapisuje odczyt z czujników do bazy danych."""
-    session = get_session()
-    try:
-        reading = SensorReading(
-            timestamp=datetime.fromisoformat(reading_data['timestamp']),
-            # AS7262
-            as7262_450nm=reading_data['as7262']['450nm'],
-            as7262_500nm=reading_data['as7262']['500nm'],
-            as7262_550nm=reading_data['as7262']['550nm'],
-            as7262_570nm=reading_data['as7262']['570nm'],
-            as7262_600nm=reading_data['as7262']['600nm'],
-            as7262_650nm=reading_data['as7262']['650nm'],
-            as7262_temperature=reading_data['as7262']['temperature'],
-            # TSL2591
-            tsl2591_lux=reading_data['tsl2591']['lux'],
-            tsl2591_ir=reading_data['tsl2591']['ir'],
-            tsl2591_full=reading_data['tsl2591']['full'],
-            # SEN0611
-            sen0611_cct=reading_data['sen0611']['cct'],
-            sen0611_als=reading_data['sen0611']['als'],
-            # GPS
-            latitude=reading_data['gps']['latitude'],
-            longitude=reading_data['gps']['longitude'],
-            altitude=reading_data['gps']['altitude'],
-            satellites=reading_data['gps']['satellites'],
-            # Environmental
-            ambient_temperature=reading_data['ambient_temperature']
-        )
-        session.add(reading)
-        session.commit()
-    finally:
-        session.close()
+    """
+    Zapisuje odczyt z czujników do bazy danych.
+
+    Odczyt już zapisany (ten sam device_id i czas) jest pomijany
+    (zob. upsert_sensor_rows).
+    """
+    upsert_sensor_rows([reading_to_row(reading_data)])
+
+def insert_sensor_rows(rows: List[dict]) -> int:
+    """
+    Zapisuje gotowe wiersze sensor_readings w jednej transakcji.
+
+    Używa wstawiania na poziomie Core (executemany) zamiast obiektów ORM,
+    więc koszt commita i fsync jest ponoszony raz na całą paczkę. W tej samej
+    transakcji aktualizowane są tabele rollup i histogramy oraz zapisywane
+    wartości kanałów. Ścieżka dla danych na pewno nowych (benchmarki, import):
+    duplikat klucza (device_id, timestamp_us) zgłasza IntegrityError
+    i wycofuje całą paczkę.
+
+    Args:
+        rows: Wiersze w formacie zwracanym przez reading_to_row
+
+    Returns:
+        Liczba zapisanych wierszy
+    """
+    if not rows:
+        return 0
+    with get_engine().begin() as conn:
+        if partitioning_enabled():
+            insert_partitioned(conn, rows)
+        else:
+            conn.execute(insert(SensorReading.__table__), rows)
+        update_rollups(conn, rows)
+        update_histograms(conn, rows)
+        insert_channel_values(conn, rows)
+    _notify_written(rows)
+    return len(rows)
+
+def save_sensor_readings_bulk(readings: List[dict]) -> int:
+    """
+    Zapisuje wiele odczytów z czujników w jednej transakcji.
+
+    Duplikaty są pomijane zamiast wycofywać paczkę (zob. upsert_sensor_rows).
+
+    Returns:
+        Liczba nowych (zapisanych) odczytów
+    """
+    return upsert_sensor_rows([reading_to_row(r) for r in readings])
+
+def upsert_sensor_rows(rows: List[dict]) -> int:
+    """
+    Idempotentnie zapisuje wiersze sensor_readings (np. powtórki po ponownym połączeniu).
+
+    Kluczem odczytu jest (device_id, timestamp_us). Duplikaty w paczce są
+    odrzucane, klucze już zapisane (w SQLite lub archiwum) wyszukiwane przez
+    unikalny indeks, a pozostałe wiersze zapisywane przez INSERT ... ON
+    CONFLICT DO NOTHING. Rollupy są aktualizowane tylko o nowe wiersze, więc
+    koszt powtórki zależy od wielkości paczki, a nie od liczby odczytów w bazie.
+
+    Args:
+        rows: Wiersze w formacie zwracanym przez reading_to_row
+
+    Returns:
+        Liczba nowych (zapisanych) wierszy
+    """
+    return len(_upsert_rows(rows))
+
+def upsert_sensor_row_groups(groups: List[List[dict]]) -> List[int]:
+    """
+    Zapisuje kilka grup wierszy (np. żądań różnych wywołujących) jedną transakcją upsert_sensor_rows.
+
+    Returns:
+        Liczba nowych wierszy każdej grupy; odczyt powtórzony w kilku grupach
+        jest liczony jako nowy tylko w pierwszej z nich
+    """
+    new_ids = {id(row) for row in _upsert_rows([row for rows in groups for row in rows])}
+    return [sum(id(row) in new_ids for row in rows) for rows in groups]
+
+def _upsert_rows(rows: List[dict]) -> List[dict]:
+    """Zapisuje wiersze jak upsert_sensor_rows; zwraca zapisane (nowe) wiersze, obiekty z listy rows."""
+    if not rows:
+        return []
+    unique: Dict[tuple, dict] = {}
+    for row in rows:
+        row.setdefault('device_id', DEFAULT_DEVICE_ID)
+        unique.setdefault((row['device_id'], row['timestamp_us']), row)
+    with get_engine().begin() as conn:
+        existing = existing_reading_keys(conn, list(unique))
+        new_rows = [row for key, row in unique.items() if key not in existing]
+        if not new_rows:
+            return []
+        if partitioning_enabled():
+            insert_partitioned(conn, new_rows, ignore_duplicates=True)
+        else:
+            conn.execute(sqlite_insert(SensorReading.__table__).on_conflict_do_nothing(), new_rows)
+        update_rollups(conn, new_rows)
+        update_histograms(conn, new_rows)
+        insert_channel_values(conn, new_rows, ignore_duplicates=True)
+    _notify_written(new_rows)
+    return new_rows
+
+def upsert_sensor_readings_bulk(readings: List[dict]) -> int:
+    """Idempotentnie zapisuje wiele odczytów z czujników (zob. upsert_sensor_rows)."""
+    return upsert_sensor_rows([reading_to_row(r) for r in readings])
 
 def save_calibration_data(sensor_type: str, parameters: dict) -> None:
     """Zapisuje dane kalibracyjne dla czujnika."""
@@ -58,6 +235,7 @@ def save_calibration_data(sensor_type: str, parameters: dict) -> None:
         session.commit()
     finally:
         session.close()
+    invalidate_active_cache()
 
 def save_ml_model(name: str, version: str, path: str, parameters: dict, metrics: dict) -> None:
     """Zapisuje informacje o modelu ML."""
@@ -83,21 +261,52 @@ def save_ml_model(name: str, version: str, path: str, parameters: dict, metrics:
         session.commit()
     finally:
         session.close()
+    invalidate_active_cache()
 
-def get_latest_readings(limit: int = 100) -> list:
-    """Pobiera ostatnie odczyty z czujników."""
-    session = get_session()
-    try:
-        readings = session.query(SensorReading)\
-            .order_by(SensorReading.timestamp.desc())\
-            .limit(limit)\
-            .all()
-        return readings
-    finally:
-        session.close()
+def get_latest_readings(limit: int = 100, device_id: Optional[str] = None) -> list:
+    """
+    Pobiera ostatnie odczyty z czujników (opcjonalnie jednego urządzenia).
+
+    Zwraca lekkie wiersze Core (dostęp przez atrybuty, np. r.timestamp)
+    zamiast obiektów ORM, z sensor_readings i najnowszych partycji; wiersze
+    partycji packed są dekodowane do krotek z tymi samymi atrybutami.
+    """
+    readings = []
+    with get_engine().connect() as conn:
+        sources = reading_sources(conn)
+        partition_rows = 0
+        for table in sources[:1] + sources[:0:-1]:
+            if partition_rows >= limit:
+                break
+            query = select(table)\
+                .where(*range_conditions(table, device_id=device_id))\
+                .order_by(table.c.timestamp_us.desc())\
+                .limit(limit)
+            rows = conn.execute(query).fetchall()
+            if is_packed(table):
+                rows = unpack_readings(rows, list(table.c.keys()))
+            if table is not sources[0]:
+                partition_rows += len(rows)
+            readings.extend(rows)
+    readings.sort(key=lambda r: r.timestamp_us, reverse=True)
+    return readings[:limit]
+
+def get_latest_columns(columns: List[str], limit: int = 100,
+                       device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Pobiera wybrane kolumny ostatnich odczytów jako tablice NumPy (rosnąco po czasie)."""
+    return fetch_columns(columns, limit=limit, latest=True, device_id=device_id)
 
 def get_active_calibration(sensor_type: str) -> dict:
-    """Pobiera aktywne dane kalibracyjne dla czujnika."""
+    """
+    Pobiera aktywne dane kalibracyjne dla czujnika.
+
+    Sparsowane parametry są zapamiętywane w cache procesu, więc kolejne
+    wywołania nie odpytują bazy. Zwracany słownik jest współdzielony
+    i nie powinien być modyfikowany.
+    """
+    return _cached_active('calibration', sensor_type, lambda: _load_active_calibration(sensor_type))
+
+def _load_active_calibration(sensor_type: str) -> dict:
     session = get_session()
     try:
         calibration = session.query(CalibrationData)\
@@ -110,7 +319,15 @@ def get_active_calibration(sensor_type: str) -> dict:
         session.close()
 
 def get_active_ml_model(name: str) -> MLModel:
-    """Pobiera aktywny model ML."""
+    """
+    Pobiera aktywny model ML.
+
+    Metadane modelu (odłączony obiekt MLModel) są zapamiętywane w cache
+    procesu do czasu zapisu nowego modelu lub kalibracji.
+    """
+    return _cached_active('model', name, lambda: _load_active_ml_model(name))
+
+def _load_active_ml_model(name: str) -> MLModel:
     session = get_session()
     try:
         model = session.query(MLModel)\
@@ -0,0 +1,102 @@
+import struct
+from collections import namedtuple
+from typing import Dict, List, Sequence
+import numpy as np
+from .schema import SensorReading
+
+READINGS = SensorReading.__table__
+
+# Układ zapisu partycji: wide (kolumna REAL na pomiar) lub packed (pomiary
+# w jednym blobie float32); układ jest częścią nazwy tabeli partycji
+STORAGE_LAYOUTS = ('wide', 'packed')
+PACKED_SUFFIX = '_packed'
+
+# Kolumna blob i upakowane w niej pomiary (kolejność = kolejność w blobie);
+# współrzędne GPS i liczba satelitów zostają osobnymi kolumnami, bo float32
+# nie zachowałby dokładności położenia
+PACKED_COLUMN = 'packed'
+PACKED_COLUMNS = [
+    'as7262_450nm', 'as7262_500nm', 'as7262_550nm', 'as7262_570nm',
+    'as7262_600nm', 'as7262_650nm', 'as7262_temperature',
+    'tsl2591_lux', 'tsl2591_ir', 'tsl2591_full',
+    'sen0611_cct', 'sen0611_als',
+    'ambient_temperature'
+]
+
+# float32 little-endian; brak wartości (NULL) zapisywany jako NaN
+PACKED_DTYPE = np.dtype('<f4')
+_ROW_FORMAT = struct.Struct(f'<{len(PACKED_COLUMNS)}f')
+PACKED_ROW_BYTES = _ROW_FORMAT.size
+
+_NAN = float('nan')
+
+# Wiersz odczytu z partycji packed (atrybuty jak w wierszu Core sensor_readings)
+PackedReading = namedtuple('PackedReading', [c.name for c in READINGS.columns])
+
+def is_packed(table) -> bool:
+    """Czy tabela odczytów przechowuje pomiary w blobie packed."""
+    return PACKED_COLUMN in table.c
+
+def is_packed_name(name: str) -> bool:
+    """Czy nazwa partycji oznacza układ packed."""
+    return name.endswith(PACKED_SUFFIX)
+
+def table_columns(table, names: Sequence[str]) -> List[str]:
+    """
+    Nazwy kolumn tabeli potrzebne do odczytu żądanych kolumn sensor_readings.
+
+    W tabeli packed kolumny upakowane zastępuje jedna kolumna blob.
+    """
+    if not is_packed(table):
+        return list(names)
+    result = [name for name in names if name not in PACKED_COLUMNS]
+    if len(result) < len(names):
+        result.append(PACKED_COLUMN)
+    return result
+
+def pack_values(row: dict) -> bytes:
+    """Pakuje pomiary wiersza do blobu float32."""
+    values = []
+    for name in PACKED_COLUMNS:
+        value = row.get(name)
+        values.append(_NAN if value is None else value)
+    return _ROW_FORMAT.pack(*values)
+
+def pack_rows(rows: Sequence[dict]) -> List[dict]:
+    """Zamienia wiersze sensor_readings na wiersze tabeli packed."""
+    packed = []
+    for row in rows:
+        values = {name: value for name, value in row.items() if name not in PACKED_COLUMNS}
+        values[PACKED_COLUMN] = pack_values(row)
+        packed.append(values)
+    return packed
+
+def unpack_blobs(blobs: Sequence[bytes]) -> Dict[str, np.ndarray]:
+    """
+    Dekoduje bloby wielu wierszy do kolumn float32.
+
+    Bloby są łączone w jeden bufor, a np.frombuffer tworzy z niego macierz
+    wiersze x pomiary bez kopiowania; kolumny są jej widokami (tylko do odczytu).
+    """
+    matrix = np.frombuffer(b''.join(blobs), dtype=PACKED_DTYPE).reshape(-1, len(PACKED_COLUMNS))
+    return {name: matrix[:, i] for i, name in enumerate(PACKED_COLUMNS)}
+
+def unpack_values(blob: bytes) -> dict:
+    """Dekoduje blob jednego wiersza do słownika pomiarów (NaN -> None)."""
+    return {
+        name: None if value != value else value
+        for name, value in zip(PACKED_COLUMNS, _ROW_FORMAT.unpack(blob))
+    }
+
+def unpack_rows(rows: Sequence[tuple], names: Sequence[str]) -> List[dict]:
+    """Dekoduje wiersze zapytania (kolumny names, w tym blob) do słowników z None zamiast NaN."""
+    result = []
+    for row in rows:
+        values = dict(zip(names, row))
+        values.update(unpack_values(values.pop(PACKED_COLUMN)))
+        result.append(values)
+    return result
+
+def unpack_readings(rows: Sequence[tuple], names: Sequence[str]) -> List[PackedReading]:
+    """Dekoduje pełne wiersze tabeli packed do wierszy z atrybutami kolumn sensor_readings."""
+    return [PackedReading(**values) for values in unpack_rows(rows, names)]
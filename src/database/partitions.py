@@ -0,0 +1,335 @@
+import argparse
+import logging
+import os
+import weakref
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import Column, Index, LargeBinary, MetaData, Table, delete, event, insert, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from .db import get_engine
+from .packed import PACKED_COLUMN, PACKED_COLUMNS, PACKED_SUFFIX, STORAGE_LAYOUTS, is_packed_name, pack_rows
+from .schema import SensorReading, SensorPartition
+from .timeutils import to_epoch_us, from_epoch_us
+from .zonemaps import delete_partition_zones, update_partition_zones
+
+logger = logging.getLogger("Partitions")
+
+READINGS = SensorReading.__table__
+CATALOG = SensorPartition.__table__
+
+DAY_US = 86400 * 1_000_000
+WEEK_US = 7 * DAY_US
+# 1970-01-01 był czwartkiem; tygodnie partycji zaczynają się w poniedziałek
+WEEK_OFFSET_US = 3 * DAY_US
+
+# Schemat partycjonowania nowych odczytów: none, day lub week
+PARTITION_SCHEMES = ('none', 'day', 'week')
+PARTITION_SCHEME = os.environ.get('COLORSENSE_PARTITIONING', 'none')
+
+# Liczba kluczy w jednym zapytaniu o odczyty już przeniesione do partycji
+KEY_LOOKUP_BATCH = 400
+
+# Układ zapisu nowych partycji: wide lub packed (zob. database.packed)
+STORAGE_LAYOUT = os.environ.get('COLORSENSE_STORAGE_LAYOUT', 'wide')
+
+# Tabele partycji nie należą do Base.metadata, aby create_all ich nie tworzył
+_partition_metadata = MetaData()
+_partition_tables: Dict[str, Table] = {}
+# Partycje, których tabela i wpis w katalogu są na pewno zatwierdzone w bazie;
+# nazwy trafiają tu dopiero po commicie transakcji, która je utworzyła. Inny
+# proces (retencja, archiwizacja) może partycję usunąć, więc zapis do tabeli,
+# której już nie ma, usuwa nazwę i odtwarza partycję (zob. insert_partitioned)
+_known_partitions = set()
+# Połączenie -> partycje utworzone w jego bieżącej transakcji
+_pending_partitions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def reset_known_partitions() -> None:
+    """Zapomina zapamiętane partycje (np. po zmianie pliku bazy lub usunięciu partycji)."""
+    _known_partitions.clear()
+
+def configure_partitioning(scheme: str) -> None:
+    """Ustawia schemat partycjonowania nowych odczytów (none, day, week)."""
+    global PARTITION_SCHEME
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"Nieznany schemat partycjonowania: {scheme}")
+    PARTITION_SCHEME = scheme
+
+def configure_storage_layout(layout: str) -> None:
+    """
+    Ustawia układ zapisu nowych partycji (wide, packed).
+
+    Istniejące partycje zachowują swój układ; przy zmianie w trakcie okresu
+    nowe odczyty trafiają do osobnej partycji z tym samym zakresem czasu.
+    """
+    global STORAGE_LAYOUT
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f"Nieznany układ zapisu: {layout}")
+    STORAGE_LAYOUT = layout
+
+def partitioning_enabled() -> bool:
+    """Czy nowe odczyty są kierowane do partycji."""
+    return PARTITION_SCHEME != 'none'
+
+def partition_bounds(epoch_us: int, scheme: Optional[str] = None, layout: Optional[str] = None) -> tuple:
+    """
+    Zwraca partycję, do której trafia nowy odczyt z podanej chwili.
+
+    Nazwa zależy od układu zapisu, więc ten sam okres może mieć partycje
+    obu układów; do wyszukiwania zapisanych odczytów służy katalog
+    (partitions_in_range), nie ta nazwa.
+
+    Args:
+        epoch_us: Chwila w µs od epoki
+        scheme: Schemat partycjonowania (domyślnie PARTITION_SCHEME)
+        layout: Układ zapisu (domyślnie STORAGE_LAYOUT)
+
+    Returns:
+        (nazwa tabeli, początek w µs włącznie, koniec w µs wyłącznie)
+    """
+    scheme = scheme or PARTITION_SCHEME
+    layout = layout or STORAGE_LAYOUT
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f"Nieznany układ zapisu: {layout}")
+    if scheme == 'day':
+        start_us = epoch_us - epoch_us % DAY_US
+        end_us = start_us + DAY_US
+        suffix = from_epoch_us(start_us).strftime('%Y%m%d')
+    elif scheme == 'week':
+        start_us = epoch_us - (epoch_us + WEEK_OFFSET_US) % WEEK_US
+        end_us = start_us + WEEK_US
+        suffix = from_epoch_us(start_us).strftime('w%Y%m%d')
+    else:
+        raise ValueError(f"Partycjonowanie wyłączone lub nieznany schemat: {scheme}")
+    if layout == 'packed':
+        suffix += PACKED_SUFFIX
+    return f'{READINGS.name}_{suffix}', start_us, end_us
+
+def partition_table(name: str) -> Table:
+    """
+    Zwraca tabelę partycji o strukturze sensor_readings.
+
+    W partycjach packed (nazwa z przyrostkiem _packed) kolumny PACKED_COLUMNS
+    zastępuje jedna kolumna blob float32.
+    """
+    table = _partition_tables.get(name)
+    if table is None:
+        packed = is_packed_name(name)
+        columns = [
+            Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable,
+                   server_default=c.server_default.arg if c.server_default is not None else None)
+            for c in READINGS.columns
+            if not (packed and c.name in PACKED_COLUMNS)
+        ]
+        if packed:
+            columns.append(Column(PACKED_COLUMN, LargeBinary, nullable=False))
+        table = Table(name, _partition_metadata, *columns)
+        Index(f'ix_{name}_timestamp_us', table.c.timestamp_us)
+        Index(f'ix_{name}_device_time', table.c.device_id, table.c.timestamp_us, unique=True)
+        _partition_tables[name] = table
+    return table
+
+def ensure_partition(conn, name: str, start_us: int, end_us: int) -> Table:
+    """
+    Tworzy tabelę partycji i wpis w katalogu, jeśli jeszcze nie istnieją.
+
+    Nazwa jest zapamiętywana dopiero po commicie transakcji: przy wycofaniu
+    paczki wpis w katalogu znika razem z nią (a tabela może zostać), więc
+    kolejny zapis musi go odtworzyć, inaczej odczyty partycji byłyby
+    niewidoczne dla zapytań i retencji.
+    """
+    table = partition_table(name)
+    if name not in _known_partitions:
+        table.create(conn, checkfirst=True)
+        conn.execute(
+            sqlite_insert(CATALOG)
+            .values(name=name, start_us=start_us, end_us=end_us, row_count=0, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['name'])
+        )
+        _remember_after_commit(conn, name)
+    return table
+
+def _remember_after_commit(conn, name: str) -> None:
+    """Dodaje nazwę do _known_partitions po commicie transakcji połączenia conn."""
+    pending = _pending_partitions.get(conn)
+    if pending is None:
+        pending = _pending_partitions[conn] = set()
+
+        def on_commit(connection):
+            _known_partitions.update(pending)
+            _pending_partitions.pop(connection, None)
+
+        def on_rollback(connection):
+            pending.clear()
+            _pending_partitions.pop(connection, None)
+
+        event.listen(conn, 'commit', on_commit, once=True)
+        event.listen(conn, 'rollback', on_rollback, once=True)
+    pending.add(name)
+
+def insert_partitioned(conn, rows: List[dict], ignore_duplicates: bool = False) -> None:
+    """
+    Zapisuje wiersze do partycji odpowiadających ich znacznikom czasu.
+
+    W tej samej transakcji aktualizowane są liczniki w katalogu i mapy stref
+    partycji. Przy ignore_duplicates używane jest INSERT ... ON CONFLICT DO
+    NOTHING; liczniki zakładają, że duplikaty odfiltrowano wcześniej.
+    Do partycji packed zapisywane są wiersze z pomiarami upakowanymi w blob.
+    """
+    groups: Dict[tuple, List[dict]] = {}
+    for row in rows:
+        groups.setdefault(partition_bounds(row['timestamp_us']), []).append(row)
+    for (name, start_us, end_us), group in groups.items():
+        table = ensure_partition(conn, name, start_us, end_us)
+        stmt = sqlite_insert(table).on_conflict_do_nothing() if ignore_duplicates else insert(table)
+        packed = is_packed_name(name)
+        values = pack_rows(group) if packed else group
+        try:
+            conn.execute(stmt, values)
+        except OperationalError as e:
+            # Partycja usunięta przez inny proces po zapamiętaniu jej nazwy
+            if name not in _known_partitions or 'no such table' not in str(e.orig):
+                raise
+            logger.warning(f"Partycja {name} została usunięta poza tym procesem; tworzenie jej od nowa")
+            _known_partitions.discard(name)
+            ensure_partition(conn, name, start_us, end_us)
+            conn.execute(stmt, values)
+        conn.execute(
+            update(CATALOG)
+            .where(CATALOG.c.name == name)
+            .values(row_count=CATALOG.c.row_count + len(group))
+        )
+        update_partition_zones(conn, name, group, packed=packed)
+
+def partitions_in_range(conn, start_us: Optional[int] = None, end_us: Optional[int] = None) -> List[str]:
+    """
+    Zwraca nazwy partycji nakładających się na zakres [start_us, end_us].
+
+    Pozostałe partycje są pomijane (partition pruning) bez dotykania ich tabel.
+    """
+    query = select(CATALOG.c.name).order_by(CATALOG.c.start_us)
+    if start_us is not None:
+        query = query.where(CATALOG.c.end_us > start_us)
+    if end_us is not None:
+        query = query.where(CATALOG.c.start_us <= end_us)
+    return [row[0] for row in conn.execute(query)]
+
+def drop_partition(conn, name: str) -> None:
+    """Usuwa tabelę partycji, jej wpis w katalogu i mapę stref."""
+    conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+    conn.execute(delete(CATALOG).where(CATALOG.c.name == name))
+    delete_partition_zones(conn, name)
+    _known_partitions.discard(name)
+
+def drop_partitions_before(cutoff: datetime) -> Dict[str, int]:
+    """
+    Usuwa partycje kończące się przed podaną chwilą (retencja przez DROP TABLE).
+
+    Returns:
+        Dict nazwa partycji -> liczba usuniętych odczytów
+    """
+    cutoff_us = to_epoch_us(cutoff)
+    dropped = {}
+    with get_engine().begin() as conn:
+        rows = conn.execute(
+            select(CATALOG.c.name, CATALOG.c.row_count).where(CATALOG.c.end_us <= cutoff_us)
+        ).fetchall()
+        for name, row_count in rows:
+            drop_partition(conn, name)
+            dropped[name] = row_count
+    reset_known_partitions()
+    if dropped:
+        logger.info(f"Usunięto {len(dropped)} partycji ({sum(dropped.values())} odczytów)")
+    return dropped
+
+def _partitioned_keys(conn, keys: List[tuple]) -> set:
+    """
+    Zwraca klucze (device_id, timestamp_us) z listy, które są już w partycjach.
+
+    Partycje są wyszukiwane w katalogu po zakresie czasu, więc sprawdzane są
+    wszystkie partycje okresu klucza, niezależnie od ich układu zapisu
+    i schematu (także utworzone przed zmianą STORAGE_LAYOUT).
+    """
+    if not keys:
+        return set()
+    timestamps = [timestamp_us for _, timestamp_us in keys]
+    catalog = conn.execute(
+        select(CATALOG.c.name, CATALOG.c.start_us, CATALOG.c.end_us)
+        .where(CATALOG.c.end_us > min(timestamps), CATALOG.c.start_us <= max(timestamps))
+    ).fetchall()
+    found = set()
+    for name, start_us, end_us in catalog:
+        table = partition_table(name)
+        partition_keys = [key for key in keys if start_us <= key[1] < end_us]
+        for offset in range(0, len(partition_keys), KEY_LOOKUP_BATCH):
+            lookup = partition_keys[offset:offset + KEY_LOOKUP_BATCH]
+            found.update(tuple(row) for row in conn.execute(
+                select(table.c.device_id, table.c.timestamp_us)
+                .where(tuple_(table.c.device_id, table.c.timestamp_us).in_(lookup))
+            ))
+    return found
+
+def partition_existing_rows(batch_size: int = 10000) -> int:
+    """
+    Przenosi odczyty z tabeli sensor_readings do partycji.
+
+    Przenoszenie odbywa się paczkami (osobna transakcja na paczkę), aby nie
+    blokować zapisu na długo. Można je bezpiecznie powtórzyć po przerwaniu:
+    odczyty, które są już w partycjach, są pomijane (jak w upsert_sensor_rows).
+
+    Returns:
+        Liczba przeniesionych odczytów
+    """
+    if not partitioning_enabled():
+        raise ValueError("Partycjonowanie jest wyłączone")
+    columns = [c for c in READINGS.columns if c.name != 'id']
+    moved = 0
+    while True:
+        with get_engine().begin() as conn:
+            batch = conn.execute(
+                select(READINGS.c.id, *columns)
+                .where(READINGS.c.timestamp_us.isnot(None))
+                .order_by(READINGS.c.id)
+                .limit(batch_size)
+            ).fetchall()
+            if not batch:
+                break
+            rows: Dict[tuple, dict] = {}
+            for row in batch:
+                rows.setdefault((row.device_id, row.timestamp_us), {c.name: row._mapping[c.name] for c in columns})
+            # Odczyty skopiowane już przez przerwane wcześniej przenoszenie są
+            # pomijane, aby liczniki katalogu i mapy stref obejmowały tylko nowe
+            existing = _partitioned_keys(conn, list(rows))
+            new_rows = [row for key, row in rows.items() if key not in existing]
+            # Identyfikatory są nadawane na nowo w obrębie każdej partycji: id jest
+            # unikalne tylko w jednej tabeli, kluczem odczytu jest (device_id, timestamp_us)
+            if new_rows:
+                insert_partitioned(conn, new_rows, ignore_duplicates=True)
+            conn.execute(delete(READINGS).where(
+                READINGS.c.id <= batch[-1].id, READINGS.c.timestamp_us.isnot(None)
+            ))
+            moved += len(batch)
+    logger.info(f"Przeniesiono {moved} odczytów do partycji")
+    return moved
+
+def main():
+    """Zarządzanie partycjami z linii poleceń."""
+    from .db import init_db
+    parser = argparse.ArgumentParser(description="Zarządzanie partycjami sensor_readings")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help="Przenieś istniejące odczyty do partycji")
+    migrate.add_argument('--scheme', choices=PARTITION_SCHEMES[1:], default='day')
+    drop = subparsers.add_parser('drop-before', help="Usuń partycje starsze niż data")
+    drop.add_argument('cutoff', type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    if args.command == 'migrate':
+        configure_partitioning(args.scheme)
+        partition_existing_rows()
+    else:
+        drop_partitions_before(args.cutoff)
+
+if __name__ == "__main__":
+    main()
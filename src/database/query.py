@@ -0,0 +1,547 @@
+import functools
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import func, select, tuple_
+from .archive import archive_horizon_us, existing_keys, segments_in_range
+from .db import get_engine
+from .packed import PACKED_COLUMN, table_columns, unpack_blobs
+from .partitions import partition_table, partitions_in_range
+from .schema import SensorReading
+from .timeutils import to_epoch_us, from_epoch_us
+from .zonemaps import Predicate, array_mask, may_match, partition_zone_maps, sql_conditions, validate_predicates
+
+READINGS = SensorReading.__table__
+
+# Kolumny całkowitoliczbowe bez wartości NULL; pozostałe są zwracane jako float64 (NULL -> NaN)
+INTEGER_COLUMNS = {'id', 'timestamp_us'}
+# Kolumny tekstowe zwracane jako tablice object
+TEXT_COLUMNS = {'device_id'}
+
+def column_dtype(name: str) -> np.dtype:
+    """Zwraca typ NumPy dla kolumny sensor_readings (lub pseudo-kolumny timestamp)."""
+    if name == 'timestamp':
+        return np.dtype('datetime64[us]')
+    if name in INTEGER_COLUMNS:
+        return np.dtype(np.int64)
+    if name in TEXT_COLUMNS:
+        return np.dtype(object)
+    return np.dtype(np.float64)
+
+def _source_columns(columns: Sequence[str]) -> List[str]:
+    """Kolumny SQL potrzebne do zwrócenia żądanych kolumn (timestamp -> timestamp_us)."""
+    names = []
+    for name in columns:
+        source = 'timestamp_us' if name == 'timestamp' else name
+        if source not in READINGS.c:
+            raise ValueError(f"Nieznana kolumna sensor_readings: {name}")
+        if source not in names:
+            names.append(source)
+    return names
+
+def range_conditions(table, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     end_inclusive: bool = True, device_id: Optional[str] = None) -> list:
+    """Warunki zakresu czasu na kolumnie timestamp_us (i opcjonalnie urządzenia)."""
+    conditions = []
+    if device_id is not None:
+        conditions.append(table.c.device_id == device_id)
+    if start is not None:
+        conditions.append(table.c.timestamp_us >= to_epoch_us(start))
+    if end is not None:
+        end_us = to_epoch_us(end)
+        conditions.append(table.c.timestamp_us <= end_us if end_inclusive else table.c.timestamp_us < end_us)
+    return conditions
+
+def reading_sources(conn, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    """
+    Zwraca tabele z odczytami, które mogą zawierać dane z zakresu czasu.
+
+    Zawsze obejmuje sensor_readings (odczyty sprzed partycjonowania) oraz
+    partycje nakładające się na zakres, w kolejności czasu; pozostałe
+    partycje są pomijane.
+    """
+    start_us = to_epoch_us(start) if start is not None else None
+    end_us = to_epoch_us(end) if end is not None else None
+    return [READINGS] + [partition_table(name) for name in partitions_in_range(conn, start_us, end_us)]
+
+def archive_only(start: Optional[datetime], end: Optional[datetime], end_inclusive: bool = True,
+                 device_id: Optional[str] = None, conn=None) -> bool:
+    """
+    Czy zakres leży w całości w archiwum i SQLite nie ma z niego odczytów.
+
+    Zakres kończący się przed horyzontem archiwum może nadal mieć odczyty
+    w SQLite (spóźnione lub powtórzone po archiwizacji dnia, pozostałości
+    partycji tygodniowej na granicy horyzontu), dlatego przed pominięciem
+    SQLite wykonywane jest tanie sprawdzenie EXISTS na indeksie timestamp_us
+    każdej tabeli nakładającej się na zakres.
+    """
+    horizon_us = archive_horizon_us()
+    if horizon_us is None or end is None or to_epoch_us(end) >= horizon_us:
+        return False
+    with _connect(conn) as conn:
+        for table in reading_sources(conn, start, end):
+            probe = select(table.c.timestamp_us)\
+                .where(*range_conditions(table, start, end, end_inclusive, device_id))\
+                .limit(1)
+            if conn.execute(probe).first() is not None:
+                return False
+    return True
+
+def oldest_reading_us(conn) -> Optional[int]:
+    """
+    Znacznik czasu (µs) najstarszego odczytu w SQLite, partycjach lub archiwum.
+
+    Returns:
+        Najstarszy timestamp_us lub None, jeśli nie ma żadnych odczytów
+    """
+    oldest_us = None
+    for table in reading_sources(conn):
+        value = conn.execute(select(func.min(table.c.timestamp_us))).scalar()
+        if value is not None and (oldest_us is None or value < oldest_us):
+            oldest_us = value
+    for segment in segments_in_range():
+        if segment.row_count:
+            value = int(segment.column('timestamp_us')[0])
+            if oldest_us is None or value < oldest_us:
+                oldest_us = value
+            break
+    return oldest_us
+
+def _connect(conn=None):
+    """Kontekst połączenia: podane połączenie (bez zamykania) lub nowe połączenie silnika."""
+    return nullcontext(conn) if conn is not None else get_engine().connect()
+
+def archive_segments(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     device_id: Optional[str] = None) -> list:
+    """Zwraca segmenty archiwum nakładające się na zakres czasu (z odczytami urządzenia)."""
+    return segments_in_range(
+        to_epoch_us(start) if start is not None else None,
+        to_epoch_us(end) if end is not None else None,
+        device_id
+    )
+
+def _sort_by_time(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    order = np.argsort(arrays['timestamp_us'], kind='stable')
+    return {name: values[order] for name, values in arrays.items()}
+
+def _transpose(rows: Sequence[tuple], source_columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    arrays: Dict[str, np.ndarray] = {}
+    if rows:
+        for name, values in zip(source_columns, zip(*rows)):
+            if name == PACKED_COLUMN:
+                # Partycja packed: kolumny float32 jako widoki zdekodowanego bufora
+                arrays.update(unpack_blobs(values))
+            else:
+                arrays[name] = np.array(values, dtype=column_dtype(name))
+    else:
+        for name in source_columns:
+            arrays[name] = np.empty(0, dtype=column_dtype(name))
+    return arrays
+
+def _project(arrays: Dict[str, np.ndarray], columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    result = {}
+    for name in columns:
+        if name == 'timestamp':
+            # Widok bez kopiowania: int64 µs -> datetime64[us]
+            result[name] = arrays['timestamp_us'].view('datetime64[us]')
+        else:
+            result[name] = arrays[name]
+    return result
+
+def rows_to_arrays(rows: Sequence[tuple], source_columns: Sequence[str],
+                   columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Transponuje wiersze wyniku zapytania do ciągłych tablic NumPy (po jednej na kolumnę)."""
+    return _project(_transpose(rows, source_columns), columns)
+
+def fetch_columns(columns: Sequence[str], start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, end_inclusive: bool = True,
+                  limit: Optional[int] = None, latest: bool = False,
+                  device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Pobiera wybrane kolumny odczytów z zakresu czasu jako tablice NumPy.
+
+    Zapytanie Core select pobiera wyłącznie żądane kolumny, bez tworzenia
+    obiektów ORM, z sensor_readings i partycji nakładających się na zakres.
+    Pomiary z partycji packed są zwracane jako float32.
+    Pseudo-kolumna 'timestamp' jest zwracana jako datetime64[us] wyliczony
+    z timestamp_us.
+
+    Args:
+        columns: Nazwy kolumn sensor_readings
+        start: Początek zakresu (włącznie)
+        end: Koniec zakresu
+        end_inclusive: Czy koniec zakresu jest włączony
+        limit: Maksymalna liczba wierszy
+        latest: Przy limicie zwraca najnowsze wiersze zamiast najstarszych
+        device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+
+    Returns:
+        Dict kolumna -> tablica NumPy, wiersze rosnąco po czasie
+    """
+    source_columns = _source_columns(list(columns) + ['timestamp_us'])
+    start_us = to_epoch_us(start) if start is not None else None
+    end_us = to_epoch_us(end) if end is not None else None
+    parts = []
+    for segment in archive_segments(start, end, device_id):
+        part = segment.read(source_columns, start_us, end_us, end_inclusive, device_id)
+        if limit is not None:
+            part = {name: values[-limit:] if latest else values[:limit] for name, values in part.items()}
+        if len(part['timestamp_us']):
+            parts.append(part)
+    if archive_only(start, end, end_inclusive, device_id):
+        return _merge_parts(parts, source_columns, columns, limit, latest)
+
+    with get_engine().connect() as conn:
+        sources = reading_sources(conn, start, end)
+        if latest:
+            # Partycje od najnowszej, aby przy limicie zakończyć wcześniej
+            sources = sources[:1] + sources[:0:-1]
+        partition_rows = 0
+        for table in sources:
+            if limit is not None and partition_rows >= limit:
+                break
+            names = table_columns(table, source_columns)
+            stmt = select(*[table.c[name] for name in names])\
+                .where(*range_conditions(table, start, end, end_inclusive, device_id))
+            if latest:
+                stmt = stmt.order_by(table.c.timestamp_us.desc(), table.c.id.desc())
+            else:
+                stmt = stmt.order_by(table.c.timestamp_us, table.c.id)
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            rows = conn.execute(stmt).fetchall()
+            if table is not READINGS:
+                partition_rows += len(rows)
+            if rows:
+                parts.append(_transpose(rows[::-1] if latest else rows, names))
+
+    return _merge_parts(parts, source_columns, columns, limit, latest)
+
+def _merge_parts(parts: list, source_columns: Sequence[str], columns: Sequence[str],
+                 limit: Optional[int], latest: bool) -> Dict[str, np.ndarray]:
+    """Łączy fragmenty z archiwum i tabel SQLite w jeden wynik posortowany po czasie."""
+    if not parts:
+        return _project(_transpose([], source_columns), columns)
+    if len(parts) == 1:
+        # Jeden fragment (np. pojedynczy segment archiwum) zwracamy bez kopiowania
+        arrays = parts[0]
+    else:
+        # Odczyty z kilku źródeł łączymy i porządkujemy po czasie
+        arrays = _sort_by_time({
+            name: np.concatenate([part[name] for part in parts]) for name in source_columns
+        })
+    if limit is not None:
+        arrays = {
+            name: values[-limit:] if latest else values[:limit]
+            for name, values in arrays.items()
+        }
+    return _project(arrays, columns)
+
+def fetch_structured(columns: Sequence[str], start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, end_inclusive: bool = True,
+                     limit: Optional[int] = None, latest: bool = False,
+                     device_id: Optional[str] = None) -> np.ndarray:
+    """Jak fetch_columns, ale zwraca jedną tablicę strukturalną NumPy."""
+    arrays = fetch_columns(columns, start, end, end_inclusive, limit, latest, device_id)
+    dtype = np.dtype([(name, arrays[name].dtype) for name in columns])
+    result = np.empty(len(arrays[columns[0]]) if columns else 0, dtype=dtype)
+    for name in columns:
+        result[name] = arrays[name]
+    return result
+
+def count_rows(start: Optional[datetime] = None, end: Optional[datetime] = None,
+               end_inclusive: bool = True, device_id: Optional[str] = None) -> int:
+    """Zwraca liczbę odczytów w zakresie czasu (skan indeksu timestamp_us i archiwum)."""
+    start_us = to_epoch_us(start) if start is not None else None
+    end_us = to_epoch_us(end) if end is not None else None
+    total = 0
+    for segment in archive_segments(start, end, device_id):
+        total += segment.count(start_us, end_us, end_inclusive, device_id)
+    if archive_only(start, end, end_inclusive, device_id):
+        return total
+    with get_engine().connect() as conn:
+        for table in reading_sources(conn, start, end):
+            stmt = select(func.count()).select_from(table)\
+                .where(*range_conditions(table, start, end, end_inclusive, device_id))
+            total += conn.execute(stmt).scalar()
+    return total
+
+def iter_column_chunks(columns: Sequence[str], start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, end_inclusive: bool = True,
+                       chunk_size: int = 10000, device_id: Optional[str] = None,
+                       conn=None) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Strumieniowo zwraca odczyty z zakresu czasu w paczkach stałej wielkości.
+
+    Każde źródło (segment archiwum, sensor_readings, partycja) jest czytane
+    paczkami: segmenty jako widoki plików mapowanych w pamięci, tabele
+    zapytaniami ze stronicowaniem po kluczu (timestamp_us, id), więc kolejne
+    strony są odczytywane z indeksu bez OFFSET. Paczki źródeł są scalane po
+    timestamp_us (zob. _merge_sources), więc także odczyty spóźnione
+    zapisane w SQLite poniżej horyzontu archiwum trafiają na swoje miejsce.
+    Źródło jest otwierane dopiero, gdy scalanie dojdzie do jego pierwszego
+    odczytu, więc zużycie pamięci nie zależy od długości okna.
+
+    Args:
+        columns: Nazwy kolumn sensor_readings (jak w fetch_columns)
+        start: Początek zakresu (włącznie)
+        end: Koniec zakresu
+        end_inclusive: Czy koniec zakresu jest włączony
+        chunk_size: Maksymalna liczba wierszy w paczce
+        device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+        conn: Połączenie do odczytu, np. z otwartą transakcją migracji
+            (domyślnie nowe połączenie na każdą paczkę)
+
+    Yields:
+        Dict kolumna -> tablica NumPy dla kolejnych paczek, rosnąco po czasie
+    """
+    source_columns = _source_columns(list(columns) + ['timestamp_us', 'id'])
+    start_us = to_epoch_us(start) if start is not None else None
+    end_us = to_epoch_us(end) if end is not None else None
+
+    # Źródła jako (pierwszy timestamp_us, funkcja otwierająca iterator paczek)
+    sources = []
+    for segment in archive_segments(start, end, device_id):
+        lo, hi = segment.slice_bounds(start_us, end_us, end_inclusive)
+        if lo < hi:
+            sources.append((int(segment.column('timestamp_us')[lo]), functools.partial(
+                _segment_chunks, segment, source_columns, lo, hi, chunk_size, device_id
+            )))
+    if not archive_only(start, end, end_inclusive, device_id, conn):
+        with _connect(conn) as source_conn:
+            for table in reading_sources(source_conn, start, end):
+                first_us = source_conn.execute(
+                    select(func.min(table.c.timestamp_us))
+                    .where(*range_conditions(table, start, end, end_inclusive, device_id))
+                ).scalar()
+                if first_us is not None:
+                    sources.append((first_us, functools.partial(
+                        _table_chunks, table, source_columns, start, end, end_inclusive,
+                        chunk_size, device_id, conn
+                    )))
+
+    for arrays in _merge_sources(sources, source_columns, chunk_size):
+        yield _project(arrays, columns)
+
+def _segment_chunks(segment, source_columns: Sequence[str], lo: int, hi: int, chunk_size: int,
+                    device_id: Optional[str]) -> Iterator[Dict[str, np.ndarray]]:
+    """Paczki wierszy [lo, hi) segmentu archiwum (widoki plików mapowanych w pamięci)."""
+    for offset in range(lo, hi, chunk_size):
+        yield segment.read_rows(source_columns, offset, min(offset + chunk_size, hi), device_id)
+
+def _table_chunks(table, source_columns: Sequence[str], start: Optional[datetime], end: Optional[datetime],
+                  end_inclusive: bool, chunk_size: int, device_id: Optional[str],
+                  conn=None) -> Iterator[Dict[str, np.ndarray]]:
+    """Paczki wierszy tabeli ze stronicowaniem po kluczu (timestamp_us, id)."""
+    names = table_columns(table, source_columns)
+    ts_index, id_index = names.index('timestamp_us'), names.index('id')
+    base = select(*[table.c[name] for name in names])\
+        .where(*range_conditions(table, start, end, end_inclusive, device_id))\
+        .order_by(table.c.timestamp_us, table.c.id)\
+        .limit(chunk_size)
+    last_key = None
+    while True:
+        stmt = base
+        if last_key is not None:
+            stmt = stmt.where(tuple_(table.c.timestamp_us, table.c.id) > tuple_(*last_key))
+        with _connect(conn) as chunk_conn:
+            rows = chunk_conn.execute(stmt).fetchall()
+        if not rows:
+            return
+        last_key = (rows[-1][ts_index], rows[-1][id_index])
+        arrays = _transpose(rows, names)
+        yield {name: arrays[name] for name in source_columns}
+        if len(rows) < chunk_size:
+            return
+
+class _ChunkCursor:
+    """Bieżąca (niewydana) część paczki jednego źródła scalania."""
+
+    def __init__(self, chunks: Iterator[Dict[str, np.ndarray]]):
+        self._chunks = chunks
+        self.arrays: Optional[Dict[str, np.ndarray]] = None
+        self.advance()
+
+    def advance(self) -> None:
+        """Przechodzi do następnej niepustej paczki (arrays = None po ostatniej)."""
+        self.arrays = next((chunk for chunk in self._chunks if len(chunk['timestamp_us'])), None)
+
+    @property
+    def first_us(self) -> int:
+        return int(self.arrays['timestamp_us'][0])
+
+    @property
+    def last_us(self) -> int:
+        return int(self.arrays['timestamp_us'][-1])
+
+    def take_until(self, limit_us: int) -> Optional[Dict[str, np.ndarray]]:
+        """Zwraca i usuwa z paczki wiersze z timestamp_us <= limit_us."""
+        cut = int(np.searchsorted(self.arrays['timestamp_us'], limit_us, side='right'))
+        if not cut:
+            return None
+        taken = {name: values[:cut] for name, values in self.arrays.items()}
+        self.arrays = {name: values[cut:] for name, values in self.arrays.items()}
+        if not len(self.arrays['timestamp_us']):
+            self.advance()
+        return taken
+
+def _merge_sources(sources: List[tuple], source_columns: Sequence[str],
+                   chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Scala posortowane paczki wielu źródeł w paczki rosnące po timestamp_us.
+
+    Args:
+        sources: Lista (pierwszy timestamp_us źródła, funkcja zwracająca
+            iterator jego paczek posortowanych po czasie)
+        source_columns: Kolumny paczek
+        chunk_size: Maksymalna liczba wierszy w zwracanej paczce
+
+    W każdym kroku wydawane są wiersze nie późniejsze niż najwcześniejszy
+    koniec bieżących paczek aktywnych źródeł (dalsze wiersze tego źródła
+    nie mogą być wcześniejsze) i wcześniejsze niż początek kolejnego
+    nieotwartego źródła. W pamięci są więc najwyżej po jednej paczce
+    źródeł nakładających się w czasie.
+    """
+    pending = deque(sorted(sources, key=lambda source: source[0]))
+    active: List[_ChunkCursor] = []
+    while pending or active:
+        head_us = min((cursor.first_us for cursor in active), default=None)
+        while pending and (head_us is None or pending[0][0] <= head_us):
+            cursor = _ChunkCursor(pending.popleft()[1]())
+            if cursor.arrays is not None:
+                active.append(cursor)
+                head_us = cursor.first_us if head_us is None else min(head_us, cursor.first_us)
+        if not active:
+            continue
+        limit_us = min(cursor.last_us for cursor in active)
+        if pending:
+            limit_us = min(limit_us, pending[0][0] - 1)
+        parts = [part for part in (cursor.take_until(limit_us) for cursor in active) if part is not None]
+        active = [cursor for cursor in active if cursor.arrays is not None]
+        if len(parts) == 1:
+            arrays = parts[0]
+        else:
+            arrays = _sort_by_time({
+                name: np.concatenate([part[name] for part in parts]) for name in source_columns
+            })
+        for offset in range(0, len(arrays['timestamp_us']), chunk_size):
+            yield {name: values[offset:offset + chunk_size] for name, values in arrays.items()}
+
+# Liczba kluczy w jednym zapytaniu (device_id, timestamp_us) IN (...) (2 parametry na klucz)
+KEY_LOOKUP_BATCH = 400
+
+def existing_reading_keys(conn, keys: Sequence[tuple]) -> set:
+    """
+    Zwraca klucze (device_id, timestamp_us) z listy, które są już zapisane.
+
+    Sprawdzane są tabele SQLite obejmujące zakres czasu kluczy (przez
+    unikalny indeks device_id, timestamp_us) oraz archiwum, więc koszt
+    zależy od liczby kluczy, a nie od liczby zapisanych odczytów.
+    """
+    keys = [key for key in keys if key[1] is not None]
+    if not keys:
+        return set()
+    timestamps = [timestamp_us for _, timestamp_us in keys]
+    start, end = from_epoch_us(min(timestamps)), from_epoch_us(max(timestamps))
+    found = existing_keys(keys)
+    for table in reading_sources(conn, start, end):
+        key_columns = tuple_(table.c.device_id, table.c.timestamp_us)
+        for offset in range(0, len(keys), KEY_LOOKUP_BATCH):
+            stmt = select(table.c.device_id, table.c.timestamp_us)\
+                .where(key_columns.in_(keys[offset:offset + KEY_LOOKUP_BATCH]))
+            found.update((device_id, timestamp_us) for device_id, timestamp_us in conn.execute(stmt))
+    return found
+
+def matching_sources(predicates: Sequence[Predicate], start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, device_id: Optional[str] = None) -> tuple:
+    """
+    Zwraca segmenty archiwum i tabele, które mogą zawierać wiersze spełniające predykaty.
+
+    Segmenty archiwum i partycje, których mapy stref wykluczają dopasowanie,
+    są pomijane bez czytania danych; tabela sensor_readings nie ma mapy stref
+    i jest zawsze przeszukiwana (przez SQL).
+
+    Returns:
+        (lista segmentów archiwum, lista tabel SQLite)
+    """
+    validate_predicates(predicates)
+    segments = [
+        segment for segment in archive_segments(start, end, device_id)
+        if may_match(segment.zone_map, predicates)
+    ]
+    if archive_only(start, end, device_id=device_id):
+        return segments, []
+    with get_engine().connect() as conn:
+        sources = reading_sources(conn, start, end)
+        zone_maps = partition_zone_maps(conn, [table.name for table in sources[1:]])
+    tables = [
+        table for table in sources
+        if table is READINGS or may_match(zone_maps.get(table.name), predicates)
+    ]
+    return segments, tables
+
+def fetch_matching(columns: Sequence[str], predicates: Sequence[Predicate],
+                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   end_inclusive: bool = True, device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Pobiera odczyty spełniające predykaty wartości (np. lux > 50000).
+
+    Koszt zależy od liczby segmentów i partycji, które mogą zawierać
+    dopasowania, a nie od długości całej historii (zob. matching_sources).
+    Predykaty na pomiarach z partycji packed są sprawdzane po dekodowaniu.
+
+    Args:
+        columns: Nazwy kolumn sensor_readings (jak w fetch_columns)
+        predicates: Lista (kolumna, operator, wartość) łączonych przez AND;
+            operatory: <, <=, >, >=, ==, between (lo, hi), outside (lo, hi)
+        start: Początek zakresu (włącznie)
+        end: Koniec zakresu
+        end_inclusive: Czy koniec zakresu jest włączony
+        device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+
+    Returns:
+        Dict kolumna -> tablica NumPy, wiersze rosnąco po czasie
+    """
+    segments, tables = matching_sources(predicates, start, end, device_id)
+    source_columns = _source_columns(list(columns) + ['timestamp_us'])
+    read_columns = _source_columns(source_columns + [column for column, _, _ in predicates])
+    start_us = to_epoch_us(start) if start is not None else None
+    end_us = to_epoch_us(end) if end is not None else None
+
+    parts = []
+    for segment in segments:
+        arrays = segment.read(read_columns, start_us, end_us, end_inclusive, device_id)
+        mask = array_mask(arrays, predicates)
+        if mask.any():
+            parts.append({name: arrays[name][mask] for name in source_columns})
+    if tables:
+        with get_engine().connect() as conn:
+            for table in tables:
+                # Predykaty na kolumnach tabeli są wykonywane w SQL, pozostałe
+                # (upakowane w blob) na zdekodowanych tablicach
+                pushed = [predicate for predicate in predicates if predicate[0] in table.c]
+                remaining = [predicate for predicate in predicates if predicate[0] not in table.c]
+                names = table_columns(table, read_columns if remaining else source_columns)
+                stmt = select(*[table.c[name] for name in names])\
+                    .where(*range_conditions(table, start, end, end_inclusive, device_id))\
+                    .where(*sql_conditions(table, pushed))\
+                    .order_by(table.c.timestamp_us, table.c.id)
+                rows = conn.execute(stmt).fetchall()
+                if not rows:
+                    continue
+                arrays = _transpose(rows, names)
+                if remaining:
+                    mask = array_mask(arrays, remaining)
+                    arrays = {name: arrays[name][mask] for name in source_columns}
+                parts.append(arrays)
+    return _merge_parts(parts, source_columns, columns, None, False)
+
+def iter_frame_chunks(columns: Sequence[str], start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, end_inclusive: bool = True,
+                      chunk_size: int = 10000, device_id: Optional[str] = None):
+    """Jak iter_column_chunks, ale zwraca paczki jako pandas.DataFrame."""
+    import pandas as pd
+    for chunk in iter_column_chunks(columns, start, end, end_inclusive, chunk_size, device_id):
+        yield pd.DataFrame(chunk, columns=list(columns))
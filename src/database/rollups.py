@@ -0,0 +1,522 @@
+import argparse
+import logging
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import and_, delete, func, insert, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .archive import archive_horizon_us, segments_in_range
+from .db import get_engine
+from .packed import is_packed, table_columns, unpack_blobs, unpack_rows
+from .query import archive_only, range_conditions, reading_sources
+from .schema import DEFAULT_DEVICE_ID, ROLLUP_AGGREGATES, ROLLUP_COLUMNS, ROLLUP_RESOLUTIONS, ROLLUP_TABLES
+from .timeutils import to_epoch_us, from_epoch_us
+
+logger = logging.getLogger("Rollups")
+
+# Od najgrubszej do najdrobniejszej rozdzielczości
+RESOLUTIONS_COARSEST_FIRST = sorted(ROLLUP_RESOLUTIONS, key=ROLLUP_RESOLUTIONS.get, reverse=True)
+
+# Liczba wierszy partycji packed agregowanych naraz przy przebudowie
+REBUILD_CHUNK_SIZE = 10000
+
+# Klucze agregatów dla każdej kolumny, wyliczone raz (gorąca pętla ingestu)
+_AGGREGATE_KEYS = [
+    (name,) + tuple(f'{name}_{aggregate}' for aggregate in ROLLUP_AGGREGATES)
+    for name in ROLLUP_COLUMNS
+]
+
+def _empty_aggregate(device_id: str, bucket_us: int) -> dict:
+    aggregate = {'device_id': device_id, 'bucket_us': bucket_us, 'count': 0}
+    for name in ROLLUP_COLUMNS:
+        aggregate.update({
+            f'{name}_n': 0, f'{name}_sum': None, f'{name}_sumsq': None,
+            f'{name}_min': None, f'{name}_max': None
+        })
+    return aggregate
+
+def _merge_into(target: dict, source: dict) -> None:
+    """Dołącza agregaty source do target (oba w formacie wiersza rollup)."""
+    target['count'] += source['count']
+    for name in ROLLUP_COLUMNS:
+        n = source[f'{name}_n']
+        if not n:
+            continue
+        if target[f'{name}_n']:
+            target[f'{name}_sum'] += source[f'{name}_sum']
+            target[f'{name}_sumsq'] += source[f'{name}_sumsq']
+            target[f'{name}_min'] = min(target[f'{name}_min'], source[f'{name}_min'])
+            target[f'{name}_max'] = max(target[f'{name}_max'], source[f'{name}_max'])
+        else:
+            for aggregate in ('sum', 'sumsq', 'min', 'max'):
+                target[f'{name}_{aggregate}'] = source[f'{name}_{aggregate}']
+        target[f'{name}_n'] += n
+
+def aggregate_rows(rows: Iterable[dict]) -> Dict[str, List[dict]]:
+    """
+    Agreguje wiersze sensor_readings do kubełków (urządzenie, czas) wszystkich rozdzielczości.
+
+    Args:
+        rows: Wiersze zawierające timestamp_us, device_id i kolumny z ROLLUP_COLUMNS
+
+    Returns:
+        Dict rozdzielczość -> lista wierszy rollup dla kubełków z tej paczki
+    """
+    finest = min(ROLLUP_RESOLUTIONS, key=ROLLUP_RESOLUTIONS.get)
+    width = ROLLUP_RESOLUTIONS[finest]
+    buckets: Dict[tuple, dict] = {}
+    for row in rows:
+        device_id = row.get('device_id') or DEFAULT_DEVICE_ID
+        bucket_us = row['timestamp_us'] - row['timestamp_us'] % width
+        aggregate = buckets.get((device_id, bucket_us))
+        if aggregate is None:
+            aggregate = buckets[device_id, bucket_us] = _empty_aggregate(device_id, bucket_us)
+        aggregate['count'] += 1
+        for name, n_key, sum_key, sumsq_key, min_key, max_key in _AGGREGATE_KEYS:
+            value = row.get(name)
+            if value is None:
+                continue
+            if aggregate[n_key]:
+                aggregate[sum_key] += value
+                aggregate[sumsq_key] += value * value
+                if value < aggregate[min_key]:
+                    aggregate[min_key] = value
+                if value > aggregate[max_key]:
+                    aggregate[max_key] = value
+            else:
+                aggregate[sum_key] = value
+                aggregate[sumsq_key] = value * value
+                aggregate[min_key] = aggregate[max_key] = value
+            aggregate[n_key] += 1
+
+    # Grubsze rozdzielczości składamy z kubełków najdrobniejszych
+    result = {finest: list(buckets.values())}
+    for resolution, width in ROLLUP_RESOLUTIONS.items():
+        if resolution == finest:
+            continue
+        coarse: Dict[tuple, dict] = {}
+        for aggregate in result[finest]:
+            key = (aggregate['device_id'], aggregate['bucket_us'] - aggregate['bucket_us'] % width)
+            if key not in coarse:
+                coarse[key] = _empty_aggregate(*key)
+            _merge_into(coarse[key], aggregate)
+        result[resolution] = list(coarse.values())
+    return result
+
+_upsert_statements = {}
+
+def _upsert_statement(table):
+    """INSERT ... ON CONFLICT(device_id, bucket_us) DO UPDATE łączący agregaty kubełka."""
+    if table.name in _upsert_statements:
+        return _upsert_statements[table.name]
+    stmt = sqlite_insert(table)
+    excluded = stmt.excluded
+    updates = {'count': table.c['count'] + excluded['count']}
+    for name in ROLLUP_COLUMNS:
+        updates[f'{name}_n'] = table.c[f'{name}_n'] + excluded[f'{name}_n']
+        for aggregate in ('sum', 'sumsq'):
+            current, new = table.c[f'{name}_{aggregate}'], excluded[f'{name}_{aggregate}']
+            updates[f'{name}_{aggregate}'] = func.coalesce(current + new, current, new)
+        for aggregate, scalar in (('min', func.min), ('max', func.max)):
+            current, new = table.c[f'{name}_{aggregate}'], excluded[f'{name}_{aggregate}']
+            # Skalarne min()/max() SQLite zwracają NULL, gdy któryś argument jest NULL
+            updates[f'{name}_{aggregate}'] = func.coalesce(scalar(current, new), current, new)
+    stmt = stmt.on_conflict_do_update(index_elements=['device_id', 'bucket_us'], set_=updates)
+    _upsert_statements[table.name] = stmt
+    return stmt
+
+def update_rollups(conn, rows: List[dict]) -> None:
+    """
+    Przyrostowo aktualizuje tabele rollup o paczkę nowych wierszy.
+
+    Wywoływane w tej samej transakcji co zapis odczytów, więc rollupy
+    zawsze odpowiadają zawartości sensor_readings.
+    """
+    if not rows:
+        return
+    for resolution, aggregates in aggregate_rows(rows).items():
+        conn.execute(_upsert_statement(ROLLUP_TABLES[resolution]), aggregates)
+
+def _range_conditions(table, start_us: Optional[int], end_us: Optional[int]) -> list:
+    conditions = [table.c.timestamp_us.isnot(None)]
+    if start_us is not None:
+        conditions.append(table.c.timestamp_us >= start_us)
+    if end_us is not None:
+        conditions.append(table.c.timestamp_us < end_us)
+    return conditions
+
+def _readings_in_range(conn, tables: list, start_us: Optional[int], end_us: Optional[int]):
+    """Podzapytanie UNION ALL odczytów z podanych tabel (sensor_readings i partycji) w zakresie."""
+    selects = []
+    for table in tables:
+        conditions = _range_conditions(table, start_us, end_us)
+        columns = [table.c.timestamp_us, table.c.device_id] + [table.c[name] for name in ROLLUP_COLUMNS]
+        selects.append(select(*columns).where(and_(*conditions)))
+    return union_all(*selects).subquery() if len(selects) > 1 else selects[0].subquery()
+
+def _aggregate_packed(conn, table, start_us: Optional[int], end_us: Optional[int]) -> int:
+    """
+    Dołącza do rollupów odczyty partycji packed, agregowane w Pythonie.
+
+    SQL nie odczyta pomiarów z blobu, więc wiersze są dekodowane paczkami
+    i łączone z kubełkami przez ten sam upsert co przy zapisie.
+    """
+    names = table_columns(table, ['id', 'timestamp_us', 'device_id'] + ROLLUP_COLUMNS)
+    conditions = _range_conditions(table, start_us, end_us)
+    buckets = 0
+    last_id = None
+    while True:
+        query = select(*[table.c[name] for name in names]).where(*conditions)\
+            .order_by(table.c.id).limit(REBUILD_CHUNK_SIZE)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = conn.execute(query).fetchall()
+        if not rows:
+            break
+        for resolution, aggregates in aggregate_rows(unpack_rows(rows, names)).items():
+            conn.execute(_upsert_statement(ROLLUP_TABLES[resolution]), aggregates)
+            buckets += len(aggregates)
+        last_id = rows[-1].id
+        if len(rows) < REBUILD_CHUNK_SIZE:
+            break
+    return buckets
+
+def _rebuild(conn, start_us: Optional[int], end_us: Optional[int]) -> int:
+    sources = reading_sources(
+        conn,
+        from_epoch_us(start_us) if start_us is not None else None,
+        from_epoch_us(end_us) if end_us is not None else None
+    )
+    # sensor_readings nigdy nie jest packed, więc lista tabel SQL nie jest pusta
+    readings = _readings_in_range(conn, [table for table in sources if not is_packed(table)], start_us, end_us)
+
+    buckets = 0
+    for resolution, width in ROLLUP_RESOLUTIONS.items():
+        table = ROLLUP_TABLES[resolution]
+        cleanup = delete(table)
+        if start_us is not None:
+            cleanup = cleanup.where(table.c.bucket_us >= start_us)
+        if end_us is not None:
+            cleanup = cleanup.where(table.c.bucket_us < end_us)
+        conn.execute(cleanup)
+
+        bucket = (readings.c.timestamp_us - readings.c.timestamp_us % width).label('bucket_us')
+        columns = [readings.c.device_id, bucket, func.count().label('count')]
+        names = ['device_id', 'bucket_us', 'count']
+        for name in ROLLUP_COLUMNS:
+            value = readings.c[name]
+            columns += [func.count(value), func.sum(value), func.sum(value * value),
+                        func.min(value), func.max(value)]
+            names += [f'{name}_{aggregate}' for aggregate in ROLLUP_AGGREGATES]
+        query = select(*columns).group_by(readings.c.device_id, bucket)
+        result = conn.execute(insert(table).from_select(names, query))
+        buckets += result.rowcount or 0
+
+    # Kubełki z partycji packed są scalane z już wstawionymi (po wyczyszczeniu zakresu)
+    for table in sources:
+        if is_packed(table):
+            buckets += _aggregate_packed(conn, table, start_us, end_us)
+    return buckets
+
+def _day_floor(epoch_us: int) -> int:
+    width = ROLLUP_RESOLUTIONS['1d']
+    return epoch_us - epoch_us % width
+
+def rebuild_rollups(start: Optional[datetime] = None, end: Optional[datetime] = None, conn=None) -> int:
+    """
+    Przelicza rollupy od nowa z surowych odczytów (backfill starszych danych).
+
+    Zakres jest rozszerzany do pełnych dni, aby każdy kubełek był liczony
+    z kompletu odczytów. Odczyty przeniesione do archiwum lub usunięte przez
+    retencję nie są już w SQLite, dlatego zakres zaczyna się najwcześniej od
+    horyzontu archiwum i od najstarszego odczytu, a starsze rollupy pozostają
+    bez zmian.
+
+    Args:
+        start: Początek zakresu (domyślnie od pierwszego odczytu w SQLite)
+        end: Koniec zakresu, wyłącznie (domyślnie do ostatniego odczytu)
+        conn: Istniejące połączenie (np. w trakcie migracji)
+
+    Returns:
+        Liczba utworzonych kubełków (we wszystkich rozdzielczościach)
+    """
+    width = ROLLUP_RESOLUTIONS['1d']
+    start_us = _day_floor(to_epoch_us(start)) if start is not None else None
+    end_us = None
+    if end is not None:
+        end_us = to_epoch_us(end)
+        if end_us % width:
+            end_us = _day_floor(end_us) + width
+    horizon_us = archive_horizon_us()
+    if horizon_us is not None and (start_us is None or start_us < horizon_us):
+        if start_us is not None:
+            logger.warning(f"Zakres przebudowy obcięty do horyzontu archiwum ({from_epoch_us(horizon_us)})")
+        start_us = horizon_us
+        if end_us is not None and end_us <= start_us:
+            return 0
+
+    if conn is not None:
+        return _rebuild_from_oldest(conn, start_us, end_us)
+    with get_engine().begin() as conn:
+        buckets = _rebuild_from_oldest(conn, start_us, end_us)
+    logger.info(f"Przebudowano rollupy: {buckets} kubełków")
+    return buckets
+
+def _rebuild_from_oldest(conn, start_us: Optional[int], end_us: Optional[int]) -> int:
+    """Przebudowa bez usuwania kubełków sprzed najstarszego odczytu w SQLite."""
+    oldest_us = None
+    for table in reading_sources(conn):
+        value = conn.execute(select(func.min(table.c.timestamp_us))).scalar()
+        if value is not None and (oldest_us is None or value < oldest_us):
+            oldest_us = value
+    if oldest_us is None:
+        return 0
+    if start_us is None or start_us < _day_floor(oldest_us):
+        start_us = _day_floor(oldest_us)
+    if end_us is not None and end_us <= start_us:
+        return 0
+    return _rebuild(conn, start_us, end_us)
+
+def pick_resolution(start_us: int, end_us: int) -> Optional[str]:
+    """Zwraca najgrubszą rozdzielczość, której kubełki dokładnie pokrywają [start, end)."""
+    for resolution in RESOLUTIONS_COARSEST_FIRST:
+        width = ROLLUP_RESOLUTIONS[resolution]
+        if start_us % width == 0 and end_us % width == 0:
+            return resolution
+    return None
+
+def get_rollup_statistics(start: datetime, end: datetime, columns: List[str],
+                          device_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    Oblicza statystyki okna [start, end) z najgrubszego pasującego rollupu.
+
+    Koszt zależy od liczby kubełków, a nie od liczby odczytów.
+
+    Args:
+        start: Początek okna
+        end: Koniec okna (wyłącznie)
+        columns: Kolumny z ROLLUP_COLUMNS
+        device_id: Urządzenie (domyślnie wszystkie urządzenia łącznie)
+
+    Returns:
+        Dict {'count': liczba odczytów, kolumna: {'min', 'max', 'mean', 'std', 'count'}}
+        lub None, jeśli granice okna nie pokrywają się z żadnym rollupem
+    """
+    start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+    resolution = pick_resolution(start_us, end_us)
+    if resolution is None:
+        return None
+
+    table = ROLLUP_TABLES[resolution]
+    query = select(table).where(and_(table.c.bucket_us >= start_us, table.c.bucket_us < end_us))
+    if device_id is not None:
+        query = query.where(table.c.device_id == device_id)
+    total = _empty_aggregate(device_id, start_us)
+    with get_engine().connect() as conn:
+        for row in conn.execute(query).mappings():
+            _merge_into(total, row)
+    return aggregate_statistics(total, columns)
+
+def aggregate_statistics(total, columns: List[str]) -> Dict:
+    """
+    Wylicza statystyki z agregatów w formacie wiersza rollup.
+
+    Odchylenie standardowe (próbkowe, n - 1) pochodzi z sumy i sumy kwadratów.
+
+    Returns:
+        Dict {'count': liczba odczytów, kolumna: {'min', 'max', 'mean', 'std', 'count'}}
+    """
+    stats = {'count': total['count']}
+    for name in columns:
+        n = total[f'{name}_n']
+        mean = total[f'{name}_sum'] / n if n else math.nan
+        if n > 1:
+            variance = (total[f'{name}_sumsq'] - n * mean * mean) / (n - 1)
+            std = math.sqrt(max(variance, 0.0))
+        else:
+            std = math.nan
+        stats[name] = {
+            'min': total[f'{name}_min'] if n else math.nan,
+            'max': total[f'{name}_max'] if n else math.nan,
+            'mean': mean,
+            'std': std,
+            'count': n
+        }
+    return stats
+
+def get_rollup_statistics_by_bucket(start: datetime, end: datetime, columns: List[str],
+                                    resolution: str = '1d',
+                                    device_id: Optional[str] = None) -> Dict[datetime, Dict]:
+    """
+    Oblicza statystyki każdego kubełka rollupu w oknie [start, end) jednym zapytaniem.
+
+    Kubełki urządzeń są łączone w SQL (GROUP BY bucket_us: sumy, liczności,
+    MIN, MAX), więc koszt zależy od liczby kubełków, a nie od długości okna.
+
+    Args:
+        start: Początek okna
+        end: Koniec okna (wyłącznie)
+        columns: Kolumny z ROLLUP_COLUMNS
+        resolution: Rozdzielczość z ROLLUP_RESOLUTIONS (domyślnie doba)
+        device_id: Urządzenie (domyślnie wszystkie urządzenia łącznie)
+
+    Returns:
+        Dict początek kubełka -> statystyki jak w get_rollup_statistics
+        (tylko kubełki z odczytami, rosnąco po czasie)
+    """
+    table = ROLLUP_TABLES[resolution]
+    aggregates = [func.sum(table.c['count']).label('count')]
+    for name in columns:
+        aggregates += [
+            func.sum(table.c[f'{name}_n']).label(f'{name}_n'),
+            func.sum(table.c[f'{name}_sum']).label(f'{name}_sum'),
+            func.sum(table.c[f'{name}_sumsq']).label(f'{name}_sumsq'),
+            func.min(table.c[f'{name}_min']).label(f'{name}_min'),
+            func.max(table.c[f'{name}_max']).label(f'{name}_max')
+        ]
+    query = select(table.c.bucket_us, *aggregates)\
+        .where(table.c.bucket_us >= to_epoch_us(start), table.c.bucket_us < to_epoch_us(end))\
+        .group_by(table.c.bucket_us)\
+        .order_by(table.c.bucket_us)
+    if device_id is not None:
+        query = query.where(table.c.device_id == device_id)
+    with get_engine().connect() as conn:
+        rows = conn.execute(query).mappings().fetchall()
+    return {
+        from_epoch_us(row['bucket_us']): aggregate_statistics(row, columns)
+        for row in rows if row['count']
+    }
+
+def _array_aggregates(arrays: Dict[str, np.ndarray], width: Optional[int], key_us: int) -> List[dict]:
+    """Agreguje kolumny NumPy (NaN = brak wartości) do kubełków o szerokości width µs."""
+    timestamps = arrays['timestamp_us']
+    if not len(timestamps):
+        return []
+    buckets = timestamps - timestamps % width if width else np.full(len(timestamps), key_us)
+    order = np.argsort(buckets, kind='stable')
+    buckets = buckets[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    aggregates = [_empty_aggregate(None, int(buckets[i])) for i in starts]
+    for aggregate, count in zip(aggregates, counts):
+        aggregate['count'] = int(count)
+    for name in ROLLUP_COLUMNS:
+        values = np.asarray(arrays[name], dtype=np.float64)[order]
+        valid = ~np.isnan(values)
+        present = np.where(valid, values, 0.0)
+        n = np.add.reduceat(valid.astype(np.int64), starts)
+        sums = np.add.reduceat(present, starts)
+        sumsq = np.add.reduceat(present * present, starts)
+        # fmin/fmax pomijają NaN, o ile w kubełku jest choć jedna wartość
+        mins = np.fmin.reduceat(values, starts)
+        maxs = np.fmax.reduceat(values, starts)
+        for i, aggregate in enumerate(aggregates):
+            if n[i]:
+                aggregate.update({
+                    f'{name}_n': int(n[i]), f'{name}_sum': float(sums[i]), f'{name}_sumsq': float(sumsq[i]),
+                    f'{name}_min': float(mins[i]), f'{name}_max': float(maxs[i])
+                })
+    return aggregates
+
+def _sql_aggregates(conn, table, start: datetime, end: datetime, device_id: Optional[str],
+                    width: Optional[int], key_us: int) -> List[dict]:
+    """Agreguje odczyty tabeli w SQL (GROUP BY kubełka lub jeden wiersz dla całego okna)."""
+    timestamp_us = table.c.timestamp_us
+    columns = [func.count().label('count')]
+    for name in ROLLUP_COLUMNS:
+        value = table.c[name]
+        columns += [
+            func.count(value).label(f'{name}_n'), func.sum(value).label(f'{name}_sum'),
+            func.sum(value * value).label(f'{name}_sumsq'),
+            func.min(value).label(f'{name}_min'), func.max(value).label(f'{name}_max')
+        ]
+    query = select(*columns).where(*range_conditions(table, start, end, False, device_id))
+    if width:
+        bucket = (timestamp_us - timestamp_us % width).label('bucket_us')
+        query = query.add_columns(bucket).group_by(bucket)
+    aggregates = []
+    for row in conn.execute(query).mappings():
+        if row['count']:
+            aggregate = dict(row, device_id=None)
+            aggregate.setdefault('bucket_us', key_us)
+            aggregates.append(aggregate)
+    return aggregates
+
+def merge_aggregates(result: Dict[int, dict], aggregates: Iterable[dict]) -> Dict[int, dict]:
+    """
+    Dołącza agregaty częściowe (format wiersza rollup) do wyników kubełków.
+
+    Args:
+        result: Dict początek kubełka (µs) -> agregat; uzupełniany w miejscu
+        aggregates: Agregaty z kluczem 'bucket_us' (np. z różnych źródeł lub procesów)
+
+    Returns:
+        result
+    """
+    for aggregate in aggregates:
+        target = result.get(aggregate['bucket_us'])
+        if target is None:
+            target = result[aggregate['bucket_us']] = _empty_aggregate(None, aggregate['bucket_us'])
+        _merge_into(target, aggregate)
+    return result
+
+def aggregate_readings(start: datetime, end: datetime, device_id: Optional[str] = None,
+                       width: Optional[int] = None) -> Dict[int, dict]:
+    """
+    Agreguje surowe odczyty okna [start, end) do formatu wiersza rollup.
+
+    Tabele SQLite są agregowane w SQL (COUNT, SUM, suma kwadratów, MIN, MAX),
+    a segmenty archiwum i partycje packed w NumPy; wyniki częściowe są łączone.
+    Używane, gdy granice okna nie pokrywają się z kubełkami rollupów.
+
+    Args:
+        start: Początek okna
+        end: Koniec okna (wyłącznie)
+        device_id: Urządzenie (domyślnie wszystkie urządzenia łącznie)
+        width: Szerokość kubełka w µs (domyślnie jeden kubełek na całe okno)
+
+    Returns:
+        Dict początek kubełka (µs; bez width: początek okna) -> agregaty
+    """
+    start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+    result: Dict[int, dict] = {}
+
+    columns = ['timestamp_us'] + ROLLUP_COLUMNS
+    for segment in segments_in_range(start_us, end_us, device_id):
+        arrays = segment.read(columns, start_us, end_us, False, device_id)
+        merge_aggregates(result, _array_aggregates(arrays, width, start_us))
+    if archive_only(start, end, False, device_id):
+        return result
+
+    with get_engine().connect() as conn:
+        for table in reading_sources(conn, start, end):
+            if not is_packed(table):
+                merge_aggregates(result, _sql_aggregates(conn, table, start, end, device_id, width, start_us))
+                continue
+            # Pomiary partycji packed są dostępne dopiero po dekodowaniu blobu
+            names = table_columns(table, columns)
+            rows = conn.execute(
+                select(*[table.c[name] for name in names])
+                .where(*range_conditions(table, start, end, False, device_id))
+            ).fetchall()
+            if rows:
+                arrays = dict(unpack_blobs([row[-1] for row in rows]))
+                arrays['timestamp_us'] = np.array([row[0] for row in rows], dtype=np.int64)
+                merge_aggregates(result, _array_aggregates(arrays, width, start_us))
+    return result
+
+def main():
+    """Przebudowa rollupów z linii poleceń."""
+    from .db import init_db
+    parser = argparse.ArgumentParser(description="Przebudowa tabel rollup z surowych odczytów")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Początek zakresu (ISO 8601)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Koniec zakresu (ISO 8601)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    rebuild_rollups(args.start, args.end)
+
+if __name__ == "__main__":
+    main()
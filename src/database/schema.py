@@ -1,15 +1,33 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, BigInteger, Float, String, DateTime, ForeignKey, Index, LargeBinary, Table
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from .timeutils import to_epoch_us
 
 Base = declarative_base()
 
+def _default_timestamp_us(context):
+    """Wylicza timestamp_us z kolumny timestamp, jeśli nie podano go jawnie."""
+    timestamp = context.get_current_parameters().get('timestamp')
+    return to_epoch_us(timestamp) if timestamp is not None else None
+
+# Identyfikator urządzenia dla odczytów bez jawnego device_id (instalacje jednoczujnikowe)
+DEFAULT_DEVICE_ID = 'default'
+
 class SensorReading(Base):
     __tablename__ = 'sensor_readings'
+    __table_args__ = (
+        # Klucz odczytu (urządzenie, czas zdarzenia); obsługuje też zapytania
+        # jednego urządzenia w zakresie czasu
+        Index('ix_sensor_readings_device_time', 'device_id', 'timestamp_us', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Czas w mikrosekundach od epoki Unix (UTC); używany przez zapytania zakresowe
+    timestamp_us = Column(BigInteger, index=True, default=_default_timestamp_us)
+    # Urządzenie ColorSense, z którego pochodzi odczyt
+    device_id = Column(String, nullable=False, default=DEFAULT_DEVICE_ID, server_default=DEFAULT_DEVICE_ID)
     
     # AS7262 readings
     as7262_450nm = Column(Float)
@@ -38,6 +56,33 @@ class SensorReading(Base):
     # Environmental data
     ambient_temperature = Column(Float)
 
+class SensorChannel(Base):
+    """Rejestr kanałów pomiarowych spoza SensorReading (np. nowych czujników)."""
+    __tablename__ = 'sensor_channels'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)  # np. as7341_415nm
+    sensor = Column(String)  # np. AS7341
+    unit = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SensorChannelValue(Base):
+    """
+    Wartość kanału w odczycie (wąska tabela: jeden wiersz na kanał i odczyt).
+
+    Odczyt jest identyfikowany kluczem (device_id, timestamp_us) jak w
+    sensor_readings; klucz główny zaczyna się od kanału, więc okno czasu
+    jednego kanału to jeden zakres indeksu. Tabela WITHOUT ROWID przechowuje
+    wiersze bezpośrednio w indeksie klucza.
+    """
+    __tablename__ = 'sensor_channel_values'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    channel_id = Column(Integer, ForeignKey('sensor_channels.id'), primary_key=True)
+    timestamp_us = Column(BigInteger, primary_key=True)
+    device_id = Column(String, primary_key=True)
+    value = Column(Float)
+
 class CalibrationData(Base):
     __tablename__ = 'calibration_data'
     
@@ -57,4 +102,88 @@ class MLModel(Base):
     path = Column(String)  # Path to the saved model file
     parameters = Column(String)  # JSON string of model parameters
     is_active = Column(Integer, default=1)  # 1 for active, 0 for historical
-    metrics = Column(String)  # JSON string of model performance metrics 
\ No newline at end of file
+    metrics = Column(String)  # JSON string of model performance metrics 
+# Kolumny sensor_readings agregowane w tabelach rollup
+ROLLUP_COLUMNS = [
+    'sen0611_cct', 'tsl2591_lux', 'sen0611_als', 'as7262_temperature',
+    'as7262_450nm', 'as7262_500nm', 'as7262_550nm',
+    'as7262_570nm', 'as7262_600nm', 'as7262_650nm'
+]
+
+# Rozdzielczości rollupów: nazwa -> szerokość kubełka w mikrosekundach
+ROLLUP_RESOLUTIONS = {
+    '1m': 60 * 1_000_000,
+    '1h': 3600 * 1_000_000,
+    '1d': 86400 * 1_000_000
+}
+
+# Agregaty przechowywane dla każdej kolumny: <kolumna>_<agregat>
+ROLLUP_AGGREGATES = ['n', 'sum', 'sumsq', 'min', 'max']
+
+def _rollup_table(resolution: str) -> Table:
+    """Tworzy tabelę agregatów (liczność, suma, suma kwadratów, min, max) dla kubełków czasu każdego urządzenia."""
+    columns = [
+        Column('device_id', String, primary_key=True),
+        Column('bucket_us', BigInteger, primary_key=True),  # początek kubełka (µs od epoki)
+        Column('count', Integer, nullable=False, default=0)
+    ]
+    for name in ROLLUP_COLUMNS:
+        columns += [
+            Column(f'{name}_n', Integer, nullable=False, default=0),
+            Column(f'{name}_sum', Float),
+            Column(f'{name}_sumsq', Float),
+            Column(f'{name}_min', Float),
+            Column(f'{name}_max', Float)
+        ]
+    table = Table(f'sensor_rollup_{resolution}', Base.metadata, *columns)
+    # Zapytania o wszystkie urządzenia łącznie filtrują tylko po czasie
+    Index(f'ix_sensor_rollup_{resolution}_bucket_us', table.c.bucket_us)
+    return table
+
+ROLLUP_TABLES = {resolution: _rollup_table(resolution) for resolution in ROLLUP_RESOLUTIONS}
+
+class SensorHistogram(Base):
+    """
+    Histogram kolumny w godzinnym kubełku urządzenia (przedziały z histograms.HISTOGRAM_BINS).
+
+    Przechowywany jest tylko zakres od pierwszego do ostatniego niepustego
+    przedziału: first_bin i liczności uint32 (little-endian) w blobie counts.
+    Klucz zaczyna się od kolumny i kubełka, więc okno czasu jednej kolumny
+    to jeden zakres indeksu tabeli WITHOUT ROWID.
+    """
+    __tablename__ = 'sensor_histograms'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    column_name = Column(String, primary_key=True)
+    bucket_us = Column(BigInteger, primary_key=True)  # początek godziny (µs od epoki)
+    device_id = Column(String, primary_key=True)
+    first_bin = Column(Integer, nullable=False)
+    counts = Column(LargeBinary, nullable=False)
+    count = Column(Integer, nullable=False, default=0)  # suma liczności
+
+class SensorPartition(Base):
+    """Katalog partycji czasowych tabeli sensor_readings."""
+    __tablename__ = 'sensor_partitions'
+
+    name = Column(String, primary_key=True)  # nazwa tabeli partycji
+    start_us = Column(BigInteger, nullable=False, index=True)  # początek zakresu (włącznie)
+    end_us = Column(BigInteger, nullable=False)  # koniec zakresu (wyłącznie)
+    row_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Kolumny pomiarowe z mapami stref (zone maps) w partycjach i archiwum
+ZONE_MAP_COLUMNS = [
+    c.name for c in SensorReading.__table__.columns
+    if c.name not in ('id', 'timestamp', 'timestamp_us', 'device_id')
+]
+
+class SensorPartitionZone(Base):
+    """Mapa stref kolumny w partycji: zakres wartości i liczba wartości (pustych i niepustych)."""
+    __tablename__ = 'sensor_partition_zones'
+
+    partition = Column(String, primary_key=True)  # nazwa tabeli partycji
+    column_name = Column(String, primary_key=True)
+    min_value = Column(Float)
+    max_value = Column(Float)
+    count = Column(Integer, nullable=False, default=0)  # wartości niepuste
+    null_count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta, timezone
+
+# Początek epoki Unix jako naiwny datetime w UTC (tak przechowujemy znaczniki czasu)
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch_us(dt: datetime) -> int:
+    """
+    Zamienia datetime na liczbę mikrosekund od epoki Unix.
+
+    Naiwne wartości są traktowane jako UTC (tak jak kolumna timestamp),
+    wartości ze strefą czasową są najpierw przeliczane na UTC.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = dt - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+def from_epoch_us(epoch_us: int) -> datetime:
+    """Zamienia mikrosekundy od epoki Unix na naiwny datetime w UTC."""
+    return EPOCH + timedelta(microseconds=int(epoch_us))
@@ -0,0 +1,345 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .db import get_engine
+from .operations import add_write_listener
+from .query import _source_columns, column_dtype, count_rows, fetch_columns
+from .timeutils import to_epoch_us, from_epoch_us
+
+logger = logging.getLogger("WindowCache")
+
+# Granice okna bez początku / końca (µs, koniec wyłącznie)
+_MIN_US = -(2 ** 63)
+_MAX_US = 2 ** 63 - 1
+
+class _Window:
+    """Wpis cache: kolumny odczytów z przedziału [start_us, end_us) jednego urządzenia (lub wszystkich)."""
+
+    def __init__(self, start_us: int, end_us: int, device_id: Optional[str], arrays: Dict[str, np.ndarray],
+                 data_version: Optional[int] = None, created: Optional[float] = None):
+        self.start_us = start_us
+        self.end_us = end_us
+        self.device_id = device_id
+        self.arrays = arrays
+        # Wersja danych bazy (PRAGMA data_version), przy której wpis był aktualny
+        self.data_version = data_version
+        # Chwila pobrania danych wpisu (time.monotonic); wpis nie żyje dłużej niż max_age
+        self.created = created if created is not None else time.monotonic()
+
+    @property
+    def row_count(self) -> int:
+        return len(self.arrays['timestamp_us'])
+
+    def covers(self, start_us: int, end_us: int, device_id: Optional[str], columns: Sequence[str]) -> bool:
+        return (self.device_id == device_id and self.start_us <= start_us and end_us <= self.end_us
+                and all(name in self.arrays for name in columns))
+
+    def slice(self, start_us: int, end_us: int) -> Dict[str, np.ndarray]:
+        timestamps = self.arrays['timestamp_us']
+        lo = np.searchsorted(timestamps, start_us, side='left')
+        hi = np.searchsorted(timestamps, end_us, side='left')
+        return {name: values[lo:hi] for name, values in self.arrays.items()}
+
+def _freeze(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Oznacza tablice wpisu jako tylko do odczytu (są współdzielone przez wywołujących)."""
+    for values in arrays.values():
+        values.flags.writeable = False
+    return arrays
+
+class WindowCache:
+    """
+    Cache LRU okien czasu z kolumnami odczytów (tablice NumPy).
+
+    Kluczem wpisu jest urządzenie i zbiór kolumn, a wpis obejmuje przedział
+    czasu. Zapytanie jest obsługiwane z pamięci, jeśli któryś wpis obejmuje
+    jego przedział i kolumny; jeśli wpis kończy się wewnątrz przedziału,
+    z bazy pobierany jest tylko brakujący koniec okna, a wpis jest
+    rozszerzany i przycinany do przedziału zapytania (okno przesuwne nie
+    rośnie bez końca). Nowe odczyty zapisane w tym procesie (insert/upsert)
+    są dołączane do wpisów, których przedział obejmują, bez ponownego
+    zapytania.
+
+    Odczyty z ostatnich settle_seconds nie są zapamiętywane: ten koniec okna
+    jest zawsze pobierany z bazy, więc zapisy innych procesów (DatabaseClient,
+    IngestWriter) są od razu widoczne. Starsze odczyty zapisane przez inne
+    procesy (powtórki, import, retencja) wykrywa PRAGMA data_version
+    sprawdzane przy każdym trafieniu na osobnym połączeniu: jeśli od
+    zapamiętania wpisu ktokolwiek zatwierdził zmiany w pliku bazy, liczba
+    odczytów w przedziale wpisu jest porównywana (skan indeksu) z liczbą
+    wierszy wpisu, a przy różnicy wpis jest usuwany. Niezależnie od tego
+    wpis starszy niż max_age_seconds jest pobierany ponownie.
+    """
+
+    def __init__(self, max_entries: int = 16, max_rows: int = 2_000_000,
+                 settle_seconds: float = 60.0, max_age_seconds: Optional[float] = 600.0):
+        """
+        Args:
+            max_entries: Maksymalna liczba wpisów
+            max_rows: Maksymalna łączna liczba wierszy we wpisach (także jednego wpisu)
+            settle_seconds: Okres przed chwilą bieżącą, który nie jest zapamiętywany
+            max_age_seconds: Maksymalny wiek wpisu (None: bez limitu)
+        """
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.settle_us = int(settle_seconds * 1_000_000)
+        self.max_age = max_age_seconds
+        self._entries: "OrderedDict[tuple, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Połączenie tylko do odczytu PRAGMA data_version (wartość zmienia się
+        # po commitach innych połączeń, także innych procesów)
+        self._probe = None
+        self._probe_engine = None
+        self._probe_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def fetch_columns(self, columns: Sequence[str], start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, end_inclusive: bool = True,
+                      device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Odpowiednik query.fetch_columns obsługiwany z cache, gdy to możliwe.
+
+        Zwracane tablice są współdzielone z cache i tylko do odczytu.
+        """
+        source_columns = _source_columns(list(columns) + ['timestamp_us'])
+        start_us = to_epoch_us(start) if start is not None else _MIN_US
+        end_us = _MAX_US
+        if end is not None:
+            end_us = to_epoch_us(end) + (1 if end_inclusive else 0)
+
+        # Koniec okna bliższy niż settle_us od chwili bieżącej pobierany jest z bazy
+        settled_us = min(end_us, to_epoch_us(datetime.utcnow()) - self.settle_us)
+        if settled_us <= start_us:
+            return self._project(self._query(source_columns, start_us, end_us, device_id), columns)
+        arrays = self._cached(source_columns, start_us, settled_us, device_id)
+        if settled_us < end_us:
+            recent = self._query(source_columns, settled_us, end_us, device_id)
+            arrays = {name: np.concatenate([arrays[name], recent[name]]) for name in source_columns}
+        return self._project(arrays, columns)
+
+    def _cached(self, source_columns: List[str], start_us: int, end_us: int,
+                device_id: Optional[str]) -> Dict[str, np.ndarray]:
+        """Kolumny odczytów z przedziału [start_us, end_us) z cache lub z bazy (z zapamiętaniem)."""
+        with self._lock:
+            found = self._find(start_us, end_us, device_id, source_columns)
+        if found is not None and self._is_current(*found):
+            with self._lock:
+                self.hits += 1
+            return found[1].slice(start_us, end_us)
+        with self._lock:
+            extendable = self._find_extendable(start_us, end_us, device_id, source_columns)
+        if extendable is not None and not self._is_current(*extendable):
+            extendable = None
+
+        with self._lock:
+            self.misses += 1
+        if extendable is not None:
+            key, window = extendable
+            # Pobierz tylko koniec okna, którego brakuje we wpisie; początek
+            # sprzed przedziału zapytania jest odrzucany
+            tail = self._query(list(window.arrays), window.end_us, end_us, device_id)
+            head = window.slice(start_us, window.end_us)
+            arrays = _freeze({name: np.concatenate([head[name], tail[name]]) for name in window.arrays})
+            with self._lock:
+                # Wpis zmieniony w międzyczasie (zapis, eksmisja) nie jest nadpisywany
+                if self._entries.get(key) is window:
+                    del self._entries[key]
+                    self._store((device_id, key[1], start_us), _Window(
+                        start_us, end_us, device_id, arrays, window.data_version, window.created
+                    ))
+            return arrays
+
+        # Wersja sprzed zapytania: commit w trakcie zapytania wymusi sprawdzenie wpisu
+        data_version = self._data_version()
+        created = time.monotonic()
+        arrays = _freeze(self._query(source_columns, start_us, end_us, device_id))
+        with self._lock:
+            self._store((device_id, tuple(sorted(source_columns)), start_us),
+                        _Window(start_us, end_us, device_id, arrays, data_version, created))
+        return arrays
+
+    def _is_current(self, key: tuple, window: _Window) -> bool:
+        """
+        Sprawdza, czy wpis nadal odpowiada bazie; nieaktualny wpis jest usuwany.
+
+        Wpis jest nieaktualny po max_age albo gdy po zmianie data_version
+        liczba odczytów w jego przedziale różni się od liczby wierszy wpisu.
+        Zapisy tego procesu są już dołączone przez on_rows_written, więc
+        liczby się zgadzają i wpis zostaje (z nową wersją).
+        """
+        if self.max_age is not None and time.monotonic() - window.created > self.max_age:
+            self._discard(key, window)
+            return False
+        data_version = self._data_version()
+        if data_version is not None and data_version == window.data_version:
+            return True
+        count = count_rows(
+            from_epoch_us(window.start_us) if window.start_us != _MIN_US else None,
+            from_epoch_us(window.end_us) if window.end_us != _MAX_US else None,
+            end_inclusive=False, device_id=window.device_id
+        )
+        if count != window.row_count:
+            self._discard(key, window)
+            return False
+        window.data_version = data_version
+        return True
+
+    def _discard(self, key: tuple, window: _Window) -> None:
+        with self._lock:
+            if self._entries.get(key) is window:
+                del self._entries[key]
+            self.stale += 1
+
+    def _data_version(self) -> Optional[int]:
+        """
+        Zwraca PRAGMA data_version bazy lub None (inna baza niż SQLite, błąd połączenia).
+
+        Wartość jest odczytywana na stałym połączeniu, które niczego nie
+        zapisuje, więc zmienia się po każdym commicie dowolnego innego
+        połączenia do pliku bazy (w tym procesie lub innym).
+        """
+        with self._probe_lock:
+            engine = get_engine()
+            if engine.dialect.name != 'sqlite':
+                return None
+            try:
+                if self._probe is None or self._probe_engine is not engine:
+                    self._close_probe()
+                    self._probe = engine.raw_connection()
+                    self._probe_engine = engine
+                cursor = self._probe.cursor()
+                try:
+                    cursor.execute("PRAGMA data_version")
+                    return cursor.fetchone()[0]
+                finally:
+                    cursor.close()
+            except Exception as e:
+                logger.warning(f"Nie można odczytać PRAGMA data_version: {e}")
+                self._close_probe()
+                return None
+
+    def _close_probe(self) -> None:
+        if self._probe is not None:
+            try:
+                self._probe.close()
+            except Exception:
+                pass
+        self._probe = None
+        self._probe_engine = None
+
+    def _query(self, source_columns: List[str], start_us: int, end_us: int,
+               device_id: Optional[str]) -> Dict[str, np.ndarray]:
+        return fetch_columns(
+            source_columns,
+            from_epoch_us(start_us) if start_us != _MIN_US else None,
+            from_epoch_us(end_us) if end_us != _MAX_US else None,
+            end_inclusive=False, device_id=device_id
+        )
+
+    @staticmethod
+    def _project(arrays: Dict[str, np.ndarray], columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        return {
+            name: arrays['timestamp_us'].view('datetime64[us]') if name == 'timestamp' else arrays[name]
+            for name in columns
+        }
+
+    def _find(self, start_us: int, end_us: int, device_id: Optional[str],
+              source_columns: Sequence[str]) -> Optional[tuple]:
+        for key, window in reversed(self._entries.items()):
+            if window.covers(start_us, end_us, device_id, source_columns):
+                self._entries.move_to_end(key)
+                return key, window
+        return None
+
+    def _find_extendable(self, start_us: int, end_us: int, device_id: Optional[str],
+                         source_columns: Sequence[str]) -> Optional[tuple]:
+        """Wpis obejmujący początek przedziału, ale kończący się przed jego końcem."""
+        for key, window in reversed(self._entries.items()):
+            if (window.device_id == device_id and window.start_us <= start_us < window.end_us < end_us
+                    and all(name in window.arrays for name in source_columns)):
+                return key, window
+        return None
+
+    def _store(self, key: tuple, window: _Window) -> None:
+        if window.row_count > self.max_rows:
+            # Okno większe niż cały cache nie jest zapamiętywane
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = window
+        self._entries.move_to_end(key)
+        total = sum(entry.row_count for entry in self._entries.values())
+        while len(self._entries) > self.max_entries or total > self.max_rows:
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.row_count
+
+    def on_rows_written(self, rows: List[dict]) -> None:
+        """
+        Dołącza nowo zapisane odczyty do wpisów, których przedział je obejmuje.
+
+        Wpisy z kolumnami, których nie ma w wierszach zapisu (np. id), są usuwane.
+        """
+        if not rows:
+            return
+        with self._lock:
+            for key, window in list(self._entries.items()):
+                matching = [
+                    row for row in rows
+                    if window.start_us <= row['timestamp_us'] < window.end_us
+                    and (window.device_id is None or row.get('device_id') == window.device_id)
+                ]
+                if not matching:
+                    continue
+                if any(name not in matching[0] for name in window.arrays):
+                    del self._entries[key]
+                    continue
+                new = {
+                    name: np.array([row[name] for row in matching], dtype=column_dtype(name))
+                    for name in window.arrays
+                }
+                arrays = {name: np.concatenate([window.arrays[name], new[name]]) for name in window.arrays}
+                if window.row_count and new['timestamp_us'].min() < window.arrays['timestamp_us'][-1]:
+                    # Odczyty spóźnione: przywróć kolejność po czasie
+                    order = np.argsort(arrays['timestamp_us'], kind='stable')
+                    arrays = {name: values[order] for name, values in arrays.items()}
+                self._entries[key] = _Window(window.start_us, window.end_us, window.device_id, _freeze(arrays),
+                                             window.data_version, window.created)
+
+    def clear(self) -> None:
+        """Usuwa wszystkie wpisy (np. po usunięciu odczytów przez retencję lub zmianie bazy)."""
+        with self._lock:
+            self._entries.clear()
+        with self._probe_lock:
+            self._close_probe()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Zwraca liczbę wpisów, wierszy w cache, trafień, chybień i wpisów usuniętych jako nieaktualne."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'rows': sum(window.row_count for window in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale
+            }
+
+_window_cache: Optional[WindowCache] = None
+_window_cache_lock = threading.Lock()
+
+def get_window_cache() -> WindowCache:
+    """Zwraca wspólny cache okien procesu (przy pierwszym użyciu rejestruje go jako słuchacza zapisu)."""
+    global _window_cache
+    with _window_cache_lock:
+        if _window_cache is None:
+            _window_cache = WindowCache()
+            add_write_listener(_window_cache.on_rows_written)
+        return _window_cache
+
+def invalidate_window_cache() -> None:
+    """Czyści wspólny cache okien, jeśli został utworzony."""
+    if _window_cache is not None:
+        _window_cache.clear()
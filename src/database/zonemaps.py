@@ -0,0 +1,229 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .packed import PACKED_COLUMNS, is_packed, unpack_blobs
+from .schema import ZONE_MAP_COLUMNS, SensorPartitionZone
+
+ZONES = SensorPartitionZone.__table__
+
+# Operatory predykatów wartości: (kolumna, operator, wartość);
+# between i outside przyjmują parę (dolna, górna) i są domknięte / otwarte.
+PREDICATE_OPS = ('<', '<=', '>', '>=', '==', 'between', 'outside')
+
+Predicate = Tuple[str, str, object]
+
+def validate_predicates(predicates: Sequence[Predicate]) -> None:
+    """Sprawdza kolumny i operatory predykatów."""
+    for column, op, value in predicates:
+        if column not in ZONE_MAP_COLUMNS:
+            raise ValueError(f"Predykaty nie są obsługiwane dla kolumny: {column}")
+        if op not in PREDICATE_OPS:
+            raise ValueError(f"Nieznany operator predykatu: {op}")
+        if op in ('between', 'outside') and len(value) != 2:
+            raise ValueError(f"Operator {op} wymaga pary (dolna, górna)")
+
+def _empty_zone() -> dict:
+    return {'min': None, 'max': None, 'count': 0, 'null_count': 0}
+
+def zone_map_from_rows(rows: Iterable[dict]) -> Dict[str, dict]:
+    """Wylicza mapę stref (min/max/liczba/liczba pustych) dla wierszy zapisu."""
+    zones = {name: _empty_zone() for name in ZONE_MAP_COLUMNS}
+    for row in rows:
+        for name in ZONE_MAP_COLUMNS:
+            value = row.get(name)
+            zone = zones[name]
+            if value is None:
+                zone['null_count'] += 1
+                continue
+            if zone['count']:
+                if value < zone['min']:
+                    zone['min'] = value
+                if value > zone['max']:
+                    zone['max'] = value
+            else:
+                zone['min'] = zone['max'] = value
+            zone['count'] += 1
+    return zones
+
+def zone_map_from_arrays(arrays: Dict[str, np.ndarray]) -> Dict[str, dict]:
+    """Wylicza mapę stref dla kolumn NumPy (NaN oznacza brak wartości)."""
+    zones = {}
+    for name in ZONE_MAP_COLUMNS:
+        if name not in arrays:
+            continue
+        values = arrays[name]
+        valid = ~np.isnan(values)
+        count = int(np.count_nonzero(valid))
+        zones[name] = {
+            'min': float(values[valid].min()) if count else None,
+            'max': float(values[valid].max()) if count else None,
+            'count': count,
+            'null_count': int(len(values) - count)
+        }
+    return zones
+
+_upsert_statement = None
+
+def update_partition_zones(conn, partition: str, rows: List[dict], packed: bool = False) -> None:
+    """
+    Rozszerza mapę stref partycji o paczkę nowych wierszy (w transakcji zapisu).
+
+    Dla partycji packed granice kolumn upakowanych są zaokrąglane do float32,
+    tak jak wartości zapisane w blobie (zaokrąglenie zachowuje kolejność).
+    """
+    global _upsert_statement
+    if _upsert_statement is None:
+        stmt = sqlite_insert(ZONES)
+        excluded = stmt.excluded
+        updates = {
+            'count': ZONES.c['count'] + excluded['count'],
+            'null_count': ZONES.c.null_count + excluded.null_count
+        }
+        for column, scalar in (('min_value', func.min), ('max_value', func.max)):
+            current, new = ZONES.c[column], excluded[column]
+            updates[column] = func.coalesce(scalar(current, new), current, new)
+        _upsert_statement = stmt.on_conflict_do_update(
+            index_elements=['partition', 'column_name'], set_=updates
+        )
+    zones = zone_map_from_rows(rows)
+    if packed:
+        for name in PACKED_COLUMNS:
+            zone = zones[name]
+            if zone['count']:
+                zone['min'] = float(np.float32(zone['min']))
+                zone['max'] = float(np.float32(zone['max']))
+    conn.execute(_upsert_statement, [
+        {
+            'partition': partition, 'column_name': name, 'min_value': zone['min'],
+            'max_value': zone['max'], 'count': zone['count'], 'null_count': zone['null_count']
+        }
+        for name, zone in zones.items()
+    ])
+
+def partition_zone_maps(conn, partitions: Sequence[str]) -> Dict[str, Dict[str, dict]]:
+    """Zwraca mapy stref partycji: partycja -> kolumna -> {'min', 'max', 'count', 'null_count'}."""
+    if not partitions:
+        return {}
+    result: Dict[str, Dict[str, dict]] = {}
+    query = select(ZONES).where(ZONES.c.partition.in_(list(partitions)))
+    for row in conn.execute(query).mappings():
+        result.setdefault(row['partition'], {})[row['column_name']] = {
+            'min': row['min_value'], 'max': row['max_value'],
+            'count': row['count'], 'null_count': row['null_count']
+        }
+    return result
+
+def _packed_zone_map(conn, table) -> Dict[str, dict]:
+    """Mapa stref partycji packed: pomiary z blobu są dekodowane do tablic NumPy."""
+    plain = [name for name in ZONE_MAP_COLUMNS if name not in PACKED_COLUMNS]
+    rows = conn.execute(select(*[table.c[name] for name in plain], table.c.packed)).fetchall()
+    arrays = unpack_blobs([row[-1] for row in rows])
+    for i, name in enumerate(plain):
+        arrays[name] = np.array([row[i] for row in rows], dtype=np.float64)
+    return zone_map_from_arrays(arrays)
+
+def rebuild_partition_zones(conn, partition: str, table) -> None:
+    """Wylicza mapę stref partycji od nowa z jej tabeli (backfill)."""
+    if is_packed(table):
+        zones = _packed_zone_map(conn, table)
+    else:
+        columns = []
+        for name in ZONE_MAP_COLUMNS:
+            c = table.c[name]
+            columns += [func.min(c), func.max(c), func.count(c)]
+        row = conn.execute(select(func.count(), *columns).select_from(table)).first()
+        total = row[0]
+        zones = {
+            name: {
+                'min': row[1 + 3 * i], 'max': row[2 + 3 * i],
+                'count': row[3 + 3 * i], 'null_count': total - row[3 + 3 * i]
+            }
+            for i, name in enumerate(ZONE_MAP_COLUMNS)
+        }
+    delete_partition_zones(conn, partition)
+    conn.execute(sqlite_insert(ZONES), [
+        {
+            'partition': partition, 'column_name': name, 'min_value': zone['min'],
+            'max_value': zone['max'], 'count': zone['count'], 'null_count': zone['null_count']
+        }
+        for name, zone in zones.items()
+    ])
+
+def delete_partition_zones(conn, partition: str) -> None:
+    """Usuwa mapę stref partycji."""
+    conn.execute(delete(ZONES).where(ZONES.c.partition == partition))
+
+def may_match(zone_map: Optional[Dict[str, dict]], predicates: Sequence[Predicate]) -> bool:
+    """
+    Czy segment o danej mapie stref może zawierać wiersze spełniające wszystkie predykaty.
+
+    Brak mapy stref (lub kolumny w mapie) oznacza, że segmentu nie można pominąć.
+    Wartości puste nigdy nie spełniają predykatu.
+    """
+    if zone_map is None:
+        return True
+    for column, op, value in predicates:
+        zone = zone_map.get(column)
+        if zone is None:
+            continue
+        if not zone['count']:
+            return False
+        low, high = zone['min'], zone['max']
+        if op == '>' and high <= value:
+            return False
+        if op == '>=' and high < value:
+            return False
+        if op == '<' and low >= value:
+            return False
+        if op == '<=' and low > value:
+            return False
+        if op == '==' and not low <= value <= high:
+            return False
+        if op == 'between' and (high < value[0] or low > value[1]):
+            return False
+        if op == 'outside' and low >= value[0] and high <= value[1]:
+            return False
+    return True
+
+def sql_conditions(table, predicates: Sequence[Predicate]) -> list:
+    """Warunki WHERE odpowiadające predykatom."""
+    conditions = []
+    for column, op, value in predicates:
+        c = table.c[column]
+        if op == '>':
+            conditions.append(c > value)
+        elif op == '>=':
+            conditions.append(c >= value)
+        elif op == '<':
+            conditions.append(c < value)
+        elif op == '<=':
+            conditions.append(c <= value)
+        elif op == '==':
+            conditions.append(c == value)
+        elif op == 'between':
+            conditions.append(c.between(value[0], value[1]))
+        else:
+            conditions.append(or_(c < value[0], c > value[1]))
+    return conditions
+
+def array_mask(arrays: Dict[str, np.ndarray], predicates: Sequence[Predicate]) -> np.ndarray:
+    """Maska wierszy spełniających predykaty (NaN nie spełnia żadnego)."""
+    mask = np.ones(len(arrays['timestamp_us']), dtype=bool)
+    for column, op, value in predicates:
+        values = arrays[column]
+        if op == '>':
+            mask &= values > value
+        elif op == '>=':
+            mask &= values >= value
+        elif op == '<':
+            mask &= values < value
+        elif op == '<=':
+            mask &= values <= value
+        elif op == '==':
+            mask &= values == value
+        elif op == 'between':
+            mask &= (values >= value[0]) & (values <= value[1])
+        else:
+            mask &= (values < value[0]) | (values > value[1])
+    return mask
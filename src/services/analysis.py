@@ -1,197 +1,500 @@
+import gzip
+import json
+import logging
+import math
+import os
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
-from sqlalchemy import func, and_
-from database.db import get_session
-from database.schema import SensorReading
+from typing import Callable, List, Dict, Tuple, Optional
+from database.histograms import get_quantiles
+from database.query import count_rows, fetch_matching, iter_frame_chunks
+from database.rollups import (aggregate_readings, aggregate_statistics, get_rollup_statistics,
+                              get_rollup_statistics_by_bucket)
+from database.schema import ROLLUP_RESOLUTIONS
+from database.timeutils import from_epoch_us, to_epoch_us
+from database.window_cache import get_window_cache
+
+# Metryki statystyk dziennych: nazwa w wyniku -> kolumna sensor_readings
+STATISTICS_COLUMNS = {
+    'cct': 'sen0611_cct',
+    'lux': 'tsl2591_lux',
+    'als': 'sen0611_als',
+    'temperature': 'as7262_temperature'
+}
+
+# Kolumny eksportu CSV (w kolejności w pliku)
+EXPORT_COLUMNS = [
+    'timestamp', 'device_id',
+    'as7262_450nm', 'as7262_500nm', 'as7262_550nm',
+    'as7262_570nm', 'as7262_600nm', 'as7262_650nm', 'as7262_temperature',
+    'tsl2591_lux', 'tsl2591_ir', 'tsl2591_full',
+    'sen0611_cct', 'sen0611_als',
+    'latitude', 'longitude', 'altitude', 'satellites',
+    'ambient_temperature'
+]
+
+# Formaty eksportu (parquet wymaga opcjonalnego pakietu pyarrow)
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Co ile sekund logować postęp eksportu
+EXPORT_PROGRESS_INTERVAL = 5.0
+
+# Pasma AS7262 analizowane przez analyze_color_spectrum
+SPECTRUM_WAVELENGTHS = ['450nm', '500nm', '550nm', '570nm', '600nm', '650nm']
+
+# Metryki wykrywania anomalii: nazwa w wyniku -> kolumna sensor_readings
+ANOMALY_COLUMNS = {
+    'cct': 'sen0611_cct',
+    'lux': 'tsl2591_lux',
+    'als': 'sen0611_als',
+    'temp': 'as7262_temperature'
+}
+
+# Próg |z-score| oznaczający anomalię
+ANOMALY_Z_THRESHOLD = 3.0
+
+logger = logging.getLogger("SensorAnalysis")
+
+class _CsvExportWriter:
+    """Zapis kolejnych paczek do jednego pliku CSV (opcjonalnie jednego strumienia gzip)."""
+
+    def __init__(self, filepath: str, compression: Optional[str]):
+        if compression not in (None, 'gzip'):
+            raise ValueError(f"Nieobsługiwana kompresja CSV: {compression}")
+        if compression == 'gzip':
+            self._file = gzip.open(filepath, 'wt', newline='')
+        else:
+            self._file = open(filepath, 'w', newline='')
+        self._header = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        df.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+
+    def close(self) -> None:
+        self._file.close()
+
+class _ParquetExportWriter:
+    """Zapis kolejnych paczek jako grup wierszy jednego pliku Parquet (pyarrow)."""
+
+    def __init__(self, filepath: str, compression: Optional[str], first_chunk: pd.DataFrame):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Eksport do Parquet wymaga pakietu pyarrow (pip install pyarrow)")
+        self._pa = pa
+        schema = pa.Schema.from_pandas(first_chunk, preserve_index=False)
+        self._writer = pq.ParquetWriter(filepath, schema, compression=compression or 'snappy')
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = self._pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        self._writer.close()
 
 class SensorAnalysis:
     @staticmethod
-    def get_daily_statistics(date: datetime) -> Dict[str, Dict[str, float]]:
+    def get_daily_statistics(date: datetime, device_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
         """Oblicza statystyki dzienne dla wszystkich czujników."""
-        session = get_session()
-        try:
-            start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=1)
-            
-            # Pobierz dane z danego dnia
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_date,
-                    SensorReading.timestamp < end_date
-                )
-            ).all()
-            
-            if not readings:
+        start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        return SensorAnalysis.get_statistics(start_date, start_date + timedelta(days=1), device_id)
+
+    @staticmethod
+    def get_hourly_statistics(date: datetime, device_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """Oblicza statystyki dla godziny zawierającej podaną chwilę."""
+        start_date = date.replace(minute=0, second=0, microsecond=0)
+        return SensorAnalysis.get_statistics(start_date, start_date + timedelta(hours=1), device_id)
+
+    @staticmethod
+    def get_statistics(start_date: datetime, end_date: datetime,
+                       device_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Oblicza statystyki czujników w oknie [start_date, end_date).
+
+        Jeśli granice okna pokrywają się z kubełkami rollup (minuta, godzina,
+        doba), wynik pochodzi z najgrubszego pasującego rollupu; w przeciwnym
+        razie z agregatów SQL (MIN, MAX, suma, suma kwadratów) liczonych na
+        surowych odczytach, bez ich pobierania. Bez device_id statystyki
+        obejmują wszystkie urządzenia.
+        """
+        columns = list(STATISTICS_COLUMNS.values())
+        stats = get_rollup_statistics(start_date, end_date, columns, device_id)
+        if not stats or not stats['count']:
+            total = aggregate_readings(start_date, end_date, device_id).get(to_epoch_us(start_date))
+            if total is None:
                 return {}
-            
-            # Konwersja do DataFrame
-            df = pd.DataFrame([{
-                'timestamp': r.timestamp,
-                'cct': r.sen0611_cct,
-                'lux': r.tsl2591_lux,
-                'als': r.sen0611_als,
-                'temp': r.as7262_temperature
-            } for r in readings])
-            
-            # Oblicz statystyki
-            stats = {
-                'cct': {
-                    'min': df['cct'].min(),
-                    'max': df['cct'].max(),
-                    'mean': df['cct'].mean(),
-                    'std': df['cct'].std()
-                },
-                'lux': {
-                    'min': df['lux'].min(),
-                    'max': df['lux'].max(),
-                    'mean': df['lux'].mean(),
-                    'std': df['lux'].std()
-                },
-                'als': {
-                    'min': df['als'].min(),
-                    'max': df['als'].max(),
-                    'mean': df['als'].mean(),
-                    'std': df['als'].std()
-                },
-                'temperature': {
-                    'min': df['temp'].min(),
-                    'max': df['temp'].max(),
-                    'mean': df['temp'].mean(),
-                    'std': df['temp'].std()
-                }
+            stats = aggregate_statistics(total, columns)
+        return SensorAnalysis._metric_statistics(stats)
+
+    @staticmethod
+    def _metric_statistics(stats: Dict) -> Dict[str, Dict[str, float]]:
+        return {
+            metric: {key: stats[column][key] for key in ('min', 'max', 'mean', 'std')}
+            for metric, column in STATISTICS_COLUMNS.items()
+        }
+
+    @staticmethod
+    def get_statistics_by_day(start_date: datetime, end_date: datetime,
+                              device_id: Optional[str] = None) -> Dict[datetime, Dict[str, Dict[str, float]]]:
+        """
+        Oblicza statystyki dzienne dla wszystkich dni okna jednym zapytaniem grupującym.
+
+        Wynik pochodzi z rollupu dobowego (GROUP BY dnia); gdy rollup nie ma
+        kubełków w oknie, z agregatów surowych odczytów grupowanych po dniu.
+        Okno jest rozszerzane do pełnych dni UTC.
+
+        Args:
+            start_date: Pierwszy dzień
+            end_date: Koniec okna (wyłącznie; niepełny ostatni dzień jest uwzględniany)
+            device_id: Urządzenie (domyślnie wszystkie urządzenia łącznie)
+
+        Returns:
+            Dict początek dnia -> statystyki jak w get_daily_statistics (tylko dni z odczytami)
+        """
+        day_us = ROLLUP_RESOLUTIONS['1d']
+        start_us, end_us = to_epoch_us(start_date), to_epoch_us(end_date)
+        start_us -= start_us % day_us
+        if end_us % day_us:
+            end_us += day_us - end_us % day_us
+        start_date, end_date = from_epoch_us(start_us), from_epoch_us(end_us)
+
+        columns = list(STATISTICS_COLUMNS.values())
+        days = get_rollup_statistics_by_bucket(start_date, end_date, columns, '1d', device_id)
+        if not days:
+            aggregates = aggregate_readings(start_date, end_date, device_id, width=day_us)
+            days = {
+                from_epoch_us(bucket_us): aggregate_statistics(aggregates[bucket_us], columns)
+                for bucket_us in sorted(aggregates)
             }
-            
-            return stats
-        finally:
-            session.close()
+        return {day: SensorAnalysis._metric_statistics(stats) for day, stats in days.items()}
     
     @staticmethod
-    def analyze_color_spectrum(start_time: datetime, end_time: datetime) -> Dict[str, List[float]]:
-        """Analizuje widmo kolorów w zadanym okresie."""
-        session = get_session()
-        try:
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
-                )
-            ).all()
-            
-            if not readings:
-                return {}
-            
-            # Przygotuj dane spektralne
-            wavelengths = ['450nm', '500nm', '550nm', '570nm', '600nm', '650nm']
-            spectrum_data = {
-                'wavelengths': wavelengths,
-                'mean_values': [],
-                'max_values': [],
-                'min_values': []
-            }
-            
-            # Zbierz dane dla każdej długości fali
-            for wavelength in wavelengths:
-                values = [getattr(r, f'as7262_{wavelength}') for r in readings]
-                spectrum_data['mean_values'].append(np.mean(values))
-                spectrum_data['max_values'].append(np.max(values))
-                spectrum_data['min_values'].append(np.min(values))
-            
-            return spectrum_data
-        finally:
-            session.close()
+    def analyze_color_spectrum(start_time: datetime, end_time: datetime,
+                               device_id: Optional[str] = None) -> Dict[str, List[float]]:
+        """Analizuje widmo kolorów w zadanym okresie (dane z cache okien czasu)."""
+        wavelengths = SPECTRUM_WAVELENGTHS
+        data = get_window_cache().fetch_columns(
+            [f'as7262_{w}' for w in wavelengths], start_time, end_time, device_id=device_id
+        )
+        
+        if not len(data['as7262_450nm']):
+            return {}
+        
+        # Przygotuj dane spektralne
+        spectrum_data = {
+            'wavelengths': wavelengths,
+            'mean_values': [],
+            'max_values': [],
+            'min_values': []
+        }
+        
+        # Zbierz dane dla każdej długości fali
+        for wavelength in wavelengths:
+            values = data[f'as7262_{wavelength}']
+            spectrum_data['mean_values'].append(np.mean(values))
+            spectrum_data['max_values'].append(np.max(values))
+            spectrum_data['min_values'].append(np.min(values))
+        
+        return spectrum_data
     
     @staticmethod
-    def detect_anomalies(hours: int = 24) -> List[Dict[str, any]]:
-        """Wykrywa anomalie w danych z ostatnich n godzin."""
-        session = get_session()
-        try:
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(hours=hours)
-            
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
+    def analyze_spectrum_distribution(start_time: datetime, end_time: datetime,
+                                      quantiles: Tuple[float, ...] = (0.05, 0.5, 0.95),
+                                      device_id: Optional[str] = None) -> Dict[str, any]:
+        """
+        Szacuje rozkład widma i CCT (kwantyle) w zadanym okresie.
+
+        Kwantyle pochodzą z histogramów kubełków godzinnych aktualizowanych
+        przy zapisie (database.histograms), więc koszt zależy od liczby
+        godzin okna, a nie od liczby odczytów. Krańcowe godziny okna są
+        liczone w całości.
+
+        Returns:
+            Dict z 'quantiles', 'wavelengths', 'spectrum' (pasmo -> wartości
+            kwantyli) i 'cct' (wartości kwantyli); pusty dict bez odczytów
+        """
+        columns = [f'as7262_{w}' for w in SPECTRUM_WAVELENGTHS] + ['sen0611_cct']
+        values = get_quantiles(columns, start_time, end_time, quantiles, device_id)
+        if all(math.isnan(value) for value in values['sen0611_cct'] + values['as7262_450nm']):
+            return {}
+        return {
+            'quantiles': list(quantiles),
+            'wavelengths': SPECTRUM_WAVELENGTHS,
+            'spectrum': {w: values[f'as7262_{w}'] for w in SPECTRUM_WAVELENGTHS},
+            'cct': values['sen0611_cct']
+        }
+
+    @staticmethod
+    def detect_anomalies(hours: int = 24, device_id: Optional[str] = None,
+                         threshold: float = ANOMALY_Z_THRESHOLD) -> List[Dict[str, any]]:
+        """
+        Wykrywa anomalie (|z-score| > threshold) w danych z ostatnich n godzin.
+
+        Z-score jest liczony wektorowo na tablicach NumPy dla całych kolumn;
+        do słowników zamieniane są tylko znalezione punkty odstające. Dane
+        pochodzą z cache okien czasu, więc kolejne wywołania pobierają z bazy
+        tylko odczyty nowsze niż poprzednie okno. Do ciągłego monitorowania
+        służy StreamingAnomalyDetector.
+        """
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=hours)
+
+        data = get_window_cache().fetch_columns(
+            ['timestamp'] + list(ANOMALY_COLUMNS.values()), start_time, end_time, device_id=device_id
+        )
+        if not len(data['timestamp']):
+            return []
+
+        anomalies = []
+        for metric, column in ANOMALY_COLUMNS.items():
+            values = data[column].astype(np.float64)
+            if np.count_nonzero(~np.isnan(values)) < 2:
+                continue
+            mean = np.nanmean(values)
+            std = np.nanstd(values, ddof=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z_scores = np.abs((values - mean) / std)
+            # NaN (brak wartości lub std = 0) nie jest anomalią
+            indices = np.flatnonzero(np.nan_to_num(z_scores, nan=0.0) > threshold)
+            anomalies.extend(
+                {'timestamp': pd.Timestamp(timestamp), 'sensor': metric, 'value': value, 'z_score': z_score}
+                for timestamp, value, z_score in zip(
+                    data['timestamp'][indices], values[indices].tolist(), z_scores[indices].tolist()
                 )
-            ).all()
-            
-            if not readings:
-                return []
-            
-            # Konwersja do DataFrame
-            df = pd.DataFrame([{
-                'timestamp': r.timestamp,
-                'cct': r.sen0611_cct,
-                'lux': r.tsl2591_lux,
-                'als': r.sen0611_als,
-                'temp': r.as7262_temperature
-            } for r in readings])
-            
-            anomalies = []
-            
-            # Wykrywanie anomalii używając metody Z-score
-            for column in ['cct', 'lux', 'als', 'temp']:
-                mean = df[column].mean()
-                std = df[column].std()
-                z_scores = np.abs((df[column] - mean) / std)
-                
-                # Znajdź punkty odstające (Z-score > 3)
-                outliers = df[z_scores > 3]
-                
-                for _, row in outliers.iterrows():
-                    anomalies.append({
-                        'timestamp': row['timestamp'],
-                        'sensor': column,
-                        'value': row[column],
-                        'z_score': z_scores[row.name]
-                    })
-            
-            return anomalies
-        finally:
-            session.close()
+            )
+        return anomalies
+
+    @staticmethod
+    def find_out_of_range(metric: str, low: float, high: float,
+                          start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None,
+                          device_id: Optional[str] = None) -> List[Dict[str, any]]:
+        """
+        Zwraca odczyty, w których metryka wychodzi poza zakres [low, high].
+
+        Segmenty historii, których mapy stref mieszczą się w zakresie, są pomijane.
+
+        Args:
+            metric: Nazwa metryki z STATISTICS_COLUMNS (np. 'cct', 'lux')
+            low: Dolna granica zakresu
+            high: Górna granica zakresu
+            start_time: Początek okresu (domyślnie cała historia)
+            end_time: Koniec okresu
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+        """
+        column = STATISTICS_COLUMNS[metric]
+        data = fetch_matching(
+            ['timestamp', column], [(column, 'outside', (low, high))], start_time, end_time,
+            device_id=device_id
+        )
+        return [
+            {'timestamp': pd.Timestamp(timestamp), 'sensor': metric, 'value': float(value)}
+            for timestamp, value in zip(data['timestamp'], data[column])
+        ]
     
     @staticmethod
-    def export_to_csv(start_time: datetime, end_time: datetime, filepath: str) -> bool:
-        """Eksportuje dane do pliku CSV."""
-        session = get_session()
+    def export_to_csv(start_time: datetime, end_time: datetime, filepath: str,
+                      chunk_size: int = 10000, device_id: Optional[str] = None,
+                      compression: Optional[str] = None,
+                      progress: Optional[Callable[[int, int, float], None]] = None) -> bool:
+        """
+        Eksportuje dane do pliku CSV, zapisując je paczkami o stałej wielkości.
+
+        Args:
+            compression: None lub 'gzip' (domyślnie gzip dla ścieżek *.gz)
+            progress: Zob. export_data
+
+        Returns:
+            True, jeśli zapisano jakiekolwiek odczyty
+        """
+        return SensorAnalysis.export_data(
+            start_time, end_time, filepath, 'csv', compression, chunk_size, device_id, progress
+        ) > 0
+
+    @staticmethod
+    def export_data(start_time: datetime, end_time: datetime, filepath: str,
+                    format: str = 'csv', compression: Optional[str] = None,
+                    chunk_size: int = 10000, device_id: Optional[str] = None,
+                    progress: Optional[Callable[[int, int, float], None]] = None) -> int:
+        """
+        Strumieniowo eksportuje odczyty do pliku CSV lub Parquet.
+
+        Odczyty są pobierane i zapisywane paczkami po chunk_size wierszy
+        (iter_frame_chunks), więc zużycie pamięci nie zależy od długości
+        okresu. Plik nie powstaje, jeśli w okresie nie ma odczytów.
+
+        Args:
+            start_time: Początek okresu
+            end_time: Koniec okresu
+            filepath: Ścieżka pliku wynikowego
+            format: 'csv' lub 'parquet' (wymaga pyarrow)
+            compression: CSV: None lub 'gzip' (domyślnie gzip dla *.gz);
+                Parquet: kodek pyarrow, np. 'snappy' (domyślny), 'gzip', 'zstd'
+            chunk_size: Liczba wierszy w paczce
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+            progress: Funkcja wywoływana po każdej paczce z argumentami
+                (zapisane wiersze, wszystkie wiersze, wiersze/s)
+
+        Returns:
+            Liczba wyeksportowanych odczytów
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Nieznany format eksportu: {format}")
+        if format == 'csv' and compression is None and filepath.endswith('.gz'):
+            compression = 'gzip'
+
+        total = count_rows(start_time, end_time, device_id=device_id)
+        started = last_log = time.monotonic()
+        exported = 0
+        writer = None
         try:
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
-                )
-            ).all()
-            
-            if not readings:
-                return False
-            
-            # Konwersja do DataFrame
-            df = pd.DataFrame([{
-                'timestamp': r.timestamp,
-                'as7262_450nm': r.as7262_450nm,
-                'as7262_500nm': r.as7262_500nm,
-                'as7262_550nm': r.as7262_550nm,
-                'as7262_570nm': r.as7262_570nm,
-                'as7262_600nm': r.as7262_600nm,
-                'as7262_650nm': r.as7262_650nm,
-                'as7262_temperature': r.as7262_temperature,
-                'tsl2591_lux': r.tsl2591_lux,
-                'tsl2591_ir': r.tsl2591_ir,
-                'tsl2591_full': r.tsl2591_full,
-                'sen0611_cct': r.sen0611_cct,
-                'sen0611_als': r.sen0611_als,
-                'latitude': r.latitude,
-                'longitude': r.longitude,
-                'altitude': r.altitude,
-                'satellites': r.satellites,
-                'ambient_temperature': r.ambient_temperature
-            } for r in readings])
-            
-            # Zapisz do CSV
-            df.to_csv(filepath, index=False)
-            return True
-            
+            for df in iter_frame_chunks(EXPORT_COLUMNS, start_time, end_time, chunk_size=chunk_size,
+                                        device_id=device_id):
+                # Liczba satelitów jako liczba całkowita
+                df['satellites'] = df['satellites'].astype('Int64')
+                if writer is None:
+                    if format == 'csv':
+                        writer = _CsvExportWriter(filepath, compression)
+                    else:
+                        writer = _ParquetExportWriter(filepath, compression, df)
+                writer.write(df)
+                exported += len(df)
+
+                now = time.monotonic()
+                rate = exported / max(now - started, 1e-9)
+                if progress is not None:
+                    progress(exported, total, rate)
+                if now - last_log >= EXPORT_PROGRESS_INTERVAL:
+                    logger.info(f"Eksport {filepath}: {exported}/{total} odczytów ({rate:.0f} odczytów/s)")
+                    last_log = now
         finally:
-            session.close() 
\ No newline at end of file
+            if writer is not None:
+                writer.close()
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Wyeksportowano {exported} odczytów do {filepath} w {elapsed:.1f} s "
+            f"({exported / max(elapsed, 1e-9):.0f} odczytów/s)"
+        )
+        return exported
+
+class StreamingAnomalyDetector:
+    """
+    Strumieniowy detektor anomalii z-score dla kolejnych odczytów.
+
+    Dla każdej metryki utrzymuje liczność, średnią i sumę kwadratów odchyleń
+    (algorytm Welforda), więc ocena nowego odczytu kosztuje O(1) niezależnie
+    od długości historii. Odczyt jest oceniany względem stanu sprzed jego
+    dołączenia. Stan można zapisać i wczytać (checkpoint) albo zainicjować
+    z rollupów bez pobierania surowych odczytów.
+    """
+
+    def __init__(self, threshold: float = ANOMALY_Z_THRESHOLD, min_samples: int = 30,
+                 columns: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            threshold: Próg |z-score| oznaczający anomalię
+            min_samples: Liczba wartości metryki potrzebna przed zgłaszaniem anomalii
+            columns: Metryki: nazwa w wyniku -> kolumna sensor_readings (domyślnie ANOMALY_COLUMNS)
+        """
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.columns = dict(columns or ANOMALY_COLUMNS)
+        # Stan Welforda: metryka -> [liczność, średnia, suma kwadratów odchyleń]
+        self.state = {metric: [0, 0.0, 0.0] for metric in self.columns}
+
+    def score(self, metric: str, value: float) -> float:
+        """Zwraca |z-score| wartości względem bieżącego stanu (NaN przed min_samples)."""
+        n, mean, m2 = self.state[metric]
+        if n < max(self.min_samples, 2):
+            return math.nan
+        std = math.sqrt(m2 / (n - 1))
+        return abs(value - mean) / std if std > 0 else math.nan
+
+    def update(self, row: dict) -> List[Dict[str, any]]:
+        """
+        Ocenia odczyt i dołącza go do stanu.
+
+        Args:
+            row: Wiersz w formacie reading_to_row (kolumny sensor_readings i timestamp)
+
+        Returns:
+            Lista anomalii odczytu (timestamp, sensor, value, z_score)
+        """
+        anomalies = []
+        for metric, column in self.columns.items():
+            value = row.get(column)
+            if value is None or value != value:
+                continue
+            z_score = self.score(metric, value)
+            if z_score > self.threshold:
+                anomalies.append({
+                    'timestamp': pd.Timestamp(row.get('timestamp')), 'sensor': metric,
+                    'value': float(value), 'z_score': z_score
+                })
+            state = self.state[metric]
+            state[0] += 1
+            delta = value - state[1]
+            state[1] += delta / state[0]
+            state[2] += delta * (value - state[1])
+        return anomalies
+
+    def update_rows(self, rows: List[dict]) -> List[Dict[str, any]]:
+        """Ocenia kolejne odczyty paczki (np. paczki IngestWriter) i zwraca ich anomalie."""
+        anomalies = []
+        for row in rows:
+            anomalies.extend(self.update(row))
+        return anomalies
+
+    def warm_start(self, start_time: datetime, end_time: datetime, device_id: Optional[str] = None) -> None:
+        """
+        Inicjalizuje stan z historii [start_time, end_time) bez pobierania odczytów.
+
+        Liczność, średnia i suma kwadratów odchyleń pochodzą z rollupów
+        (lub agregatów SQL dla okien niewyrównanych do minut).
+        """
+        columns = list(self.columns.values())
+        stats = get_rollup_statistics(start_time, end_time, columns, device_id)
+        if stats is None:
+            total = aggregate_readings(start_time, end_time, device_id).get(to_epoch_us(start_time))
+            if total is None:
+                return
+            stats = aggregate_statistics(total, columns)
+        for metric, column in self.columns.items():
+            n = stats[column]['count']
+            if n:
+                std = stats[column]['std'] if n > 1 else 0.0
+                self.state[metric] = [n, stats[column]['mean'], std * std * (n - 1)]
+
+    def get_state(self) -> dict:
+        """Zwraca stan detektora do zapisania (checkpoint)."""
+        return {
+            'threshold': self.threshold,
+            'min_samples': self.min_samples,
+            'columns': self.columns,
+            'state': {metric: list(values) for metric, values in self.state.items()}
+        }
+
+    @classmethod
+    def from_state(cls, checkpoint: dict) -> "StreamingAnomalyDetector":
+        """Odtwarza detektor ze stanu zwróconego przez get_state."""
+        detector = cls(checkpoint['threshold'], checkpoint['min_samples'], checkpoint['columns'])
+        detector.state.update({metric: list(values) for metric, values in checkpoint['state'].items()})
+        return detector
+
+    def save(self, filepath: str) -> None:
+        """Zapisuje stan detektora do pliku JSON."""
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.get_state(), f)
+        os.replace(tmp_path, filepath)
+
+    @classmethod
+    def load(cls, filepath: str) -> "StreamingAnomalyDetector":
+        """Wczytuje detektor z pliku JSON zapisanego przez save."""
+        with open(filepath) as f:
+            return cls.from_state(json.load(f))
@@ -0,0 +1,151 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from database import archive, db
+from database.partitions import CATALOG
+from database.rollups import aggregate_readings, aggregate_statistics, merge_aggregates
+from database.schema import ROLLUP_COLUMNS, ROLLUP_RESOLUTIONS
+from database.timeutils import from_epoch_us, to_epoch_us
+from services.analysis import SPECTRUM_WAVELENGTHS, SensorAnalysis
+
+logger = logging.getLogger("BatchAnalytics")
+
+DAY_US = ROLLUP_RESOLUTIONS['1d']
+
+# Podział zakresu na zadania: doby UTC lub partycje z katalogu sensor_partitions
+TASK_UNITS = ('day', 'partition')
+
+def _init_worker(database_url: str, archive_dir: str) -> None:
+    """Inicjalizacja procesu roboczego: połączenia SQLite tylko do odczytu."""
+    db.configure_engine(db.read_only_url(database_url), 'read-only')
+    archive.ARCHIVE_DIR = archive_dir
+
+def _aggregate_task(task: Tuple[int, int, Optional[str]]) -> List[dict]:
+    """Agreguje odczyty zadania [start_us, end_us) do kubełków dobowych."""
+    start_us, end_us, device_id = task
+    aggregates = aggregate_readings(from_epoch_us(start_us), from_epoch_us(end_us), device_id, width=DAY_US)
+    return list(aggregates.values())
+
+def split_range(start_us: int, end_us: int, unit: str = 'day') -> List[Tuple[int, int]]:
+    """
+    Dzieli zakres [start_us, end_us) na przedziały zadań.
+
+    Dla unit='partition' przedziałami są partycje nakładające się na zakres
+    (przycięte do niego), a luki między nimi są dzielone na doby.
+
+    Returns:
+        Lista przedziałów (start_us, end_us), rosnąco i bez nakładania
+    """
+    if unit not in TASK_UNITS:
+        raise ValueError(f"Nieznana jednostka zadań: {unit}")
+
+    def days(lo: int, hi: int) -> List[Tuple[int, int]]:
+        bounds = list(range(lo - lo % DAY_US + DAY_US, hi, DAY_US))
+        return list(zip([lo] + bounds, bounds + [hi])) if lo < hi else []
+
+    if unit == 'day':
+        return days(start_us, end_us)
+
+    with db.get_engine().connect() as conn:
+        partitions = conn.execute(
+            select(CATALOG.c.start_us, CATALOG.c.end_us)
+            .where(CATALOG.c.end_us > start_us, CATALOG.c.start_us < end_us)
+            .order_by(CATALOG.c.start_us)
+        ).fetchall()
+    tasks = []
+    position = start_us
+    for partition_start, partition_end in partitions:
+        partition_start, partition_end = max(partition_start, position), min(partition_end, end_us)
+        if partition_start >= partition_end:
+            continue
+        tasks += days(position, partition_start)
+        tasks.append((partition_start, partition_end))
+        position = partition_end
+    return tasks + days(position, end_us)
+
+class BatchAnalytics:
+    """
+    Równoległe analizy dobowe długich zakresów dat (raporty miesięczne, roczne).
+
+    Zakres jest dzielony na zadania (doby lub partycje), które pula procesów
+    agreguje niezależnie na połączeniach SQLite tylko do odczytu; agregaty
+    częściowe (liczność, suma, suma kwadratów, min, max) są łączone w procesie
+    głównym, więc wynik nie zależy od podziału na zadania.
+    """
+
+    def __init__(self, workers: Optional[int] = None, unit: str = 'day'):
+        """
+        Args:
+            workers: Liczba procesów roboczych (domyślnie liczba rdzeni; 1 = bez puli)
+            unit: Jednostka zadań z TASK_UNITS
+        """
+        if unit not in TASK_UNITS:
+            raise ValueError(f"Nieznana jednostka zadań: {unit}")
+        self.workers = workers or os.cpu_count() or 1
+        self.unit = unit
+
+    def aggregate_by_day(self, start_date: datetime, end_date: datetime,
+                         device_id: Optional[str] = None) -> Dict[int, dict]:
+        """
+        Agreguje odczyty okna [start_date, end_date) do kubełków dobowych.
+
+        Returns:
+            Dict początek doby (µs) -> agregaty w formacie wiersza rollup
+        """
+        start_us, end_us = to_epoch_us(start_date), to_epoch_us(end_date)
+        tasks = [(lo, hi, device_id) for lo, hi in split_range(start_us, end_us, self.unit)]
+        started = time.perf_counter()
+        result: Dict[int, dict] = {}
+        workers = min(self.workers, len(tasks))
+        if workers <= 1:
+            for task in tasks:
+                merge_aggregates(result, _aggregate_task(task))
+        else:
+            # spawn: procesy robocze nie dziedziczą otwartych połączeń SQLite
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(db.get_engine().url.render_as_string(hide_password=False), archive.ARCHIVE_DIR)
+            ) as executor:
+                for aggregates in executor.map(_aggregate_task, tasks):
+                    merge_aggregates(result, aggregates)
+        logger.info(f"Zagregowano {len(tasks)} zadań ({workers} procesów) w {time.perf_counter() - started:.2f} s")
+        return dict(sorted(result.items()))
+
+    def daily_report(self, start_date: datetime, end_date: datetime,
+                     device_id: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Statystyki i widmo kolorów dla każdej doby okna oraz dla całego okna.
+
+        Odpowiada wywołaniom get_daily_statistics i analyze_color_spectrum
+        w pętli po dniach, ale doby są liczone równolegle.
+
+        Returns:
+            Dict z 'days' (początek doby -> {'statistics', 'spectrum'}; tylko doby
+            z odczytami) i 'total' ({'statistics', 'spectrum'} całego okna)
+        """
+        days = self.aggregate_by_day(start_date, end_date, device_id)
+        # Całe okno jako jeden kubełek złożony z dób
+        total = merge_aggregates({}, (dict(aggregate, bucket_us=0) for aggregate in days.values()))
+        return {
+            'days': {from_epoch_us(bucket_us): _report(aggregate) for bucket_us, aggregate in days.items()},
+            'total': _report(total[0]) if total else {}
+        }
+
+def _report(aggregate: dict) -> dict:
+    """Statystyki (jak get_daily_statistics) i widmo (jak analyze_color_spectrum) z agregatów."""
+    stats = aggregate_statistics(aggregate, ROLLUP_COLUMNS)
+    return {
+        'statistics': SensorAnalysis._metric_statistics(stats),
+        'spectrum': {
+            'wavelengths': SPECTRUM_WAVELENGTHS,
+            'mean_values': [stats[f'as7262_{w}']['mean'] for w in SPECTRUM_WAVELENGTHS],
+            'max_values': [stats[f'as7262_{w}']['max'] for w in SPECTRUM_WAVELENGTHS],
+            'min_values': [stats[f'as7262_{w}']['min'] for w in SPECTRUM_WAVELENGTHS]
+        }
+    }
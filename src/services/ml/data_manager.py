@@ -1,211 +1,222 @@
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, UTC
-from typing import Tuple, List, Dict, Optional, Any
+from typing import Tuple, List, Dict, Optional, Any, Iterator
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from database.operations import get_latest_readings
-from database.schema import SensorReading
-from database.db import get_session
-from sqlalchemy import and_
+from database.query import count_rows, fetch_columns, iter_column_chunks
+
+# Kolumny widma AS7262
+SPECTRUM_COLUMNS = [
+    'as7262_450nm', 'as7262_500nm', 'as7262_550nm',
+    'as7262_570nm', 'as7262_600nm', 'as7262_650nm'
+]
+
+# Kolumny wszystkich czujników używane przez detektor anomalii
+ANOMALY_COLUMNS = SPECTRUM_COLUMNS + [
+    'tsl2591_lux', 'tsl2591_ir', 'tsl2591_full',
+    'sen0611_cct', 'sen0611_als',
+    'as7262_temperature', 'ambient_temperature'
+]
 
 class MLDataManager:
     def __init__(self):
         self.scaler = StandardScaler()
+
+    def _fetch_window(self, columns: List[str], hours: int,
+                      device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Pobiera wybrane kolumny z ostatnich n godzin jako tablice NumPy."""
+        end_time = datetime.now(UTC)
+        start_time = end_time - timedelta(hours=hours)
+        return fetch_columns(columns, start_time, end_time, device_id=device_id)
         
-    def prepare_color_correction_data(self, hours: int = 24) -> Tuple[np.ndarray, np.ndarray]:
+    def prepare_color_correction_data(self, hours: int = 24,
+                                      device_id: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         Przygotowuje dane do treningu modelu korekcji kolorów.
         
         Args:
             hours: Liczba godzin danych do pobrania
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
             
         Returns:
             X: Cechy (spektrum AS7262)
             y: Etykiety (CCT z SEN0611)
         """
-        session = get_session()
-        try:
-            end_time = datetime.now(UTC)
-            start_time = end_time - timedelta(hours=hours)
-            
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
-                )
-            ).all()
-            
-            if not readings:
-                return np.array([]), np.array([])
-            
-            # Przygotuj cechy (spektrum AS7262)
-            X = np.array([[
-                r.as7262_450nm, r.as7262_500nm, r.as7262_550nm,
-                r.as7262_570nm, r.as7262_600nm, r.as7262_650nm
-            ] for r in readings])
-            
-            # Przygotuj etykiety (CCT)
-            y = np.array([r.sen0611_cct for r in readings])
-            
-            # Normalizacja danych
-            X = self.scaler.fit_transform(X)
-            
-            return X, y
-            
-        finally:
-            session.close()
+        data = self._fetch_window(SPECTRUM_COLUMNS + ['sen0611_cct'], hours, device_id)
+        
+        if not len(data['sen0611_cct']):
+            return np.array([]), np.array([])
+        
+        # Przygotuj cechy (spektrum AS7262)
+        X = np.column_stack([data[c] for c in SPECTRUM_COLUMNS])
+        
+        # Przygotuj etykiety (CCT)
+        y = data['sen0611_cct']
+        
+        # Normalizacja danych
+        X = self.scaler.fit_transform(X)
+        
+        return X, y
     
-    def prepare_anomaly_detection_data(self, hours: int = 24) -> np.ndarray:
+    def prepare_anomaly_detection_data(self, hours: int = 24, chunk_size: int = 10000,
+                                       device_id: Optional[str] = None) -> np.ndarray:
         """
         Przygotowuje dane do treningu modelu wykrywania anomalii.
         
+        Dane są czytane paczkami wprost do prealokowanej macierzy, więc poza
+        samym wynikiem zużycie pamięci nie zależy od długości okna.
+        
         Args:
             hours: Liczba godzin danych do pobrania
+            chunk_size: Liczba odczytów w paczce
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
             
         Returns:
             X: Dane do treningu detektora anomalii
         """
-        session = get_session()
-        try:
-            end_time = datetime.now(UTC)
-            start_time = end_time - timedelta(hours=hours)
-            
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
-                )
-            ).all()
-            
-            if not readings:
-                return np.array([])
-            
-            # Przygotuj dane ze wszystkich czujników
-            X = np.array([[
-                r.as7262_450nm, r.as7262_500nm, r.as7262_550nm,
-                r.as7262_570nm, r.as7262_600nm, r.as7262_650nm,
-                r.tsl2591_lux, r.tsl2591_ir, r.tsl2591_full,
-                r.sen0611_cct, r.sen0611_als,
-                r.as7262_temperature, r.ambient_temperature
-            ] for r in readings])
-            
-            # Normalizacja danych
-            X = self.scaler.fit_transform(X)
-            
-            return X
+        end_time = datetime.now(UTC)
+        start_time = end_time - timedelta(hours=hours)
+        
+        # Przygotuj dane ze wszystkich czujników
+        X = np.empty((count_rows(start_time, end_time, device_id=device_id), len(ANOMALY_COLUMNS)))
+        filled = 0
+        for chunk in iter_column_chunks(ANOMALY_COLUMNS, start_time, end_time, chunk_size=chunk_size,
+                                        device_id=device_id):
+            # Odczyty dopisane po zliczeniu wierszy pomijamy
+            size = min(len(chunk['sen0611_cct']), len(X) - filled)
+            for i, column in enumerate(ANOMALY_COLUMNS):
+                X[filled:filled + size, i] = chunk[column][:size]
+            filled += size
+            if filled == len(X):
+                break
+        X = X[:filled]
+        
+        if not len(X):
+            return np.array([])
+        
+        # Normalizacja danych
+        X = self.scaler.fit_transform(X)
+        
+        return X
+    
+    def iter_anomaly_detection_batches(self, hours: int = 24, chunk_size: int = 10000,
+                                       device_id: Optional[str] = None) -> Iterator[np.ndarray]:
+        """
+        Strumieniowy odpowiednik prepare_anomaly_detection_data.
+        
+        Pierwszy przebieg dopasowuje skaler przyrostowo (partial_fit), drugi
+        zwraca znormalizowane paczki; pamięć jest ograniczona do jednej paczki.
+        
+        Args:
+            hours: Liczba godzin danych do pobrania
+            chunk_size: Liczba odczytów w paczce
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
             
-        finally:
-            session.close()
+        Yields:
+            Znormalizowane paczki danych do treningu detektora anomalii
+        """
+        end_time = datetime.now(UTC)
+        start_time = end_time - timedelta(hours=hours)
+        
+        self.scaler = StandardScaler()
+        fitted = False
+        for chunk in iter_column_chunks(ANOMALY_COLUMNS, start_time, end_time, chunk_size=chunk_size,
+                                        device_id=device_id):
+            self.scaler.partial_fit(np.column_stack([chunk[c] for c in ANOMALY_COLUMNS]))
+            fitted = True
+        if not fitted:
+            return
+        
+        for chunk in iter_column_chunks(ANOMALY_COLUMNS, start_time, end_time, chunk_size=chunk_size,
+                                        device_id=device_id):
+            yield self.scaler.transform(np.column_stack([chunk[c] for c in ANOMALY_COLUMNS]))
     
-    def prepare_sensor_optimization_data(self, hours: int = 24) -> Tuple[np.ndarray, np.ndarray]:
+    def prepare_sensor_optimization_data(self, hours: int = 24,
+                                         device_id: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         Przygotowuje dane do treningu modelu optymalizacji czujników.
         
         Args:
             hours: Liczba godzin danych do pobrania
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
             
         Returns:
             X: Cechy (odczyty czujników i warunki)
             y: Etykiety (optymalne parametry)
         """
-        session = get_session()
-        try:
-            end_time = datetime.now(UTC)
-            start_time = end_time - timedelta(hours=hours)
-            
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
-                )
-            ).all()
-            
-            if not readings:
-                return np.array([]), np.array([])
-            
-            # Przygotuj cechy (warunki pomiarowe)
-            X = np.array([[
-                float(getattr(r, 'ambient_temperature')),
-                float(getattr(r, 'tsl2591_lux')),
-                float(getattr(r, 'sen0611_als')),
-                float(getattr(r, 'as7262_temperature'))
-            ] for r in readings], dtype=np.float64)
-            
-            # Przygotuj etykiety (zakładamy, że optymalne parametry to średnie wartości)
-            spectrum_values = np.array([[
-                float(getattr(r, 'as7262_450nm')), float(getattr(r, 'as7262_500nm')), 
-                float(getattr(r, 'as7262_550nm')), float(getattr(r, 'as7262_570nm')), 
-                float(getattr(r, 'as7262_600nm')), float(getattr(r, 'as7262_650nm'))
-            ] for r in readings], dtype=np.float64)
-            
-            y = np.array([[
-                np.mean(spectrum),
-                float(getattr(r, 'tsl2591_full')),
-                float(getattr(r, 'sen0611_cct'))
-            ] for r, spectrum in zip(readings, spectrum_values)], dtype=np.float64)
-            
-            # Normalizacja danych
-            X = self.scaler.fit_transform(X)
-            y = self.scaler.fit_transform(y)
-            
-            return X, y
-            
-        finally:
-            session.close()
+        data = self._fetch_window(SPECTRUM_COLUMNS + [
+            'ambient_temperature', 'tsl2591_lux', 'sen0611_als', 'as7262_temperature',
+            'tsl2591_full', 'sen0611_cct'
+        ], hours, device_id)
+        
+        if not len(data['sen0611_cct']):
+            return np.array([]), np.array([])
+        
+        # Przygotuj cechy (warunki pomiarowe)
+        X = np.column_stack([
+            data['ambient_temperature'],
+            data['tsl2591_lux'],
+            data['sen0611_als'],
+            data['as7262_temperature']
+        ])
+        
+        # Przygotuj etykiety (zakładamy, że optymalne parametry to średnie wartości)
+        spectrum_values = np.column_stack([data[c] for c in SPECTRUM_COLUMNS])
+        
+        y = np.column_stack([
+            spectrum_values.mean(axis=1),
+            data['tsl2591_full'],
+            data['sen0611_cct']
+        ])
+        
+        # Normalizacja danych
+        X = self.scaler.fit_transform(X)
+        y = self.scaler.fit_transform(y)
+        
+        return X, y
     
-    def prepare_calibration_data(self, hours: int = 24) -> Dict[str, np.ndarray]:
+    def prepare_calibration_data(self, hours: int = 24,
+                                 device_id: Optional[str] = None) -> Dict[str, np.ndarray]:
         """
         Przygotowuje dane do treningu modelu kalibracji adaptacyjnej.
         
         Args:
             hours: Liczba godzin danych do pobrania
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
             
         Returns:
             Dict zawierający dane kalibracyjne dla każdego czujnika
         """
-        session = get_session()
-        try:
-            end_time = datetime.now(UTC)
-            start_time = end_time - timedelta(hours=hours)
-            
-            readings = session.query(SensorReading).filter(
-                and_(
-                    SensorReading.timestamp >= start_time,
-                    SensorReading.timestamp <= end_time
-                )
-            ).all()
-            
-            if not readings:
-                return {}
-            
-            # Przygotuj dane kalibracyjne dla każdego czujnika
-            calibration_data = {
-                'AS7262': np.array([[
-                    r.as7262_450nm, r.as7262_500nm, r.as7262_550nm,
-                    r.as7262_570nm, r.as7262_600nm, r.as7262_650nm,
-                    r.as7262_temperature, r.ambient_temperature
-                ] for r in readings]),
-                
-                'TSL2591': np.array([[
-                    r.tsl2591_lux, r.tsl2591_ir, r.tsl2591_full,
-                    r.ambient_temperature
-                ] for r in readings]),
-                
-                'SEN0611': np.array([[
-                    r.sen0611_cct, r.sen0611_als,
-                    r.ambient_temperature
-                ] for r in readings])
-            }
-            
-            # Normalizacja danych dla każdego czujnika
-            for sensor in calibration_data:
-                calibration_data[sensor] = self.scaler.fit_transform(calibration_data[sensor])
-            
-            return calibration_data
-            
-        finally:
-            session.close()
+        data = self._fetch_window(SPECTRUM_COLUMNS + [
+            'as7262_temperature', 'ambient_temperature',
+            'tsl2591_lux', 'tsl2591_ir', 'tsl2591_full',
+            'sen0611_cct', 'sen0611_als'
+        ], hours, device_id)
+        
+        if not len(data['sen0611_cct']):
+            return {}
+        
+        # Przygotuj dane kalibracyjne dla każdego czujnika
+        calibration_data = {
+            'AS7262': np.column_stack([data[c] for c in SPECTRUM_COLUMNS + [
+                'as7262_temperature', 'ambient_temperature'
+            ]]),
+            
+            'TSL2591': np.column_stack([data[c] for c in [
+                'tsl2591_lux', 'tsl2591_ir', 'tsl2591_full', 'ambient_temperature'
+            ]]),
+            
+            'SEN0611': np.column_stack([data[c] for c in [
+                'sen0611_cct', 'sen0611_als', 'ambient_temperature'
+            ]])
+        }
+        
+        # Normalizacja danych dla każdego czujnika
+        for sensor in calibration_data:
+            calibration_data[sensor] = self.scaler.fit_transform(calibration_data[sensor])
+        
+        return calibration_data
     
     def get_training_validation_split(self, X: np.ndarray, y: np.ndarray,
                                     test_size: float = 0.2, random_state: int = 42) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
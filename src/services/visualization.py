@@ -1,106 +1,433 @@
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta, UTC
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib.figure import Figure
+import matplotlib.dates as mdates
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import tkinter as tk
-from datetime import datetime, timedelta
 import numpy as np
-from typing import List, Dict, Tuple
-from database.operations import get_latest_readings
-from database.schema import SensorReading
+from typing import Dict, List, Optional
+from database.query import column_dtype, fetch_columns
+from database.timeutils import from_epoch_us
+from utils.downsampling import downsample_indices
+
+# Kolumny odczytów potrzebne do wykresów
+PLOT_COLUMNS = [
+    'timestamp', 'sen0611_cct', 'tsl2591_lux', 'as7262_temperature',
+    'as7262_450nm', 'as7262_500nm', 'as7262_550nm',
+    'as7262_570nm', 'as7262_600nm', 'as7262_650nm'
+]
+
+# Kolumny bufora wykresów: źródłowe kolumny odczytów (timestamp -> timestamp_us)
+# i device_id, który z timestamp_us tworzy unikalny klucz odczytu
+BUFFER_COLUMNS = ['timestamp_us', 'device_id'] + [name for name in PLOT_COLUMNS if name != 'timestamp']
+
+# Okres przed ostatnim widzianym odczytem pobierany ponownie w każdej klatce,
+# aby dociągnąć odczyty spóźnione i innych urządzeń z tym samym czasem
+LATE_LOOKBACK = timedelta(seconds=60)
+
+# Domyślny okres odświeżania (ms) i liczba wyświetlanych odczytów (pojemność bufora)
+REFRESH_INTERVAL_MS = 100
+PLOT_WINDOW = 100
+
+# Domyślna liczba odczytów na sekundę (wszystkich wyświetlanych urządzeń), z której
+# wynika pojemność bufora dla window_span; symulator zapisuje 1 odczyt/s
+SAMPLE_RATE_HZ = 1.0
+# Maksymalna pojemność bufora (wierszy); ok. 200 B na wiersz
+MAX_BUFFER_ROWS = 2_000_000
+
+# Maksymalna liczba punktów linii przekazywana do renderowania (ok. 1 na kolumnę
+# pikseli osi); dłuższe szeregi są redukowane z zachowaniem ekstremów
+MAX_PLOT_POINTS = 1000
+
+# Zapas osi czasu (ułamek szerokości okna) przy przesuwaniu; pełne
+# przerysowanie jest potrzebne tylko, gdy dane wyjdą poza bieżące osie
+TIME_HEADROOM = 0.5
+# Margines osi wartości (ułamek zakresu danych)
+VALUE_MARGIN = 0.25
+
+# Liczba ostatnich klatek w statystykach czasu klatki
+FRAME_STATS_WINDOW = 100
+
+class ColumnRingBuffer:
+    """
+    Bufor cykliczny kolumn NumPy o stałej pojemności.
+
+    Każda wartość jest zapisywana dwukrotnie (pod indeksem i oraz
+    i + capacity), więc ostatnie n wierszy to zawsze ciągły widok tablicy,
+    bez kopiowania i np.roll. Dopisanie n wierszy kosztuje O(n).
+    """
+
+    def __init__(self, capacity: int, dtypes: Dict[str, np.dtype]):
+        """
+        Args:
+            capacity: Maksymalna liczba przechowywanych wierszy
+            dtypes: Kolumna -> typ NumPy
+        """
+        self.capacity = capacity
+        self._arrays = {name: np.zeros(2 * capacity, dtype=dtype) for name, dtype in dtypes.items()}
+        self._next = 0  # pozycja następnego zapisu (0..capacity-1)
+        self.size = 0
+
+    def extend(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Dopisuje wiersze (kolumny jak w dtypes); najstarsze wiersze są nadpisywane."""
+        count = len(next(iter(arrays.values())))
+        if not count:
+            return
+        if count > self.capacity:
+            arrays = {name: values[-self.capacity:] for name, values in arrays.items()}
+            count = self.capacity
+        positions = (self._next + np.arange(count)) % self.capacity
+        for name, buffer in self._arrays.items():
+            buffer[positions] = arrays[name]
+            buffer[positions + self.capacity] = arrays[name]
+        self._next = (self._next + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def clear(self) -> None:
+        """Usuwa wszystkie wiersze (bez zwalniania tablic)."""
+        self._next = 0
+        self.size = 0
+
+    def view(self, name: str, count: Optional[int] = None) -> np.ndarray:
+        """Zwraca widok ostatnich count wierszy kolumny (domyślnie wszystkich), rosnąco po czasie."""
+        count = self.size if count is None else min(count, self.size)
+        end = self._next + self.capacity
+        return self._arrays[name][end - count:end]
+
+def span_capacity(window_span: timedelta, sample_rate: float = SAMPLE_RATE_HZ) -> int:
+    """Liczba odczytów w okresie window_span przy sample_rate odczytach na sekundę."""
+    return max(1, math.ceil(window_span.total_seconds() * sample_rate))
 
 class RealTimeVisualizer:
-    def __init__(self):
+    """
+    Wizualizacja odczytów w czasie rzeczywistym (Tkinter + matplotlib).
+
+    Artyści (linie, słupki, tekst) są tworzeni raz, a w każdej klatce
+    zmieniane są tylko ich dane. Klatka odtwarza zapisane tło (osie, opisy)
+    i rysuje na nim wyłącznie artystów (blitting); pełne przerysowanie
+    figury następuje tylko przy zmianie zakresu osi lub rozmiaru okna.
+    Układ figury jest stały (bez tight_layout).
+
+    Odczyty są trzymane w buforze cyklicznym, a każda klatka pobiera z bazy
+    tylko odczyty od late_lookback przed ostatnim widzianym (timestamp_us),
+    więc koszt klatki zależy od liczby nowych odczytów, a nie od długości
+    okna. Odczyty już w buforze są pomijane po kluczu (device_id,
+    timestamp_us), więc odczyty innych urządzeń z tym samym czasem i odczyty
+    spóźnione o mniej niż late_lookback są dociągane (spóźnione wstawiane
+    w kolejności czasu); starsze spóźnione odczyty nie są dociągane.
+    """
+
+    def __init__(self, interval_ms: int = REFRESH_INTERVAL_MS, window: Optional[int] = None,
+                 window_span: Optional[timedelta] = None, device_id: Optional[str] = None,
+                 max_points: int = MAX_PLOT_POINTS, downsampling: str = 'minmax',
+                 sample_rate: float = SAMPLE_RATE_HZ, late_lookback: timedelta = LATE_LOOKBACK):
+        """
+        Args:
+            interval_ms: Okres odświeżania (ms)
+            window: Maksymalna liczba wyświetlanych odczytów (pojemność bufora); domyślnie
+                PLOT_WINDOW, a przy window_span liczba odczytów z tego okresu
+            window_span: Wyświetlany okres (np. timedelta(hours=24)); domyślnie bez limitu czasu
+            device_id: Tylko odczyty tego urządzenia (domyślnie wszystkie)
+            max_points: Maksymalna liczba punktów linii (koszt rysowania nie zależy od okna)
+            downsampling: Metoda redukcji punktów z utils.downsampling ('minmax' lub 'lttb')
+            sample_rate: Liczba odczytów na sekundę, z której wynika pojemność bufora dla window_span
+            late_lookback: Okres przed ostatnim widzianym odczytem sprawdzany w każdej klatce
+
+        Raises:
+            ValueError: Gdy window_span nie mieści się w buforze (window lub MAX_BUFFER_ROWS)
+        """
+        if window_span is not None:
+            required = span_capacity(window_span, sample_rate)
+            if window is None:
+                window = required
+            elif window < required:
+                raise ValueError(
+                    f"window={window} nie mieści {window_span} przy {sample_rate} odczytach/s "
+                    f"(potrzeba {required})"
+                )
+        window = PLOT_WINDOW if window is None else window
+        if window > MAX_BUFFER_ROWS:
+            raise ValueError(f"Bufor wykresów {window} wierszy przekracza MAX_BUFFER_ROWS={MAX_BUFFER_ROWS}")
+        self.interval_ms = interval_ms
+        self.window = window
+        self.window_span = window_span
+        self.device_id = device_id
+        self.max_points = max_points
+        self.downsampling = downsampling
+        self.late_us = int(late_lookback.total_seconds() * 1_000_000)
+
+        # Bufor odczytów z czasem jako liczbą dat matplotlib, wyliczaną raz dla nowych wierszy
+        self.buffer = ColumnRingBuffer(window, {
+            **{name: column_dtype(name) for name in BUFFER_COLUMNS}, 'plot_time': np.dtype(np.float64)
+        })
+        self._last_us: Optional[int] = None
+
         # Utworzenie okna Tkinter
         self.root = tk.Tk()
         self.root.title("ColorSense - Wizualizacja w czasie rzeczywistym")
-        
-        # Konfiguracja wykresu
+
+        # Konfiguracja wykresu (stały układ)
         self.fig = plt.figure(figsize=(15, 10))
-        self.fig.subplots_adjust(hspace=0.5)
-        
+        self.fig.subplots_adjust(left=0.07, right=0.98, bottom=0.1, top=0.95, hspace=0.5, wspace=0.2)
+
         # Utworzenie subplotów
         self.ax1 = self.fig.add_subplot(221)  # CCT
         self.ax2 = self.fig.add_subplot(222)  # Luminancja
         self.ax3 = self.fig.add_subplot(223)  # Spektrum
         self.ax4 = self.fig.add_subplot(224)  # Temperatura
-        
+
         # Inicjalizacja danych
-        self.timestamps: List[datetime] = []
-        self.cct_values: List[float] = []
-        self.lux_values: List[float] = []
-        self.spectrum_values: Dict[str, List[float]] = {
-            '450nm': [], '500nm': [], '550nm': [],
-            '570nm': [], '600nm': [], '650nm': []
+        self.timestamps: np.ndarray = np.empty(0, dtype='datetime64[us]')
+        self.cct_values: np.ndarray = np.empty(0)
+        self.lux_values: np.ndarray = np.empty(0)
+        self.spectrum_values: Dict[str, np.ndarray] = {
+            '450nm': np.empty(0), '500nm': np.empty(0), '550nm': np.empty(0),
+            '570nm': np.empty(0), '600nm': np.empty(0), '650nm': np.empty(0)
         }
-        self.temp_values: List[float] = []
-        
-        # Dodanie wykresu do Tkinter
+        self.temp_values: np.ndarray = np.empty(0)
+
+        self._create_artists()
+
+        # Statystyki czasu klatki (pobranie danych + rysowanie)
+        self._frame_times = deque(maxlen=FRAME_STATS_WINDOW)
+        self._frames = 0
+        self._full_redraws = 0
+        self._background = None
+        self._after_id = None
+
+        # Dodanie wykresu do Tkinter; każde pełne rysowanie (także po zmianie
+        # rozmiaru okna) zapisuje nowe tło dla blittingu
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.root)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
         self.canvas.draw()
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-        
-    def update_plots(self, frame):
-        """Aktualizacja wykresów."""
-        # Pobierz najnowsze odczyty
-        readings = get_latest_readings(100)
-        
-        # Aktualizacja danych
-        self.timestamps = [r.timestamp for r in readings]
-        self.cct_values = [r.sen0611_cct for r in readings]
-        self.lux_values = [r.tsl2591_lux for r in readings]
-        self.temp_values = [r.as7262_temperature for r in readings]
-        
-        for wavelength in self.spectrum_values.keys():
-            self.spectrum_values[wavelength] = [
-                getattr(r, f'as7262_{wavelength}') for r in readings
-            ]
-        
-        # Czyszczenie wykresów
-        self.ax1.clear()
-        self.ax2.clear()
-        self.ax3.clear()
-        self.ax4.clear()
-        
-        # Wykres CCT
-        self.ax1.plot(self.timestamps, self.cct_values, 'b-')
+
+    def _create_artists(self) -> None:
+        """Tworzy osie z opisami i trwałych artystów aktualizowanych w każdej klatce."""
+        self.cct_line, = self.ax1.plot([], [], 'b-', animated=True)
         self.ax1.set_title('Temperatura barwowa (CCT)')
         self.ax1.set_ylabel('Temperatura [K]')
-        self.ax1.tick_params(axis='x', rotation=45)
-        
-        # Wykres luminancji
-        self.ax2.plot(self.timestamps, self.lux_values, 'g-')
+
+        self.lux_line, = self.ax2.plot([], [], 'g-', animated=True)
         self.ax2.set_title('Luminancja')
         self.ax2.set_ylabel('Lux')
-        self.ax2.tick_params(axis='x', rotation=45)
-        
-        # Wykres spektrum
+
         wavelengths = list(self.spectrum_values.keys())
-        latest_spectrum = [self.spectrum_values[w][-1] if self.spectrum_values[w] else 0 
-                         for w in wavelengths]
-        self.ax3.bar(wavelengths, latest_spectrum)
+        self.spectrum_bars = self.ax3.bar(wavelengths, np.zeros(len(wavelengths)))
+        for bar in self.spectrum_bars:
+            bar.set_animated(True)
         self.ax3.set_title('Aktualne spektrum')
         self.ax3.set_ylabel('Intensywność')
-        
-        # Wykres temperatury
-        self.ax4.plot(self.timestamps, self.temp_values, 'r-')
+
+        self.temp_line, = self.ax4.plot([], [], 'r-', animated=True)
         self.ax4.set_title('Temperatura czujnika')
         self.ax4.set_ylabel('Temperatura [°C]')
-        self.ax4.tick_params(axis='x', rotation=45)
-        
-        # Dostosowanie układu
-        self.fig.tight_layout()
-    
+
+        for ax in (self.ax1, self.ax2, self.ax4):
+            ax.xaxis_date()
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+            ax.tick_params(axis='x', rotation=45)
+
+        self.frame_text = self.fig.text(0.99, 0.01, '', ha='right', va='bottom', fontsize=8, animated=True)
+
+    @property
+    def _artists(self) -> List:
+        return [self.cct_line, self.lux_line, self.temp_line, *self.spectrum_bars, self.frame_text]
+
+    def _on_draw(self, event) -> None:
+        """Zapisuje tło po pełnym rysowaniu i rysuje na nim artystów."""
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self) -> None:
+        for artist in self._artists:
+            self.fig.draw_artist(artist)
+
+    @staticmethod
+    def _expand_limits(ax, x: np.ndarray, y: np.ndarray) -> bool:
+        """
+        Dopasowuje osie, jeśli dane z nich wychodzą.
+
+        Returns:
+            Czy zakres osi się zmienił (wymagane pełne przerysowanie)
+        """
+        changed = False
+        if x is not None and len(x):
+            x0, x1 = ax.get_xlim()
+            if x[0] < x0 or x[-1] > x1:
+                span = max(x[-1] - x[0], 1 / 86400)
+                ax.set_xlim(x[0], x[-1] + span * TIME_HEADROOM)
+                changed = True
+        y = y[np.isfinite(y)]
+        if len(y):
+            low, high = y.min(), y.max()
+            y0, y1 = ax.get_ylim()
+            if low < y0 or high > y1:
+                margin = (high - low) * VALUE_MARGIN or abs(high) * VALUE_MARGIN or 1.0
+                ax.set_ylim(low - margin, high + margin)
+                changed = True
+        return changed
+
+    def update_plots(self, frame=None) -> List:
+        """
+        Aktualizacja wykresów: nowe dane artystów i blitting.
+
+        Returns:
+            Zaktualizowani artyści
+        """
+        started = time.perf_counter()
+
+        # Bez nowych odczytów obraz się nie zmienia
+        if not self.poll() and self._background is not None:
+            return self._artists
+
+        # Aktualizacja danych (widoki bufora z okna wyświetlania)
+        count = self._visible_count()
+        self.timestamps = self.buffer.view('timestamp_us', count).view('datetime64[us]')
+        self.cct_values = self.buffer.view('sen0611_cct', count)
+        self.lux_values = self.buffer.view('tsl2591_lux', count)
+        self.temp_values = self.buffer.view('as7262_temperature', count)
+
+        for wavelength in self.spectrum_values.keys():
+            self.spectrum_values[wavelength] = self.buffer.view(f'as7262_{wavelength}', count)
+
+        # Dane artystów (czas jako liczby dat matplotlib)
+        times = self.buffer.view('plot_time', count)
+        for line, values in ((self.cct_line, self.cct_values), (self.lux_line, self.lux_values),
+                             (self.temp_line, self.temp_values)):
+            if len(values) > self.max_points:
+                indices = downsample_indices(times, values, self.max_points, self.downsampling)
+                line.set_data(times[indices], values[indices])
+            else:
+                line.set_data(times, values)
+        latest_spectrum = np.array([
+            self.spectrum_values[w][-1] if len(self.spectrum_values[w]) else 0.0
+            for w in self.spectrum_values
+        ], dtype=np.float64)
+        for bar, height in zip(self.spectrum_bars, latest_spectrum):
+            bar.set_height(height)
+
+        rescaled = False
+        for ax, values in ((self.ax1, self.cct_values), (self.ax2, self.lux_values),
+                           (self.ax4, self.temp_values)):
+            rescaled |= self._expand_limits(ax, times, np.asarray(values, dtype=np.float64))
+        rescaled |= self._expand_limits(self.ax3, None, np.append(latest_spectrum, 0.0))
+
+        # Tekst ustawiany przed rysowaniem, aby klatka pokazywała czas ostatniej
+        # zakończonej klatki (czas bieżącej jest znany dopiero po rysowaniu)
+        if self._frames:
+            stats = self.get_frame_stats()
+            self.frame_text.set_text(f"klatka {stats['last_ms']:.1f} ms (śr. {stats['mean_ms']:.1f} ms)")
+
+        if rescaled or self._background is None:
+            # Nowe osie: pełne rysowanie (draw_event zapisze tło i narysuje artystów)
+            self._full_redraws += 1
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_artists()
+            self.canvas.blit(self.fig.bbox)
+
+        self._frame_times.append(time.perf_counter() - started)
+        self._frames += 1
+        return self._artists
+
+    def poll(self) -> int:
+        """
+        Dopisuje do bufora odczyty, których w nim jeszcze nie ma.
+
+        Pierwsze wywołanie wypełnia bufor najnowszymi odczytami z okna
+        wyświetlania; kolejne pobierają tylko odczyty od late_lookback przed
+        ostatnim widzianym (najwyżej window wierszy) i pomijają te, które są
+        już w buforze.
+
+        Returns:
+            Liczba nowych odczytów
+        """
+        if self._last_us is None:
+            start = datetime.now(UTC) - self.window_span if self.window_span is not None else None
+            data = fetch_columns(BUFFER_COLUMNS, start, limit=self.window, latest=True, device_id=self.device_id)
+        else:
+            since_us = self._last_us - self.late_us
+            data = fetch_columns(BUFFER_COLUMNS, from_epoch_us(since_us), limit=self.window, latest=True,
+                                 device_id=self.device_id)
+            data = self._unseen(data, since_us)
+        count = len(data['timestamp_us'])
+        if not count:
+            return 0
+        data['plot_time'] = mdates.date2num(data['timestamp_us'].view('datetime64[us]'))
+        if self._last_us is not None and data['timestamp_us'][0] < self._last_us:
+            # Odczyty spóźnione: bufor jest odtwarzany w kolejności czasu
+            data = self._merge_buffered(data)
+            self.buffer.clear()
+        self.buffer.extend(data)
+        self._last_us = int(self.buffer.view('timestamp_us', 1)[0])
+        return count
+
+    def _unseen(self, data: Dict[str, np.ndarray], since_us: int) -> Dict[str, np.ndarray]:
+        """Odrzuca pobrane odczyty, które są już w buforze (klucz device_id, timestamp_us)."""
+        timestamps = self.buffer.view('timestamp_us')
+        lo = int(np.searchsorted(timestamps, since_us, side='left'))
+        seen = set(zip(self.buffer.view('device_id')[lo:].tolist(), timestamps[lo:].tolist()))
+        if not seen:
+            return data
+        mask = np.fromiter(
+            ((device_id, timestamp_us) not in seen
+             for device_id, timestamp_us in zip(data['device_id'].tolist(), data['timestamp_us'].tolist())),
+            dtype=bool, count=len(data['timestamp_us'])
+        )
+        return {name: values[mask] for name, values in data.items()}
+
+    def _merge_buffered(self, data: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Łączy zawartość bufora z nowymi odczytami i porządkuje je po czasie."""
+        merged = {name: np.concatenate([self.buffer.view(name), values]) for name, values in data.items()}
+        order = np.argsort(merged['timestamp_us'], kind='stable')
+        return {name: values[order] for name, values in merged.items()}
+
+    def _visible_count(self) -> int:
+        """Liczba odczytów z bufora mieszczących się w window_span od najnowszego."""
+        if self.window_span is None or not self.buffer.size:
+            return self.buffer.size
+        timestamps = self.buffer.view('timestamp_us')
+        cutoff = timestamps[-1] - int(self.window_span.total_seconds() * 1_000_000)
+        return self.buffer.size - int(np.searchsorted(timestamps, cutoff, side='left'))
+
+    def get_frame_stats(self) -> Dict[str, float]:
+        """
+        Zwraca statystyki czasu klatki (pobranie danych i rysowanie).
+
+        Returns:
+            Dict z liczbą klatek i pełnych przerysowań oraz czasem ostatniej,
+            średnim i maksymalnym (ms) z ostatnich FRAME_STATS_WINDOW klatek
+        """
+        times = self._frame_times
+        return {
+            'frames': self._frames,
+            'full_redraws': self._full_redraws,
+            'last_ms': times[-1] * 1000 if times else 0.0,
+            'mean_ms': sum(times) / len(times) * 1000 if times else 0.0,
+            'max_ms': max(times) * 1000 if times else 0.0
+        }
+
+    def _tick(self) -> None:
+        """Klatka i zaplanowanie następnej (zawsze z przerwą na obsługę zdarzeń Tk)."""
+        started = time.perf_counter()
+        self.update_plots()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._after_id = self.root.after(max(10, int(self.interval_ms - elapsed_ms)), self._tick)
+
     def start(self):
         """Uruchomienie wizualizacji."""
-        # Animacja z odświeżaniem co 1 sekundę
-        self.ani = animation.FuncAnimation(
-            self.fig, self.update_plots, interval=1000
-        )
+        self._after_id = self.root.after(0, self._tick)
         self.root.mainloop()
-    
+
     def stop(self):
         """Zatrzymanie wizualizacji."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
         self.root.quit()
         self.root.destroy()
 
@@ -113,4 +440,4 @@ def main():
         visualizer.stop()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
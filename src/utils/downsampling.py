@@ -0,0 +1,128 @@
+from typing import Tuple
+import numpy as np
+
+# Metody redukcji punktów szeregu czasowego
+DOWNSAMPLING_METHODS = ('minmax', 'lttb')
+
+def _finite_indices(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Indeksy punktów z wartością (NaN i nieskończoności są pomijane)."""
+    return np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Wybiera punkty minimum i maksimum w kubełkach o równej szerokości osi x.
+
+    Kubełek odpowiada kolumnie pikseli wykresu, więc każde ekstremum
+    pozostaje widoczne; luki w danych nie przesuwają kubełków. Z każdego
+    kubełka wybierane są minimum, maksimum oraz pierwszy i ostatni punkt
+    (ciągłość linii między kubełkami), stąd n_out // 4 kubełków. Koszt O(n)
+    w NumPy, bez pętli w Pythonie. Dla n_out < 4 (mniej niż jeden pełny
+    kubełek) używane jest LTTB, aby nie przekroczyć n_out punktów.
+
+    Args:
+        x: Wartości osi x (rosnąco)
+        y: Wartości szeregu
+        n_out: Docelowa (maksymalna) liczba punktów
+
+    Returns:
+        Posortowane indeksy wybranych punktów
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if n_out < 4:
+        return lttb_indices(x, y, n_out)
+    valid = _finite_indices(x, y)
+    if len(valid) <= n_out:
+        return valid
+    buckets = n_out // 4
+    xv, yv = x[valid], y[valid]
+    span = xv[-1] - xv[0]
+    if span > 0:
+        bucket = np.minimum(((xv - xv[0]) / span * buckets).astype(np.int64), buckets - 1)
+    else:
+        bucket = np.arange(len(xv)) * buckets // len(xv)
+    # Przy rosnącym x kubełki są ciągłymi fragmentami tablicy
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(xv)]))
+    selected = [starts, np.r_[starts[1:] - 1, len(xv) - 1]]
+    for extreme in (np.minimum.reduceat(yv, starts), np.maximum.reduceat(yv, starts)):
+        # Pierwsze wystąpienie ekstremum w każdym kubełku
+        hits = np.flatnonzero(yv == extreme[segment])
+        hit_segments = segment[hits]
+        selected.append(hits[np.r_[True, hit_segments[1:] != hit_segments[:-1]]])
+    return valid[np.unique(np.concatenate(selected))]
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Wybiera punkty algorytmem Largest-Triangle-Three-Buckets.
+
+    Pierwszy i ostatni punkt są zachowane, a z każdego z n_out - 2 kubełków
+    (równej liczności) wybierany jest punkt tworzący największy trójkąt
+    z punktem wybranym w poprzednim kubełku i średnią następnego. Średnie
+    kubełków są liczone wektorowo z sum skumulowanych; pętla po kubełkach
+    (zależność od poprzedniego wyboru) wykonuje w każdym kroku jedną
+    operację NumPy na punktach kubełka.
+
+    Args:
+        x: Wartości osi x (rosnąco)
+        y: Wartości szeregu
+        n_out: Docelowa liczba punktów (dla n_out < 3 tylko skrajne punkty)
+
+    Returns:
+        Posortowane indeksy wybranych punktów
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = _finite_indices(x, y)
+    n = len(valid)
+    if n <= n_out:
+        return valid
+    if n_out < 3:
+        # Bez kubełków środkowych zostają najwyżej skrajne punkty
+        return valid[[0, n - 1][:max(n_out, 0)]]
+    xv, yv = x[valid], y[valid]
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Średnie "następnych" kubełków: środkowe kubełki i ostatni punkt jako ostatni kubełek
+    next_edges = np.r_[edges, n]
+    x_sums, y_sums = np.r_[0.0, np.cumsum(xv)], np.r_[0.0, np.cumsum(yv)]
+    sizes = np.diff(next_edges)
+    averages_x = (x_sums[next_edges[1:]] - x_sums[next_edges[:-1]]) / sizes
+    averages_y = (y_sums[next_edges[1:]] - y_sums[next_edges[:-1]]) / sizes
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = xv[a], yv[a]
+        bx, by = averages_x[i + 1], averages_y[i + 1]
+        area = np.abs((ax - bx) * (yv[lo:hi] - ay) - (ax - xv[lo:hi]) * (by - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return valid[selected]
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, n_out: int, method: str = 'minmax') -> np.ndarray:
+    """Indeksy punktów szeregu zredukowanego metodą z DOWNSAMPLING_METHODS."""
+    if method == 'minmax':
+        return minmax_indices(x, y, n_out)
+    if method == 'lttb':
+        return lttb_indices(x, y, n_out)
+    raise ValueError(f"Nieznana metoda redukcji punktów: {method}")
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int,
+               method: str = 'minmax') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Redukuje szereg czasowy do najwyżej n_out punktów z zachowaniem ekstremów.
+
+    Args:
+        x: Wartości osi x (rosnąco, np. timestamp_us lub liczby dat)
+        y: Wartości szeregu (NaN jest pomijany)
+        n_out: Docelowa liczba punktów
+        method: 'minmax' (min i max na kubełek osi x) lub 'lttb'
+
+    Returns:
+        (x, y) wybranych punktów
+    """
+    indices = downsample_indices(x, y, n_out, method)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
@@ -0,0 +1,65 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional
+import numpy as np
+import pytest
+
+# Baza i archiwum poza katalogiem data/; ustawiane przed importem database.db,
+# który tworzy silnik przy imporcie
+_TMP_DIR = tempfile.mkdtemp(prefix='colorsense-tests-')
+os.environ.setdefault('COLORSENSE_DATABASE_URL', f"sqlite:///{os.path.join(_TMP_DIR, 'colorsense.db')}")
+os.environ.setdefault('COLORSENSE_ARCHIVE_DIR', os.path.join(_TMP_DIR, 'archive'))
+
+from database import archive, db, partitions
+from database.operations import reading_to_row
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Pusta baza SQLite i katalog archiwum w katalogu tymczasowym testu."""
+    db.configure_engine(f"sqlite:///{tmp_path / 'colorsense.db'}")
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    db.init_db()
+    yield db.get_engine()
+    partitions.configure_partitioning('none')
+    partitions.configure_storage_layout('wide')
+    db.get_engine().dispose()
+
+def make_reading(timestamp: datetime, rng: Optional[np.random.Generator] = None,
+                 device_id: Optional[str] = None) -> dict:
+    """Odczyt w formacie symulatora z losowymi (lub stałymi bez rng) pomiarami."""
+    def value(low: float, high: float) -> float:
+        return float(rng.uniform(low, high)) if rng is not None else (low + high) / 2
+
+    reading = {
+        'timestamp': timestamp.isoformat(),
+        'as7262': {
+            band: value(100.0, 1000.0) for band in ('450nm', '500nm', '550nm', '570nm', '600nm', '650nm')
+        },
+        'tsl2591': {'lux': value(0.0, 60000.0), 'ir': value(0.0, 100.0), 'full': value(0.0, 1000.0)},
+        'sen0611': {'cct': value(2500.0, 9000.0), 'als': value(0.0, 1000.0)},
+        'gps': {'latitude': 52.2297001, 'longitude': 21.0122287, 'altitude': 100.0, 'satellites': 8},
+        'ambient_temperature': value(10.0, 30.0)
+    }
+    reading['as7262']['temperature'] = value(20.0, 40.0)
+    if device_id is not None:
+        reading['device_id'] = device_id
+    return reading
+
+@pytest.fixture
+def make_readings():
+    """Fabryka odczytów w formacie symulatora dla podanych chwil (ziarnisty generator)."""
+    rng = np.random.default_rng(42)
+
+    def factory(timestamps, device_id: Optional[str] = None) -> list:
+        return [make_reading(timestamp, rng, device_id) for timestamp in timestamps]
+
+    return factory
+
+@pytest.fixture
+def make_rows(make_readings):
+    """Fabryka wierszy sensor_readings dla podanych chwil (zob. make_readings)."""
+    def factory(timestamps, device_id: Optional[str] = None) -> list:
+        return [reading_to_row(reading) for reading in make_readings(timestamps, device_id)]
+
+    return factory
@@ -0,0 +1,37 @@
+from sqlalchemy import update
+from database import db
+from database.operations import (get_active_calibration, get_active_ml_model, invalidate_active_cache,
+                                 save_calibration_data, save_ml_model)
+from database.schema import CalibrationData
+
+def _change_behind_cache(parameters: str) -> None:
+    # Zmiana z pominięciem save_calibration_data (jak z innego procesu)
+    with db.get_engine().begin() as conn:
+        conn.execute(update(CalibrationData.__table__).values(parameters=parameters))
+
+def test_calibration_is_cached_until_invalidated(database):
+    save_calibration_data('as7262', {'gain': 2})
+    assert get_active_calibration('as7262') == {'gain': 2}
+
+    _change_behind_cache('{"gain": 3}')
+    assert get_active_calibration('as7262') == {'gain': 2}
+    invalidate_active_cache()
+    assert get_active_calibration('as7262') == {'gain': 3}
+
+def test_save_invalidates_cache(database):
+    assert get_active_calibration('as7262') is None
+    save_calibration_data('as7262', {'gain': 4})
+    assert get_active_calibration('as7262') == {'gain': 4}
+
+    save_ml_model('anomaly', '1.0', '/models/a1', {}, {'f1': 0.9})
+    assert get_active_ml_model('anomaly').version == '1.0'
+    save_ml_model('anomaly', '1.1', '/models/a2', {}, {'f1': 0.95})
+    assert get_active_ml_model('anomaly').version == '1.1'
+
+def test_configure_engine_drops_cache_of_previous_database(database, tmp_path):
+    save_calibration_data('as7262', {'gain': 5})
+    assert get_active_calibration('as7262') == {'gain': 5}
+
+    db.configure_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    db.init_db()
+    assert get_active_calibration('as7262') is None
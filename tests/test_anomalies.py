@@ -0,0 +1,89 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from database.operations import insert_sensor_rows
+from services.analysis import ANOMALY_COLUMNS, SensorAnalysis, StreamingAnomalyDetector
+
+START = datetime(2025, 8, 1)
+
+@pytest.fixture
+def spiky_rows(make_rows):
+    rows = make_rows([START + timedelta(minutes=i) for i in range(300)])
+    for i in (120, 240):
+        rows[i]['sen0611_cct'] = 60000.0
+    rows[200]['tsl2591_lux'] = None
+    return rows
+
+def _reference(rows, threshold=3.0):
+    """Dotychczasowa pętla po wierszach pandas (punkt odniesienia)."""
+    df = pd.DataFrame(rows)
+    found = set()
+    for metric, column in ANOMALY_COLUMNS.items():
+        values = df[column].astype(float)
+        z_scores = ((values - values.mean()) / values.std()).abs()
+        found.update((df['timestamp_us'][i], metric) for i in z_scores[z_scores > threshold].index)
+    return found
+
+def test_detect_anomalies_matches_reference(database, spiky_rows):
+    now = datetime.utcnow().replace(microsecond=0)
+    shift = now - timedelta(hours=6) - START
+    for row in spiky_rows:
+        row['timestamp'] += shift
+        row['timestamp_us'] += int(shift.total_seconds()) * 1_000_000
+    insert_sensor_rows(spiky_rows)
+
+    anomalies = SensorAnalysis.detect_anomalies(hours=24)
+    found = {(int(a['timestamp'].value // 1000), a['sensor']) for a in anomalies}
+    assert found == _reference(spiky_rows)
+    assert {(spiky_rows[120]['timestamp_us'], 'cct'), (spiky_rows[240]['timestamp_us'], 'cct')} <= found
+    assert all(a['z_score'] > 3.0 for a in anomalies)
+
+def test_streaming_state_matches_numpy(spiky_rows):
+    detector = StreamingAnomalyDetector(min_samples=30)
+    anomalies = detector.update_rows(spiky_rows)
+    assert [(a['sensor'], a['value']) for a in anomalies if a['sensor'] == 'cct'] == [
+        ('cct', 60000.0), ('cct', 60000.0)
+    ]
+    for metric, column in ANOMALY_COLUMNS.items():
+        values = np.array([row[column] for row in spiky_rows if row[column] is not None], dtype=float)
+        n, mean, m2 = detector.state[metric]
+        assert n == len(values)
+        assert mean == pytest.approx(values.mean(), rel=1e-12)
+        assert m2 / (n - 1) == pytest.approx(values.var(ddof=1), rel=1e-9)
+
+def test_no_scores_before_min_samples():
+    detector = StreamingAnomalyDetector(min_samples=10, columns={'cct': 'sen0611_cct'})
+    for i in range(9):
+        detector.update({'timestamp': START, 'sen0611_cct': 5000.0 + i})
+    assert math.isnan(detector.score('cct', 1e6))
+    detector.update({'timestamp': START, 'sen0611_cct': 5000.0})
+    assert detector.score('cct', 1e6) > 3.0
+
+def test_checkpoint_round_trip(spiky_rows, tmp_path):
+    first, second = spiky_rows[:150], spiky_rows[150:]
+    continuous = StreamingAnomalyDetector()
+    continuous.update_rows(first)
+    expected = continuous.update_rows(second)
+
+    resumed = StreamingAnomalyDetector()
+    resumed.update_rows(first)
+    path = str(tmp_path / 'detector.json')
+    resumed.save(path)
+    restored = StreamingAnomalyDetector.load(path)
+    assert restored.get_state() == resumed.get_state()
+    assert restored.update_rows(second) == expected
+
+def test_warm_start_from_rollups(database, spiky_rows):
+    insert_sensor_rows(spiky_rows)
+    replayed = StreamingAnomalyDetector()
+    replayed.update_rows(spiky_rows)
+
+    warm = StreamingAnomalyDetector()
+    warm.warm_start(START, START + timedelta(hours=5))
+    for metric in ANOMALY_COLUMNS:
+        n, mean, m2 = warm.state[metric]
+        assert n == replayed.state[metric][0]
+        assert mean == pytest.approx(replayed.state[metric][1], rel=1e-9)
+        assert m2 == pytest.approx(replayed.state[metric][2], rel=1e-6)
@@ -0,0 +1,142 @@
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import delete
+from database import archive, partitions
+from database.archive import (archive_before, archive_dtype, archive_horizon_us, list_segments,
+                              recover_pending_segments, write_segment)
+from database.db import get_engine
+from database.operations import insert_sensor_rows, upsert_sensor_rows
+from database.query import count_rows, fetch_columns, iter_column_chunks
+from database.rollups import aggregate_readings
+from database.schema import SensorReading
+from database.timeutils import to_epoch_us
+from services.analysis import SensorAnalysis
+
+START = datetime(2025, 1, 6)
+COLUMNS = ['timestamp', 'device_id', 'sen0611_cct', 'latitude', 'longitude']
+
+@pytest.fixture
+def archived(database, make_rows):
+    """Cztery doby odczytów co godzinę; pierwsze trzy przeniesione do archiwum."""
+    rows = make_rows([START + timedelta(hours=h) for h in range(4 * 24)])
+    insert_sensor_rows(rows)
+    segments = archive_before(START + timedelta(days=3))
+    assert sum(segments.values()) == 3 * 24
+    return rows
+
+def test_archive_round_trip(archived):
+    assert archive_horizon_us() == to_epoch_us(START + timedelta(days=3))
+    data = fetch_columns(COLUMNS, START, START + timedelta(days=4), end_inclusive=False)
+    assert len(data['timestamp']) == len(archived)
+    assert data['timestamp'].astype('datetime64[us]').tolist() == [row['timestamp'] for row in archived]
+    assert set(data['device_id']) == {'default'}
+    # Pomiary w archiwum są float32, współrzędne GPS float64 (bez utraty dokładności)
+    assert data['sen0611_cct'] == pytest.approx([row['sen0611_cct'] for row in archived], rel=1e-6)
+    assert data['latitude'].tolist() == [row['latitude'] for row in archived]
+    assert data['longitude'].tolist() == [row['longitude'] for row in archived]
+
+def test_gps_columns_are_float64():
+    for name in ('latitude', 'longitude', 'altitude'):
+        assert archive_dtype(name) == np.float64
+    assert archive_dtype('sen0611_cct') == np.float32
+
+def test_window_spanning_archive_and_sqlite(archived):
+    start, end = START + timedelta(days=2, hours=20), START + timedelta(days=3, hours=4)
+    assert count_rows(start, end, end_inclusive=False) == 8
+    chunks = list(iter_column_chunks(['timestamp_us'], start, end, end_inclusive=False, chunk_size=3))
+    timestamps = np.concatenate([chunk['timestamp_us'] for chunk in chunks])
+    assert timestamps.tolist() == [to_epoch_us(start + timedelta(hours=h)) for h in range(8)]
+    aggregate = aggregate_readings(start, end)[to_epoch_us(start)]
+    assert aggregate['count'] == 8
+
+def test_late_rows_before_horizon_are_visible(archived, make_rows):
+    late = make_rows([START + timedelta(hours=5, minutes=30)])
+    assert upsert_sensor_rows(late) == 1
+    # Powtórka odczytu już zarchiwizowanego nie jest zapisywana ponownie
+    assert upsert_sensor_rows(make_rows([START + timedelta(hours=5)])) == 0
+
+    start, end = START, START + timedelta(hours=12)
+    assert count_rows(start, end, end_inclusive=False) == 13
+    data = fetch_columns(['timestamp_us'], start, end, end_inclusive=False)
+    assert to_epoch_us(START + timedelta(hours=5, minutes=30)) in data['timestamp_us']
+    assert np.all(np.diff(data['timestamp_us']) > 0)
+    assert aggregate_readings(start, end)[to_epoch_us(start)]['count'] == 13
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 1000])
+def test_late_rows_before_horizon_keep_chunk_order(archived, make_rows, chunk_size):
+    late = [START + timedelta(hours=5, minutes=30), START + timedelta(days=2, hours=1, minutes=15)]
+    assert upsert_sensor_rows(make_rows(late)) == 2
+
+    end = START + timedelta(days=4)
+    chunks = list(iter_column_chunks(['timestamp_us'], START, end, end_inclusive=False, chunk_size=chunk_size))
+    assert all(0 < len(chunk['timestamp_us']) <= chunk_size for chunk in chunks)
+    timestamps = np.concatenate([chunk['timestamp_us'] for chunk in chunks])
+    expected = sorted([to_epoch_us(row['timestamp']) for row in archived] + [to_epoch_us(t) for t in late])
+    assert timestamps.tolist() == expected
+
+def test_export_with_late_rows_is_sorted(archived, make_rows, tmp_path):
+    assert upsert_sensor_rows(make_rows([START + timedelta(hours=5, minutes=30)])) == 1
+    path = str(tmp_path / 'readings.csv')
+    assert SensorAnalysis.export_data(START, START + timedelta(days=4), path, chunk_size=10) == len(archived) + 1
+    timestamps = pd.to_datetime(pd.read_csv(path)['timestamp'])
+    assert timestamps.is_monotonic_increasing
+    assert timestamps[6] == START + timedelta(hours=5, minutes=30)
+
+def test_week_partition_straddling_horizon(database, make_rows):
+    # Dzień 6-9 stycznia z sensor_readings trafia do archiwum, a partycja
+    # tygodniowa (6-13 stycznia) zostaje w SQLite
+    timestamps = [START + timedelta(hours=6 * i) for i in range(16)]
+    insert_sensor_rows(make_rows(timestamps, 'archived'))
+    partitions.configure_partitioning('week')
+    insert_sensor_rows(make_rows(timestamps, 'partitioned'))
+    archive_before(START + timedelta(days=3))
+    assert len(list_segments()) == 3
+
+    start, end = START, START + timedelta(days=2)
+    assert count_rows(start, end, end_inclusive=False) == 16
+    data = fetch_columns(['device_id'], start, end, end_inclusive=False)
+    assert sorted(set(data['device_id'])) == ['archived', 'partitioned']
+    assert count_rows(start, end, end_inclusive=False, device_id='partitioned') == 8
+
+def test_failed_drop_leaves_no_segment(database, make_rows, monkeypatch):
+    partitions.configure_partitioning('day')
+    insert_sensor_rows(make_rows([START + timedelta(hours=h) for h in range(0, 48, 6)]))
+
+    def failing_drop(conn, name):
+        raise RuntimeError("błąd usuwania partycji")
+
+    monkeypatch.setattr(archive, 'drop_partition', failing_drop)
+    with pytest.raises(RuntimeError):
+        archive_before(START + timedelta(days=2))
+    # Wiersze zostają tylko w SQLite: bez segmentu (także tymczasowego) i bez podwójnego liczenia
+    assert list_segments() == []
+    assert not os.listdir(archive.ARCHIVE_DIR)
+    assert count_rows(START, START + timedelta(days=2), end_inclusive=False) == 8
+
+def test_sparse_days_are_skipped(database, make_rows):
+    timestamps = [datetime(2015, 3, 1, 12), START + timedelta(hours=1)]
+    insert_sensor_rows(make_rows(timestamps))
+    segments = archive_before(START + timedelta(days=1))
+    assert len(segments) == 2
+    assert count_rows() == 2
+
+def test_recover_pending_segments(database, make_rows):
+    rows = make_rows([START + timedelta(hours=h) for h in range(3)])
+    insert_sensor_rows(rows)
+    data = fetch_columns(archive.ARCHIVE_COLUMNS, START, START + timedelta(days=1))
+    source = {'table': 'sensor_readings', 'device_id': 'default', 'timestamp_us': rows[0]['timestamp_us']}
+    # Przerwanie przed commitem: wiersze są nadal w SQLite, segment jest usuwany
+    pending = write_segment('day', data, to_epoch_us(START), to_epoch_us(START + timedelta(days=1)),
+                            publish=False, source=source)
+    assert recover_pending_segments() == {pending.name: 'discarded'}
+    assert list_segments() == []
+    # Przerwanie po commicie: wierszy nie ma już w SQLite, segment jest udostępniany
+    pending = write_segment('day', data, to_epoch_us(START), to_epoch_us(START + timedelta(days=1)),
+                            publish=False, source=source)
+    with get_engine().begin() as conn:
+        conn.execute(delete(SensorReading.__table__))
+    assert recover_pending_segments() == {pending.name: 'published'}
+    assert count_rows(START, START + timedelta(days=1)) == 3
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import pytest
+from database import operations
+from database.async_operations import AsyncDatabase
+from database.query import count_rows
+
+START = datetime(2025, 6, 1)
+
+def _times(offset: int, count: int) -> list:
+    return [START + timedelta(seconds=offset + i) for i in range(count)]
+
+def test_concurrent_saves_share_commits(database, make_readings):
+    async def scenario():
+        async with AsyncDatabase(max_batch_size=1000, max_delay=0.2) as db:
+            counts = await asyncio.gather(*[
+                db.save_sensor_readings_bulk(make_readings(_times(10 * i, 10))) for i in range(10)
+            ])
+            await db.save_sensor_reading(make_readings(_times(200, 1))[0])
+            latest = await db.get_latest_readings(5)
+            return counts, latest, db.get_stats()
+
+    counts, latest, stats = asyncio.run(scenario())
+    assert counts == [10] * 10
+    assert len(latest) == 5
+    assert count_rows() == 101
+    assert stats['rows_written'] == 101
+    assert stats['commits'] < 5
+
+def test_bulk_returns_new_rows_like_sync_api(database, make_readings):
+    readings = make_readings(_times(0, 20))
+
+    async def scenario():
+        async with AsyncDatabase(max_delay=0.05) as db:
+            first = await db.save_sensor_readings_bulk(readings)
+            # Powtórka w tej samej paczce co nowe odczyty innego wywołującego
+            return first, await asyncio.gather(
+                db.save_sensor_readings_bulk(readings[:5]),
+                db.save_sensor_readings_bulk(make_readings(_times(100, 3)) + readings[:2])
+            ), db.get_stats()
+
+    first, (repeat, mixed), stats = asyncio.run(scenario())
+    assert first == 20
+    assert (repeat, mixed) == (0, 3)
+    assert stats['duplicate_rows'] == 7
+    assert count_rows() == 23
+
+def test_bad_request_does_not_fail_other_callers(database, make_readings):
+    def write_groups(groups):
+        if any(row.get('ambient_temperature') is None for rows in groups for row in rows):
+            raise ValueError("brak temperatury")
+        return operations.upsert_sensor_row_groups(groups)
+
+    bad = make_readings(_times(50, 1))
+    bad[0]['ambient_temperature'] = None
+
+    async def scenario():
+        async with AsyncDatabase(max_delay=0.1, write_groups=write_groups) as db:
+            results = await asyncio.gather(
+                db.save_sensor_readings_bulk(make_readings(_times(0, 4))),
+                db.save_sensor_readings_bulk(bad),
+                db.save_sensor_readings_bulk(make_readings(_times(10, 6))),
+                return_exceptions=True
+            )
+            return results, db.get_stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results[0] == 4 and results[2] == 6
+    assert isinstance(results[1], ValueError)
+    assert stats['failed_rows'] == 1
+    assert stats['rows_written'] == 10
+    assert count_rows() == 10
+
+def test_save_requires_start(database, make_readings):
+    with pytest.raises(RuntimeError):
+        asyncio.run(AsyncDatabase().save_sensor_reading(make_readings(_times(0, 1))[0]))
+
+def test_stop_writes_queued_requests(database, make_readings):
+    async def scenario():
+        db = AsyncDatabase(max_batch_size=5, max_delay=1.0)
+        await db.start()
+        tasks = [asyncio.create_task(db.save_sensor_readings_bulk(make_readings(_times(10 * i, 3))))
+                 for i in range(4)]
+        await asyncio.sleep(0)
+        await db.stop()
+        return [task.result() for task in tasks]
+
+    assert asyncio.run(scenario()) == [3, 3, 3, 3]
+    assert count_rows() == 12
+
+def test_stop_does_not_block_event_loop(database):
+    async def scenario():
+        db = AsyncDatabase()
+        await db.start()
+        read = asyncio.create_task(db.run(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        # stop czeka na trwający odczyt, a pętla w tym czasie obsługuje inne zadania
+        await db.stop()
+        ticking.cancel()
+        await read
+        return ticks
+
+    assert asyncio.run(scenario()) > 5
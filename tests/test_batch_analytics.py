@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+import pytest
+from database.operations import insert_sensor_rows
+from database.timeutils import to_epoch_us
+from services.analysis import SensorAnalysis
+from services.batch_analytics import BatchAnalytics, split_range
+
+START = datetime(2025, 3, 1)
+DAYS = 3
+
+@pytest.fixture
+def readings(database, make_rows):
+    # Co 10 minut z przesunięciem 3 minut: żaden odczyt nie wypada na granicy doby
+    insert_sensor_rows(make_rows([START + timedelta(minutes=10 * i + 3) for i in range(DAYS * 144)]))
+    insert_sensor_rows(make_rows([START + timedelta(hours=30, minutes=i) for i in range(30)], device_id='sensor-2'))
+
+def _assert_report_equal(actual: dict, expected_statistics: dict, expected_spectrum: dict):
+    assert actual['statistics'].keys() == expected_statistics.keys()
+    for metric, values in expected_statistics.items():
+        assert actual['statistics'][metric] == pytest.approx(values, rel=1e-9)
+    for key in ('mean_values', 'max_values', 'min_values'):
+        assert actual['spectrum'][key] == pytest.approx(expected_spectrum[key], rel=1e-9)
+    assert actual['spectrum']['wavelengths'] == expected_spectrum['wavelengths']
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_daily_report_matches_per_day_analysis(readings, workers):
+    report = BatchAnalytics(workers).daily_report(START, START + timedelta(days=DAYS))
+    assert list(report['days']) == [START + timedelta(days=day) for day in range(DAYS)]
+    for day, result in report['days'].items():
+        _assert_report_equal(
+            result,
+            SensorAnalysis.get_daily_statistics(day),
+            SensorAnalysis.analyze_color_spectrum(day, day + timedelta(days=1))
+        )
+    _assert_report_equal(
+        report['total'],
+        SensorAnalysis.get_statistics(START, START + timedelta(days=DAYS)),
+        SensorAnalysis.analyze_color_spectrum(START, START + timedelta(days=DAYS))
+    )
+
+def test_device_filter(readings):
+    report = BatchAnalytics(2).daily_report(START, START + timedelta(days=DAYS), device_id='sensor-2')
+    day = START + timedelta(days=1)
+    assert list(report['days']) == [day]
+    _assert_report_equal(
+        report['days'][day],
+        SensorAnalysis.get_daily_statistics(day, 'sensor-2'),
+        SensorAnalysis.analyze_color_spectrum(day, day + timedelta(days=1), 'sensor-2')
+    )
+
+def test_split_range_by_day():
+    start_us = to_epoch_us(START + timedelta(hours=12))
+    end_us = to_epoch_us(START + timedelta(days=2))
+    assert split_range(start_us, end_us) == [
+        (start_us, to_epoch_us(START + timedelta(days=1))),
+        (to_epoch_us(START + timedelta(days=1)), end_us)
+    ]
+    with pytest.raises(ValueError):
+        split_range(start_us, end_us, 'month')
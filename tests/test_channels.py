@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from database import db
+from database.channels import channel_ids, fetch_channel_matrix, list_channels, register_channel
+from database.ingest import IngestWriter
+from database.maintenance import run_maintenance
+from database.operations import insert_sensor_rows, reading_to_row, upsert_sensor_rows
+from database.query import count_rows
+
+START = datetime(2025, 7, 1)
+
+def _rows(make_readings, channels_by_minute: dict, device_id=None) -> list:
+    readings = make_readings([START + timedelta(minutes=minute) for minute in channels_by_minute], device_id)
+    for reading, channels in zip(readings, channels_by_minute.values()):
+        reading['channels'] = channels
+    return [reading_to_row(reading) for reading in readings]
+
+def test_register_is_idempotent(database):
+    channel_id = register_channel('as7341_415nm', 'AS7341', 'counts')
+    assert register_channel('as7341_415nm') == channel_id
+    assert register_channel('as7341_445nm') != channel_id
+    assert [(c['name'], c['sensor'], c['unit']) for c in list_channels()] == [
+        ('as7341_415nm', 'AS7341', 'counts'), ('as7341_445nm', None, None)
+    ]
+    with pytest.raises(ValueError):
+        register_channel('sen0611_cct')
+    with pytest.raises(ValueError):
+        channel_ids(['as7341_999nm'])
+
+def test_matrix_pivots_values_with_gaps(database, make_readings):
+    register_channel('as7341_415nm')
+    insert_sensor_rows(_rows(make_readings, {
+        0: {'as7341_415nm': 1.0, 'as7341_445nm': 2.0},
+        1: {'as7341_445nm': 4.0},
+        2: {'as7341_415nm': 5.0},
+    }))
+    insert_sensor_rows(_rows(make_readings, {1: {'as7341_415nm': 7.0}}, device_id='sensor-2'))
+
+    matrix = fetch_channel_matrix(['as7341_445nm', 'as7341_415nm'], START, START + timedelta(minutes=2))
+    assert matrix['timestamp_us'].tolist() == sorted(matrix['timestamp_us'].tolist())
+    assert list(matrix['device_id']) == ['default', 'default', 'sensor-2', 'default']
+    np.testing.assert_array_equal(
+        matrix['values'], [[2.0, 1.0], [4.0, np.nan], [np.nan, 7.0], [np.nan, 5.0]]
+    )
+    only = fetch_channel_matrix(['as7341_415nm'], START, START + timedelta(minutes=2),
+                                end_inclusive=False, device_id='default')
+    np.testing.assert_array_equal(only['values'], [[1.0]])
+
+def test_replay_and_retention(database, make_readings):
+    rows = _rows(make_readings, {minute: {'as7341_415nm': float(minute)} for minute in range(10)})
+    assert upsert_sensor_rows([dict(row) for row in rows]) == 10
+    assert upsert_sensor_rows([dict(row) for row in rows]) == 0
+    assert len(fetch_channel_matrix(['as7341_415nm'])['values']) == 10
+
+    run_maintenance(raw_days=1, minute_days=0, run_vacuum=False, now=START + timedelta(days=3))
+    assert len(fetch_channel_matrix(['as7341_415nm'])['values']) == 0
+
+def test_configure_engine_drops_channel_ids_of_previous_database(database, tmp_path):
+    register_channel('as7341_415nm')
+    previous = register_channel('as7341_445nm')
+
+    db.configure_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    db.init_db()
+    assert register_channel('as7341_445nm') != previous
+    assert [c['name'] for c in list_channels()] == ['as7341_445nm']
+
+def test_bad_channel_name_rejects_only_its_reading(database, make_readings):
+    readings = make_readings([START + timedelta(seconds=i) for i in range(10)])
+    for reading in readings:
+        reading['channels'] = {'as7341_415nm': 1.0}
+    readings[4]['channels'] = {'sen0611_cct': 1.0}
+    with IngestWriter(max_batch_size=5, stats_interval=0) as writer:
+        for index, reading in enumerate(readings):
+            if index == 4:
+                with pytest.raises(ValueError):
+                    writer.add(reading)
+            else:
+                writer.add(reading)
+    stats = writer.get_stats()
+    assert (stats['rows_written'], stats['failed_rows']) == (9, 0)
+    assert count_rows(START, START + timedelta(seconds=10)) == 9
+    assert len(fetch_channel_matrix(['as7341_415nm'], START, START + timedelta(seconds=10))['timestamp_us']) == 9
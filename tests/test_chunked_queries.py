@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from database import partitions
+from database.operations import insert_sensor_rows
+from database.query import fetch_columns, iter_column_chunks, iter_frame_chunks
+
+START = datetime(2025, 5, 10)
+END = START + timedelta(days=2)
+
+@pytest.fixture(params=['none', 'day'])
+def readings(database, make_rows, request):
+    partitions.configure_partitioning(request.param)
+    timestamps = [START + timedelta(minutes=13 * i) for i in range(2 * 24 * 60 // 13)]
+    # Kilka urządzeń z tymi samymi znacznikami czasu: strony dzielą grupy równych timestamp_us
+    for device_id in ('a', 'b', 'c'):
+        insert_sensor_rows(make_rows(timestamps, device_id))
+    return len(timestamps) * 3
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 10000])
+def test_chunks_cover_window_exactly_once(readings, chunk_size):
+    chunks = list(iter_column_chunks(['timestamp_us', 'device_id', 'sen0611_cct'], START, END,
+                                     end_inclusive=False, chunk_size=chunk_size))
+    assert all(0 < len(chunk['timestamp_us']) <= chunk_size for chunk in chunks)
+    merged = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    expected = fetch_columns(['timestamp_us', 'device_id', 'sen0611_cct'], START, END, end_inclusive=False)
+    assert len(merged['timestamp_us']) == readings
+    assert np.all(np.diff(merged['timestamp_us']) >= 0)
+    keys = set(zip(merged['device_id'], merged['timestamp_us'].tolist()))
+    assert keys == set(zip(expected['device_id'], expected['timestamp_us'].tolist()))
+    assert sorted(merged['sen0611_cct']) == sorted(expected['sen0611_cct'])
+
+def test_device_filter_and_frames(readings):
+    frames = list(iter_frame_chunks(['timestamp', 'sen0611_cct'], START, END, chunk_size=50, device_id='b'))
+    assert [list(frame.columns) for frame in frames[:1]] == [['timestamp', 'sen0611_cct']]
+    assert sum(len(frame) for frame in frames) == readings // 3
+
+def test_empty_window(readings):
+    assert list(iter_column_chunks(['timestamp_us'], END + timedelta(days=1), END + timedelta(days=2))) == []
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import MetaData, Table, insert, inspect, select
+from database import db
+from database.archive import archive_before
+from database.operations import get_latest_readings, insert_sensor_rows
+from database.query import archive_segments, count_rows, fetch_columns
+from database.rollups import get_rollup_statistics
+from database.schema import DEFAULT_DEVICE_ID, SensorReading
+from services.analysis import SensorAnalysis
+
+READINGS = SensorReading.__table__
+START = datetime(2025, 2, 10)
+END = START + timedelta(days=2)
+
+@pytest.fixture
+def readings(database, make_rows):
+    """Dwa urządzenia o rozłącznych zakresach CCT; pierwsza doba w archiwum."""
+    lab = make_rows([START + timedelta(minutes=30 * i) for i in range(96)], 'lab')
+    field = make_rows([START + timedelta(minutes=30 * i + 15) for i in range(96)], 'field')
+    for row in lab:
+        row['sen0611_cct'] = 3000.0
+    for row in field:
+        row['sen0611_cct'] = 6000.0
+    insert_sensor_rows(lab + field)
+    archive_before(START + timedelta(days=1))
+    return lab, field
+
+def test_device_filter_across_archive_and_sqlite(readings):
+    lab, field = readings
+    assert count_rows(START, END, device_id='lab') == len(lab)
+    assert count_rows(START, END, device_id='missing') == 0
+    assert archive_segments(START, END, device_id='missing') == []
+    data = fetch_columns(['timestamp_us', 'device_id', 'sen0611_cct'], START, END, device_id='field')
+    assert data['timestamp_us'].tolist() == [row['timestamp_us'] for row in field]
+    assert set(data['device_id']) == {'field'}
+    assert set(data['sen0611_cct']) == {6000.0}
+
+def test_latest_and_statistics_per_device(readings):
+    latest = get_latest_readings(3, device_id='lab')
+    assert [r.device_id for r in latest] == ['lab'] * 3
+    assert latest[0].timestamp_us == readings[0][-1]['timestamp_us']
+
+    day = START + timedelta(days=1)
+    assert get_rollup_statistics(day, END, ['sen0611_cct'], 'lab')['sen0611_cct']['mean'] == 3000.0
+    assert SensorAnalysis.get_daily_statistics(day, 'field')['cct']['mean'] == 6000.0
+    assert SensorAnalysis.get_daily_statistics(day)['cct']['mean'] == pytest.approx(4500.0)
+
+def test_migration_adds_device_id_and_removes_duplicates(database, tmp_path):
+    db.configure_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # Tabela odczytów sprzed wprowadzenia device_id (bez kolumny i indeksu urządzenia)
+    legacy = Table('sensor_readings', MetaData(),
+                   *[c._copy() for c in READINGS.columns if c.name != 'device_id'])
+    legacy.create(db.get_engine())
+    timestamps = [START + timedelta(minutes=i) for i in range(5)]
+    with db.get_engine().begin() as conn:
+        conn.execute(insert(legacy), [
+            {'timestamp': moment, 'sen0611_cct': 5000.0 + i} for i, moment in enumerate(timestamps + timestamps[:2])
+        ])
+
+    db.init_db()
+    with db.get_engine().connect() as conn:
+        devices = conn.execute(select(READINGS.c.device_id).order_by(READINGS.c.id)).scalars().all()
+    assert devices == [DEFAULT_DEVICE_ID] * 5
+    indexes = {index['name']: index['unique'] for index in inspect(db.get_engine()).get_indexes('sensor_readings')}
+    assert indexes['ix_sensor_readings_device_time']
+    # Rollupy wypełnione z odczytów pozostałych po usunięciu duplikatów
+    stats = get_rollup_statistics(START, START + timedelta(days=1), ['sen0611_cct'], DEFAULT_DEVICE_ID)
+    assert stats['sen0611_cct']['mean'] == 5002.0
+    assert stats['count'] == 5
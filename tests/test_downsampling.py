@@ -0,0 +1,92 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import numpy as np
+import pytest
+from api.series import SeriesRequestHandler, get_series
+from database.operations import insert_sensor_rows
+from utils.downsampling import DOWNSAMPLING_METHODS, downsample, downsample_indices, lttb_indices, minmax_indices
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(7)
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.cumsum(rng.normal(size=len(x)))
+    y[4321] = 1e3     # pojedynczy skok
+    y[8765] = -1e3
+    return x, y
+
+@pytest.mark.parametrize('method', DOWNSAMPLING_METHODS)
+@pytest.mark.parametrize('n_out', [0, 1, 2, 3, 4, 5, 7, 8, 9, 100, 1000])
+def test_output_never_exceeds_n_out(series, method, n_out):
+    indices = downsample_indices(*series, n_out, method)
+    assert len(indices) <= n_out
+    assert np.all(np.diff(indices) > 0)
+
+def test_minmax_keeps_extremes_and_endpoints(series):
+    x, y = series
+    indices = minmax_indices(x, y, 400)
+    assert len(indices) <= 400
+    assert {0, len(x) - 1, 4321, 8765} <= set(indices.tolist())
+
+def test_lttb_keeps_endpoints_and_spikes(series):
+    x, y = series
+    indices = lttb_indices(x, y, 300)
+    assert len(indices) == 300
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert {4321, 8765} <= set(indices.tolist())
+
+@pytest.mark.parametrize('method', DOWNSAMPLING_METHODS)
+def test_short_series_and_missing_values(method):
+    x = np.arange(6, dtype=np.float64)
+    y = np.array([1.0, np.nan, 3.0, 4.0, np.inf, 6.0])
+    assert downsample_indices(x, y, 10, method).tolist() == [0, 2, 3, 5]
+    _, values = downsample(x, y, 10, method)
+    assert values.tolist() == [1.0, 3.0, 4.0, 6.0]
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample_indices(np.arange(3.0), np.arange(3.0), 2, 'mean')
+
+def test_series_endpoint(database, make_rows):
+    start = datetime(2025, 1, 1)
+    insert_sensor_rows(make_rows([start + timedelta(seconds=i) for i in range(5000)]))
+    result = get_series(['sen0611_cct', 'tsl2591_lux'], start, start + timedelta(hours=2), points=3)
+    assert result['source_points'] == 5000
+    for values in result['series'].values():
+        assert len(values['timestamp_us']) == len(values['values']) <= 3
+
+    with pytest.raises(ValueError):
+        get_series(['timestamp'], start, start + timedelta(hours=2))
+    with pytest.raises(ValueError):
+        get_series(['sen0611_cct'], start, start + timedelta(hours=2), points=2)
+
+@pytest.fixture
+def server(database):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SeriesRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+def _get(url: str) -> tuple:
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_series_http_status_codes(server, make_rows):
+    start = datetime(2025, 1, 1)
+    insert_sensor_rows(make_rows([start + timedelta(seconds=i) for i in range(100)]))
+    window = 'start=2025-01-01T00:00:00&end=2025-01-01T01:00:00'
+    status, body = _get(f'{server}/api/series?columns=sen0611_cct&{window}&points=10&method=lttb')
+    assert status == 200
+    assert len(body['series']['sen0611_cct']['values']) == 10
+    assert _get(f'{server}/api/series?columns=timestamp&{window}')[0] == 400
+    assert _get(f'{server}/api/series?columns=sen0611_cct')[0] == 400
+    assert _get(f'{server}/api/other')[0] == 404
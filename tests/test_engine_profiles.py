@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import text
+from database.db import create_db_engine
+
+def _pragmas(engine, *names) -> dict:
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+def test_ingest_profile_uses_wal_without_fsync_per_commit(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'ingest.db'}", 'ingest-heavy')
+    assert _pragmas(engine, 'journal_mode', 'synchronous', 'cache_size', 'busy_timeout', 'temp_store') == {
+        'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -64 * 1024, 'busy_timeout': 5000, 'temp_store': 2
+    }
+    engine.dispose()
+
+def test_legacy_profile_keeps_sqlite_defaults(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}", 'legacy')
+    assert _pragmas(engine, 'journal_mode', 'synchronous') == {'journal_mode': 'delete', 'synchronous': 2}
+    engine.dispose()
+
+def test_overrides_and_every_connection(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'analytics.db'}", 'analytics-heavy', cache_size=-1024)
+    # PRAGMA są ustawiane przy każdym nowym połączeniu, nie tylko przy pierwszym
+    for _ in range(2):
+        assert _pragmas(engine, 'cache_size', 'busy_timeout') == {'cache_size': -1024, 'busy_timeout': 10000}
+        engine.dispose()
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        create_db_engine('sqlite://', 'fast')
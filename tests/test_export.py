@@ -0,0 +1,63 @@
+import gzip
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from database.operations import insert_sensor_rows
+from services.analysis import EXPORT_COLUMNS, SensorAnalysis
+
+START = datetime(2025, 9, 1)
+END = START + timedelta(days=1)
+
+@pytest.fixture
+def rows(database, make_rows):
+    rows = make_rows([START + timedelta(minutes=2 * i) for i in range(250)])
+    insert_sensor_rows(rows)
+    return rows
+
+def _check_frame(df: pd.DataFrame, rows: list):
+    assert list(df.columns) == EXPORT_COLUMNS
+    assert len(df) == len(rows)
+    assert pd.to_datetime(df['timestamp']).tolist() == [row['timestamp'] for row in rows]
+    assert df['sen0611_cct'].tolist() == pytest.approx([row['sen0611_cct'] for row in rows])
+    assert df['satellites'].tolist() == [row['satellites'] for row in rows]
+
+def test_csv_export_in_chunks(rows, tmp_path):
+    calls = []
+    path = str(tmp_path / 'readings.csv')
+    exported = SensorAnalysis.export_data(START, END, path, chunk_size=60,
+                                          progress=lambda done, total, rate: calls.append((done, total)))
+    assert exported == 250
+    assert calls == [(60, 250), (120, 250), (180, 250), (240, 250), (250, 250)]
+    df = pd.read_csv(path)
+    _check_frame(df, rows)
+    # Liczba satelitów zapisana jako liczba całkowita (7, a nie 7.0)
+    assert df['satellites'].dtype.kind == 'i'
+
+def test_gzip_detected_from_extension(rows, tmp_path):
+    path = str(tmp_path / 'readings.csv.gz')
+    assert SensorAnalysis.export_data(START, END, path, chunk_size=100) == 250
+    with gzip.open(path, 'rt') as f:
+        _check_frame(pd.read_csv(f), rows)
+
+def test_export_to_csv_wrapper(rows, tmp_path):
+    path = str(tmp_path / 'readings.csv')
+    assert SensorAnalysis.export_to_csv(START, END, path)
+    assert len(pd.read_csv(path)) == 250
+
+def test_parquet_export(rows, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'readings.parquet')
+    assert SensorAnalysis.export_data(START, END, path, format='parquet', chunk_size=70) == 250
+    df = pd.read_parquet(path)
+    _check_frame(df, rows)
+    assert str(df['satellites'].dtype) == 'Int64'
+
+def test_empty_range_creates_no_file(database, tmp_path):
+    path = str(tmp_path / 'empty.csv')
+    assert SensorAnalysis.export_data(START, END, path) == 0
+    assert not os.path.exists(path)
+
+def test_unknown_format(database, tmp_path):
+    with pytest.raises(ValueError):
+        SensorAnalysis.export_data(START, END, str(tmp_path / 'readings.xlsx'), format='xlsx')
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import delete, func, select
+from database.db import get_engine, init_db
+from database.histograms import HISTOGRAM_COLUMNS, HISTOGRAMS, bin_edges, get_histograms, get_quantiles, rebuild_histograms
+from database.operations import insert_sensor_rows
+from database.maintenance import run_maintenance
+from database.query import count_rows, fetch_columns
+from database.timeutils import to_epoch_us
+
+START = datetime(2025, 4, 1)
+END = START + timedelta(days=2)
+
+@pytest.fixture
+def readings(database, make_rows):
+    insert_sensor_rows(make_rows([START + timedelta(minutes=3 * i) for i in range(2 * 24 * 20)]))
+
+def _clear():
+    with get_engine().begin() as conn:
+        conn.execute(delete(HISTOGRAMS))
+
+def test_quantiles_within_one_bin(readings):
+    values = fetch_columns(['sen0611_cct'], START, END, end_inclusive=False)['sen0611_cct']
+    estimated = get_quantiles(['sen0611_cct'], START, END, (0.05, 0.5, 0.95))['sen0611_cct']
+    width = np.diff(bin_edges('sen0611_cct'))[0]
+    assert estimated == pytest.approx(np.quantile(values, [0.05, 0.5, 0.95]), abs=width)
+
+def test_migration_backfills_empty_histograms(readings):
+    expected = get_histograms(['sen0611_cct', 'as7262_450nm'], START, END)
+    _clear()
+    assert get_histograms(['sen0611_cct'], START, END)['sen0611_cct']['counts'].sum() == 0
+
+    init_db()
+    restored = get_histograms(['sen0611_cct', 'as7262_450nm'], START, END)
+    for column, histogram in expected.items():
+        np.testing.assert_array_equal(restored[column]['counts'], histogram['counts'])
+
+def test_rebuild_range(readings):
+    expected = get_histograms(['sen0611_cct'], START, END)['sen0611_cct']['counts']
+    _clear()
+    assert rebuild_histograms(START, START + timedelta(days=1)) == 24 * 7
+    assert get_histograms(['sen0611_cct'], START, END)['sen0611_cct']['counts'].sum() == 24 * 20
+    rebuild_histograms()
+    np.testing.assert_array_equal(get_histograms(['sen0611_cct'], START, END)['sen0611_cct']['counts'], expected)
+
+def _stored_buckets(start: datetime, end: datetime) -> int:
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(HISTOGRAMS)
+            .where(HISTOGRAMS.c.bucket_us >= to_epoch_us(start), HISTOGRAMS.c.bucket_us < to_epoch_us(end))
+        ).scalar()
+
+def test_rebuild_keeps_histograms_of_expired_days(database, make_rows):
+    insert_sensor_rows(make_rows([START + timedelta(minutes=3 * i) for i in range(3 * 24 * 20)]))
+    per_day = 24 * len(HISTOGRAM_COLUMNS)
+    assert _stored_buckets(START, START + timedelta(days=3)) == 3 * per_day
+
+    run_maintenance(raw_days=1, minute_days=0, run_vacuum=False, now=START + timedelta(days=3))
+    assert count_rows(START, START + timedelta(days=2), end_inclusive=False) == 0
+    expected = get_histograms(['sen0611_cct'], START, START + timedelta(days=3))['sen0611_cct']['counts']
+
+    rebuild_histograms()
+    assert _stored_buckets(START, START + timedelta(days=3)) == 3 * per_day
+    rebuild_histograms(START, START + timedelta(days=3))
+    assert _stored_buckets(START, START + timedelta(days=3)) == 3 * per_day
+    np.testing.assert_array_equal(
+        get_histograms(['sen0611_cct'], START, START + timedelta(days=3))['sen0611_cct']['counts'], expected
+    )
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError, OperationalError
+from database.ingest import IngestWriter, is_transient_error
+from database.query import count_rows
+
+def _locked() -> OperationalError:
+    return OperationalError('INSERT INTO sensor_readings', {}, Exception('database is locked'))
+
+class FlakyWriter:
+    """Funkcja zapisu zgłaszająca błąd przejściowy przy pierwszych failures wywołaniach."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+        self.rows = []
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _locked()
+        self.rows.extend(rows)
+        return len(rows)
+
+def test_transient_error_requeues_batch():
+    write_rows = FlakyWriter(failures=1)
+    writer = IngestWriter(max_batch_size=100, write_rows=write_rows, retry_delay=0.0, stats_interval=0)
+    for i in range(3):
+        writer.add_row({'i': i})
+
+    assert writer.flush() == 0
+    assert writer.get_stats()['buffered_rows'] == 3
+    writer.add_row({'i': 3})
+    assert writer.flush() == 4
+    # Przywrócona paczka jest zapisywana przed nowszymi wierszami
+    assert [row['i'] for row in write_rows.rows] == [0, 1, 2, 3]
+    stats = writer.get_stats()
+    assert stats['retries'] == 1
+    assert stats['failed_rows'] == 0
+
+def test_backoff_blocks_automatic_flush():
+    write_rows = FlakyWriter(failures=1)
+    writer = IngestWriter(max_batch_size=2, write_rows=write_rows, retry_delay=60.0, stats_interval=0)
+    writer.add_row({'i': 0})
+    writer.add_row({'i': 1})
+    # Pełny bufor w trakcie odstępu ponowienia nie wywołuje kolejnego zapisu
+    writer.add_row({'i': 2})
+    assert write_rows.calls == 1
+    assert writer.get_stats()['buffered_rows'] == 3
+
+def test_buffer_limit_drops_oldest_rows():
+    writer = IngestWriter(max_batch_size=2, max_buffered_rows=4, write_rows=FlakyWriter(failures=100),
+                          retry_delay=60.0, stats_interval=0)
+    for i in range(7):
+        writer.add_row({'i': i})
+    assert [row['i'] for row in writer._buffer] == [3, 4, 5, 6]
+    assert writer.get_stats()['failed_rows'] == 3
+
+def test_permanent_error_drops_batch():
+    def write_rows(rows):
+        raise IntegrityError('INSERT INTO sensor_readings', {}, Exception('UNIQUE constraint failed'))
+
+    quarantined = []
+    writer = IngestWriter(write_rows=write_rows, stats_interval=0,
+                          on_failed=lambda rows, error: quarantined.append((rows, error)))
+    writer.add_row({'i': 0})
+    assert writer.flush() == 0
+    stats = writer.get_stats()
+    assert (stats['failed_rows'], stats['failed_batches'], stats['buffered_rows']) == (1, 1, 0)
+    assert quarantined == [([{'i': 0}], writer.last_error)]
+    assert isinstance(writer.last_error, IntegrityError)
+
+def test_permanent_error_does_not_reach_producer():
+    def write_rows(rows):
+        raise OperationalError('INSERT INTO sensor_readings', {}, Exception('disk I/O error'))
+
+    writer = IngestWriter(max_batch_size=2, write_rows=write_rows, stats_interval=0)
+    writer.start()
+    # Zapis wywołany przez pełny bufor w add_row i w stop nie zgłasza błędu
+    for i in range(5):
+        writer.add_row({'i': i})
+    writer.stop(timeout=0.1)
+    assert writer._thread is None
+    stats = writer.get_stats()
+    assert (stats['failed_rows'], stats['buffered_rows']) == (5, 0)
+
+def test_only_lock_errors_are_retried():
+    def write_rows(rows):
+        raise OperationalError('INSERT INTO sensor_readings', {}, Exception('no such table: sensor_readings'))
+
+    writer = IngestWriter(write_rows=write_rows, retry_delay=0.0, stats_interval=0)
+    writer.add_row({'i': 0})
+    assert writer.flush() == 0
+    stats = writer.get_stats()
+    assert (stats['retries'], stats['failed_rows'], stats['buffered_rows']) == (0, 1, 0)
+
+    assert is_transient_error(_locked())
+    assert is_transient_error(OperationalError('SELECT', {}, Exception('database table is locked')))
+    assert not is_transient_error(OperationalError('SELECT', {}, Exception('disk I/O error')))
+
+def test_stop_retries_until_written():
+    write_rows = FlakyWriter(failures=2)
+    writer = IngestWriter(write_rows=write_rows, retry_delay=0.01, stats_interval=0)
+    writer.add_row({'i': 0})
+    writer.stop(timeout=5.0)
+    assert len(write_rows.rows) == 1
+    assert writer.get_stats()['failed_rows'] == 0
+
+def test_writes_to_database_and_counts_duplicates(database, make_rows):
+    start = datetime(2025, 1, 1)
+    rows = make_rows([start + timedelta(seconds=i) for i in range(10)])
+    with IngestWriter(max_batch_size=4, stats_interval=0) as writer:
+        for row in rows + rows[:3]:
+            writer.add_row(dict(row))
+    stats = writer.get_stats()
+    assert stats['rows_written'] == 10
+    assert stats['duplicate_rows'] == 3
+    assert count_rows(start, start + timedelta(seconds=10)) == 10
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, func, select, text
+from database import partitions
+from database.archive import archive_before, list_segments
+from database.db import get_engine
+from database.maintenance import expire_minute_rollups, expire_raw, run_maintenance, vacuum
+from database.operations import insert_sensor_rows
+from database.partitions import CATALOG
+from database.query import count_rows
+from database.rollups import get_rollup_statistics
+from database.schema import ROLLUP_COLUMNS, ROLLUP_TABLES
+from database.timeutils import to_epoch_us
+
+START = datetime(2025, 1, 6)   # poniedziałek
+NOW = START + timedelta(days=10)
+
+def _rows_per_day(make_rows, days: int, per_day: int = 48) -> list:
+    return make_rows([START + timedelta(minutes=1440 // per_day * i) for i in range(days * per_day)])
+
+def _daily_counts(start, end):
+    return get_rollup_statistics(start, end, ROLLUP_COLUMNS)['count']
+
+@pytest.mark.parametrize('scheme', ['none', 'day', 'week'])
+def test_expire_raw_keeps_rollups(database, make_rows, scheme):
+    partitions.configure_partitioning(scheme)
+    insert_sensor_rows(_rows_per_day(make_rows, 10))
+    archive_before(START + timedelta(days=2))
+
+    report = expire_raw(START + timedelta(days=4, hours=7), batch_size=7)
+    assert report['raw_rows'] == 4 * 48
+    assert list_segments() == []
+    assert count_rows() == 6 * 48
+    assert count_rows(START, START + timedelta(days=4), end_inclusive=False) == 0
+    # Rollupy wygasłych dni zostają; liczniki katalogu odpowiadają partycjom
+    assert _daily_counts(START, START + timedelta(days=10)) == 10 * 48
+    with get_engine().connect() as conn:
+        assert sum(row[0] for row in conn.execute(select(CATALOG.c.row_count))) == \
+            (6 * 48 if scheme != 'none' else 0)
+
+def test_incomplete_rollup_is_rebuilt_before_expiry(database, make_rows):
+    insert_sensor_rows(_rows_per_day(make_rows, 3))
+    daily = ROLLUP_TABLES['1d']
+    with get_engine().begin() as conn:
+        conn.execute(delete(daily).where(daily.c.bucket_us < to_epoch_us(START + timedelta(days=2))))
+    report = expire_raw(START + timedelta(days=2))
+    assert report['rebuilt_days'] == 2
+    assert _daily_counts(START, START + timedelta(days=2)) == 2 * 48
+
+def test_minute_rollups_expire_before_hourly(database, make_rows):
+    insert_sensor_rows(_rows_per_day(make_rows, 2))
+    removed = expire_minute_rollups(START + timedelta(days=1))
+    assert removed == 48
+    minute = ROLLUP_TABLES['1m']
+    with get_engine().connect() as conn:
+        oldest = conn.execute(select(func.min(minute.c.bucket_us))).scalar()
+    assert oldest == to_epoch_us(START + timedelta(days=1))
+    # Godzinowe kubełki wygasłego dnia nadal odpowiadają na zapytania o pełne godziny
+    assert _daily_counts(START, START + timedelta(hours=5)) == 10
+
+def test_run_maintenance_reclaims_space(database, make_rows):
+    insert_sensor_rows(_rows_per_day(make_rows, 10, per_day=480))
+    report = run_maintenance(raw_days=3, minute_days=5, now=NOW)
+    assert report['raw_rows'] == 7 * 480
+    assert report['minute_buckets'] > 0
+    assert report['reclaimed_bytes'] > 0
+    with get_engine().connect() as conn:
+        assert conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+        assert conn.execute(text("PRAGMA freelist_count")).scalar() == 0
+    assert vacuum()['reclaimed_bytes'] == 0
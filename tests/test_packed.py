@@ -0,0 +1,73 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import select, text
+from database import partitions
+from database.db import get_engine
+from database.operations import insert_sensor_rows
+from database.packed import (PACKED_COLUMN, PACKED_COLUMNS, PACKED_DTYPE, PACKED_ROW_BYTES, pack_rows,
+                             pack_values, unpack_blobs, unpack_values)
+from database.partitions import partition_bounds, partition_table
+
+START = datetime(2025, 3, 1)
+
+def _float32(value: float) -> float:
+    return float(np.float32(value))
+
+def test_pack_unpack_round_trip(make_rows):
+    row = make_rows([START])[0]
+    row['tsl2591_ir'] = None
+    row['sen0611_als'] = float('nan')
+    blob = pack_values(row)
+    assert len(blob) == PACKED_ROW_BYTES == 4 * len(PACKED_COLUMNS)
+
+    values = unpack_values(blob)
+    # NULL i NaN wracają jako None, pozostałe pomiary zaokrąglone do float32
+    assert values['tsl2591_ir'] is None
+    assert values['sen0611_als'] is None
+    for name in PACKED_COLUMNS:
+        if row[name] is not None and not math.isnan(row[name]):
+            assert values[name] == _float32(row[name])
+            assert values[name] == pytest.approx(row[name], rel=1e-6)
+
+def test_pack_rows_keeps_other_columns(make_rows):
+    row = make_rows([START])[0]
+    packed = pack_rows([row])[0]
+    assert set(PACKED_COLUMNS).isdisjoint(packed)
+    for name in ('timestamp_us', 'device_id', 'latitude', 'longitude', 'altitude', 'satellites'):
+        assert packed[name] == row[name]
+    assert packed[PACKED_COLUMN] == pack_values(row)
+
+def test_unpack_blobs_over_several_rows(make_rows):
+    rows = make_rows([START + timedelta(seconds=i) for i in range(5)])
+    rows[2]['sen0611_cct'] = None
+    columns = unpack_blobs([pack_values(row) for row in rows])
+    assert set(columns) == set(PACKED_COLUMNS)
+    for name in PACKED_COLUMNS:
+        assert columns[name].dtype == PACKED_DTYPE
+        assert len(columns[name]) == 5
+        assert not columns[name].flags.writeable
+    expected = [np.nan if row['sen0611_cct'] is None else _float32(row['sen0611_cct']) for row in rows]
+    np.testing.assert_array_equal(columns['sen0611_cct'], np.array(expected, dtype=PACKED_DTYPE))
+    assert columns['as7262_450nm'].tolist() == [_float32(row['as7262_450nm']) for row in rows]
+    assert all(len(values) == 0 for values in unpack_blobs([]).values())
+
+def test_gps_columns_stay_real(database, make_rows):
+    partitions.configure_partitioning('day')
+    partitions.configure_storage_layout('packed')
+    rows = make_rows([START + timedelta(hours=1)])
+    rows[0]['latitude'], rows[0]['longitude'] = 52.22970012345678, 21.01222871234567
+    insert_sensor_rows(rows)
+
+    name = partition_bounds(rows[0]['timestamp_us'])[0]
+    assert name.endswith('_packed')
+    with get_engine().connect() as conn:
+        types = {row[1]: row[2] for row in conn.execute(text(f'PRAGMA table_info("{name}")'))}
+        table = partition_table(name)
+        stored = conn.execute(select(table.c.latitude, table.c.longitude, table.c.altitude)).one()
+    assert types[PACKED_COLUMN] == 'BLOB'
+    assert all(types[column] == 'FLOAT' for column in ('latitude', 'longitude', 'altitude'))
+    assert set(PACKED_COLUMNS).isdisjoint(types)
+    # Współrzędne bez zaokrąglenia do float32
+    assert tuple(stored) == (rows[0]['latitude'], rows[0]['longitude'], rows[0]['altitude'])
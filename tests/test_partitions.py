@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import IntegrityError
+from database import partitions
+from database.db import create_db_engine, get_engine
+from database.operations import get_latest_readings, insert_sensor_rows, upsert_sensor_rows
+from database.partitions import (CATALOG, drop_partition, drop_partitions_before, insert_partitioned,
+                                 partition_bounds, partition_existing_rows)
+from database.query import count_rows, fetch_columns
+from database.timeutils import to_epoch_us
+
+START = datetime(2025, 1, 1)
+
+@pytest.fixture(params=['wide', 'packed'])
+def partitioned(database, request):
+    partitions.configure_partitioning('day')
+    partitions.configure_storage_layout(request.param)
+    return request.param
+
+def _catalog():
+    with get_engine().connect() as conn:
+        return {name: row_count for name, row_count in conn.execute(select(CATALOG.c.name, CATALOG.c.row_count))}
+
+def test_partition_bounds():
+    moment = to_epoch_us(datetime(2025, 1, 8, 13, 0))
+    name, start_us, end_us = partition_bounds(moment, 'day')
+    assert name == 'sensor_readings_20250108'
+    assert (start_us, end_us) == (to_epoch_us(datetime(2025, 1, 8)), to_epoch_us(datetime(2025, 1, 9)))
+    # Tygodnie zaczynają się w poniedziałek (2025-01-06)
+    name, start_us, _ = partition_bounds(moment, 'week')
+    assert name == 'sensor_readings_w20250106'
+    assert start_us == to_epoch_us(datetime(2025, 1, 6))
+    assert partition_bounds(moment, 'day', 'packed')[0] == 'sensor_readings_20250108_packed'
+
+def test_rows_are_routed_and_visible(partitioned, make_rows):
+    timestamps = [START + timedelta(hours=7 * i) for i in range(10)]
+    rows = make_rows(timestamps)
+    insert_sensor_rows(rows)
+
+    catalog = _catalog()
+    assert sum(catalog.values()) == 10
+    assert len(catalog) == 3
+    assert all(name.endswith('_packed') == (partitioned == 'packed') for name in catalog)
+    assert count_rows(START, START + timedelta(days=3)) == 10
+    data = fetch_columns(['timestamp', 'sen0611_cct'], START, START + timedelta(days=3))
+    assert data['timestamp'].astype('datetime64[us]').tolist() == timestamps
+    # Packed przechowuje pomiary jako float32
+    expected = [row['sen0611_cct'] for row in rows]
+    assert data['sen0611_cct'] == pytest.approx(expected, rel=1e-6)
+    assert [r.timestamp_us for r in get_latest_readings(limit=2)] == [
+        to_epoch_us(timestamps[-1]), to_epoch_us(timestamps[-2])
+    ]
+
+def test_rolled_back_batch_keeps_catalog_consistent(partitioned, make_rows):
+    insert_sensor_rows(make_rows([START + timedelta(hours=10)]))
+    # Nowa partycja tworzona w paczce, która zostaje wycofana (duplikat klucza)
+    duplicate = make_rows([START + timedelta(days=1, hours=10)])
+    with pytest.raises(IntegrityError):
+        insert_sensor_rows(duplicate + duplicate)
+
+    insert_sensor_rows(make_rows([START + timedelta(days=1, hours=11)]))
+    assert count_rows(START, START + timedelta(days=2)) == 2
+    name = partition_bounds(to_epoch_us(START + timedelta(days=1)))[0]
+    assert _catalog()[name] == 1
+
+def test_rollback_of_later_partition_in_batch(partitioned, make_rows):
+    # Druga partycja paczki powstaje już wewnątrz transakcji, więc także jej
+    # tabela jest wycofywana razem z paczką
+    first = make_rows([START + timedelta(hours=1)])
+    second = make_rows([START + timedelta(days=1, hours=1)])
+    with pytest.raises(IntegrityError):
+        insert_sensor_rows(first + second + second)
+
+    insert_sensor_rows(first + make_rows([START + timedelta(days=1, hours=2)]))
+    assert count_rows(START, START + timedelta(days=2)) == 2
+
+def test_upsert_into_partitions_is_idempotent(partitioned, make_rows):
+    rows = make_rows([START + timedelta(hours=5 * i) for i in range(12)])
+    assert upsert_sensor_rows(rows) == 12
+    assert upsert_sensor_rows(rows) == 0
+    assert sum(_catalog().values()) == 12
+
+def test_drop_partitions_before(partitioned, make_rows):
+    insert_sensor_rows(make_rows([START + timedelta(hours=12 * i) for i in range(6)]))
+    dropped = drop_partitions_before(START + timedelta(days=2))
+    assert sorted(dropped.values()) == [2, 2]
+    assert count_rows() == 2
+    tables = inspect(get_engine()).get_table_names()
+    assert not any(name in tables for name in dropped)
+
+    # Ponowny zapis do usuniętego dnia odtwarza partycję i wpis w katalogu
+    insert_sensor_rows(make_rows([START + timedelta(hours=3)]))
+    assert count_rows(START, START + timedelta(days=1)) == 1
+
+def test_partition_existing_rows_resumes_after_interruption(database, make_rows):
+    rows = make_rows([START + timedelta(hours=5 * i) for i in range(12)])
+    insert_sensor_rows(rows)
+    partitions.configure_partitioning('day')
+    # Przerwane przenoszenie: część odczytów jest już w partycjach, ale nadal w sensor_readings
+    with get_engine().begin() as conn:
+        insert_partitioned(conn, [dict(row) for row in rows[:5]])
+
+    assert partition_existing_rows(batch_size=4) == 12
+    assert count_rows() == 12
+    assert sum(_catalog().values()) == 12
+    assert partition_existing_rows() == 0
+
+def test_resume_after_layout_switch_skips_rows_in_other_layout(database, make_rows):
+    rows = make_rows([START + timedelta(hours=5 * i) for i in range(12)])
+    insert_sensor_rows(rows)
+    partitions.configure_partitioning('day')
+    with get_engine().begin() as conn:
+        insert_partitioned(conn, [dict(row) for row in rows[:5]])
+    # Przenoszenie wznowione po zmianie układu: odczyty z partycji wide tego
+    # samego dnia nie trafiają ponownie do partycji packed
+    partitions.configure_storage_layout('packed')
+    assert partition_existing_rows(batch_size=4) == 12
+    assert count_rows() == 12
+    assert sum(_catalog().values()) == 12
+
+def test_partition_dropped_elsewhere_is_recreated(partitioned, make_rows):
+    insert_sensor_rows(make_rows([START + timedelta(hours=1)]))
+    name = next(iter(_catalog()))
+    # Usunięcie partycji z pominięciem _known_partitions (jak przez inny proces)
+    other = create_db_engine(get_engine().url.render_as_string(hide_password=False))
+    try:
+        with other.begin() as conn:
+            drop_partition(conn, name)
+    finally:
+        other.dispose()
+    partitions._known_partitions.add(name)
+
+    insert_sensor_rows(make_rows([START + timedelta(hours=2)]))
+    assert _catalog() == {name: 1}
+    assert count_rows(START, START + timedelta(days=1)) == 1
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from database.db import get_engine
+from database.operations import get_latest_columns, insert_sensor_rows
+from database.query import fetch_columns, fetch_structured
+from database.schema import SensorReading
+from sqlalchemy import update
+
+START = datetime(2025, 5, 1)
+
+@pytest.fixture
+def readings(database, make_rows):
+    rows = make_rows([START + timedelta(minutes=i) for i in range(60)])
+    rows += make_rows([START + timedelta(minutes=i, seconds=30) for i in range(0, 60, 10)], 'field')
+    insert_sensor_rows(rows)
+    return sorted(rows, key=lambda row: row['timestamp_us'])
+
+def test_columns_have_numpy_dtypes(readings):
+    with get_engine().begin() as conn:
+        conn.execute(update(SensorReading.__table__)
+                     .where(SensorReading.__table__.c.timestamp_us == readings[0]['timestamp_us'])
+                     .values(tsl2591_lux=None))
+    data = fetch_columns(['timestamp', 'timestamp_us', 'device_id', 'tsl2591_lux'])
+    assert data['timestamp'].dtype == np.dtype('datetime64[us]')
+    assert data['timestamp_us'].dtype == np.int64
+    assert data['device_id'].dtype == object
+    assert data['tsl2591_lux'].dtype == np.float64
+    assert np.isnan(data['tsl2591_lux'][0])
+    assert data['timestamp_us'].tolist() == [row['timestamp_us'] for row in readings]
+    assert data['timestamp'].astype(np.int64).tolist() == data['timestamp_us'].tolist()
+    np.testing.assert_array_equal(data['tsl2591_lux'][1:], [row['tsl2591_lux'] for row in readings[1:]])
+
+def test_range_limit_and_device(readings):
+    end = START + timedelta(minutes=10)
+    assert len(fetch_columns(['timestamp_us'], START, end)['timestamp_us']) == 12
+    assert len(fetch_columns(['timestamp_us'], START, end, end_inclusive=False)['timestamp_us']) == 11
+    assert len(fetch_columns(['timestamp_us'], START, end, device_id='field')['timestamp_us']) == 1
+
+    oldest = fetch_columns(['timestamp_us'], limit=3)['timestamp_us']
+    latest = fetch_columns(['timestamp_us'], limit=3, latest=True)['timestamp_us']
+    assert oldest.tolist() == [row['timestamp_us'] for row in readings[:3]]
+    # Najnowsze wiersze, nadal rosnąco po czasie
+    assert latest.tolist() == [row['timestamp_us'] for row in readings[-3:]]
+    assert get_latest_columns(['timestamp_us'], 3)['timestamp_us'].tolist() == latest.tolist()
+
+def test_structured_and_empty_results(readings):
+    structured = fetch_structured(['timestamp_us', 'sen0611_cct'], START, START + timedelta(minutes=4))
+    assert structured.dtype.names == ('timestamp_us', 'sen0611_cct')
+    assert len(structured) == 6
+    empty = fetch_columns(['timestamp', 'sen0611_cct'], START - timedelta(days=1), START - timedelta(hours=1))
+    assert len(empty['timestamp']) == 0 and empty['timestamp'].dtype == np.dtype('datetime64[us]')
+
+def test_unknown_column(readings):
+    with pytest.raises(ValueError):
+        fetch_columns(['not_a_column'])
@@ -0,0 +1,86 @@
+import math
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete
+from database.db import get_engine
+from database.operations import insert_sensor_rows
+from database.query import fetch_columns
+from database.rollups import (aggregate_readings, aggregate_statistics, get_rollup_statistics,
+                              get_rollup_statistics_by_bucket, rebuild_rollups)
+from database.schema import ROLLUP_COLUMNS, ROLLUP_TABLES
+from database.timeutils import to_epoch_us
+
+START = datetime(2025, 3, 1)
+
+@pytest.fixture
+def readings(database, make_rows):
+    """Dwa urządzenia, trzy doby odczytów co 7 minut."""
+    timestamps = [START + timedelta(minutes=7 * i) for i in range(3 * 24 * 60 // 7)]
+    insert_sensor_rows(make_rows(timestamps, 'lab') + make_rows(timestamps[::2], 'field'))
+    return timestamps
+
+def _raw_statistics(start, end, device_id=None):
+    data = fetch_columns(ROLLUP_COLUMNS, start, end, end_inclusive=False, device_id=device_id)
+    return {
+        name: {
+            'min': values.min(), 'max': values.max(), 'mean': values.mean(),
+            'std': values.std(ddof=1), 'count': len(values)
+        }
+        for name, values in data.items()
+    }
+
+def _assert_matches(stats, expected):
+    for name, column in expected.items():
+        assert stats[name]['count'] == column['count']
+        for key in ('min', 'max', 'mean', 'std'):
+            assert stats[name][key] == pytest.approx(column[key], rel=1e-9), (name, key)
+
+@pytest.mark.parametrize('start, end', [
+    (START, START + timedelta(days=3)),                                   # rollup 1d
+    (START + timedelta(hours=5), START + timedelta(hours=29)),            # rollup 1h
+    (START + timedelta(minutes=13), START + timedelta(hours=2, minutes=31)),  # rollup 1m
+])
+def test_rollup_statistics_match_raw_readings(readings, start, end):
+    _assert_matches(get_rollup_statistics(start, end, ROLLUP_COLUMNS), _raw_statistics(start, end))
+
+def test_rollup_statistics_per_device(readings):
+    end = START + timedelta(days=2)
+    for device_id in ('lab', 'field'):
+        stats = get_rollup_statistics(START, end, ROLLUP_COLUMNS, device_id)
+        _assert_matches(stats, _raw_statistics(START, end, device_id))
+
+def test_unaligned_window_has_no_rollup(readings):
+    start = START + timedelta(seconds=30)
+    assert get_rollup_statistics(start, start + timedelta(hours=1), ROLLUP_COLUMNS) is None
+
+def test_sql_aggregates_match_raw_readings(readings):
+    start = START + timedelta(seconds=30)
+    end = START + timedelta(days=1, hours=3, seconds=17)
+    total = aggregate_readings(start, end)[to_epoch_us(start)]
+    _assert_matches(aggregate_statistics(total, ROLLUP_COLUMNS), _raw_statistics(start, end))
+
+def test_daily_buckets_match_raw_readings(readings):
+    days = get_rollup_statistics_by_bucket(START, START + timedelta(days=3), ROLLUP_COLUMNS, '1d')
+    assert list(days) == [START + timedelta(days=day) for day in range(3)]
+    for day, stats in days.items():
+        _assert_matches(stats, _raw_statistics(day, day + timedelta(days=1)))
+
+def test_rebuild_restores_rollups(readings):
+    end = START + timedelta(days=3)
+    before = get_rollup_statistics(START, end, ROLLUP_COLUMNS)
+    with get_engine().begin() as conn:
+        for table in ROLLUP_TABLES.values():
+            conn.execute(delete(table))
+    assert get_rollup_statistics(START, end, ROLLUP_COLUMNS)['count'] == 0
+
+    rebuild_rollups()
+    after = get_rollup_statistics(START, end, ROLLUP_COLUMNS)
+    assert after['count'] == before['count']
+    for name in ROLLUP_COLUMNS:
+        for key in ('min', 'max', 'mean', 'std'):
+            assert after[name][key] == pytest.approx(before[name][key], rel=1e-9)
+
+def test_empty_window_statistics(database):
+    stats = get_rollup_statistics(START, START + timedelta(days=1), ROLLUP_COLUMNS)
+    assert stats['count'] == 0
+    assert math.isnan(stats['sen0611_cct']['mean'])
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete
+from database import partitions
+from database.archive import archive_before
+from database.db import get_engine
+from database.operations import insert_sensor_rows
+from database.query import fetch_columns
+from database.schema import ROLLUP_TABLES
+from services.analysis import STATISTICS_COLUMNS, SensorAnalysis
+
+START = datetime(2025, 4, 7)
+DAYS = 4
+
+@pytest.fixture(params=['wide', 'packed'])
+def readings(database, make_rows, request):
+    """Cztery doby w partycjach dziennych; pierwsza w archiwum."""
+    partitions.configure_partitioning('day')
+    partitions.configure_storage_layout(request.param)
+    insert_sensor_rows(make_rows([START + timedelta(minutes=11 * i) for i in range(DAYS * 1440 // 11)]))
+    insert_sensor_rows(make_rows([START + timedelta(minutes=11 * i + 5) for i in range(200)], 'field'))
+    archive_before(START + timedelta(days=1))
+
+def _expected(start, end, device_id=None):
+    data = fetch_columns(list(STATISTICS_COLUMNS.values()), start, end, end_inclusive=False, device_id=device_id)
+    return {
+        metric: {'min': data[column].min(), 'max': data[column].max(),
+                 'mean': data[column].mean(), 'std': data[column].std(ddof=1)}
+        for metric, column in STATISTICS_COLUMNS.items()
+    }
+
+def _assert_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for metric, values in expected.items():
+        for key, value in values.items():
+            assert actual[metric][key] == pytest.approx(value, rel=1e-6), (metric, key)
+
+@pytest.mark.parametrize('offsets', [
+    (timedelta(hours=3, minutes=17), timedelta(days=2, hours=5, minutes=3)),   # surowe agregaty
+    (timedelta(hours=20), timedelta(days=1, hours=2)),                          # rollup 1h
+])
+def test_statistics_across_archive_and_partitions(readings, offsets):
+    start, end = START + offsets[0], START + offsets[1]
+    _assert_equal(SensorAnalysis.get_statistics(start, end), _expected(start, end))
+    _assert_equal(SensorAnalysis.get_statistics(start, end, 'field'), _expected(start, end, 'field'))
+
+def test_statistics_by_day_matches_daily_statistics(readings):
+    # Okno jest rozszerzane do pełnych dni po obu stronach
+    by_day = SensorAnalysis.get_statistics_by_day(START + timedelta(hours=6), START + timedelta(days=DAYS - 1, hours=1))
+    assert list(by_day) == [START + timedelta(days=day) for day in range(DAYS)]
+    for day, stats in by_day.items():
+        _assert_equal(stats, SensorAnalysis.get_daily_statistics(day))
+        _assert_equal(stats, _expected(day, day + timedelta(days=1)))
+
+def test_statistics_by_day_without_rollups(readings):
+    expected = SensorAnalysis.get_statistics_by_day(START, START + timedelta(days=DAYS))
+    with get_engine().begin() as conn:
+        conn.execute(delete(ROLLUP_TABLES['1d']))
+    fallback = SensorAnalysis.get_statistics_by_day(START, START + timedelta(days=DAYS))
+    assert list(fallback) == list(expected)
+    for day in expected:
+        _assert_equal(fallback[day], expected[day])
+
+def test_empty_window(readings):
+    assert SensorAnalysis.get_statistics(START - timedelta(days=2), START - timedelta(days=1, minutes=1)) == {}
+    assert SensorAnalysis.get_statistics_by_day(START - timedelta(days=3), START) == {}
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import inspect, select, text
+from database import db
+from database.db import get_engine, get_session
+from database.operations import insert_sensor_rows
+from database.query import count_rows
+from database.schema import SensorReading
+from database.timeutils import from_epoch_us, to_epoch_us
+
+READINGS = SensorReading.__table__
+
+def test_epoch_us_round_trip():
+    moment = datetime(2025, 3, 1, 12, 30, 15, 123456)
+    assert to_epoch_us(datetime(1970, 1, 1)) == 0
+    assert from_epoch_us(to_epoch_us(moment)) == moment
+    # Wartości ze strefą czasową są przeliczane na UTC
+    assert to_epoch_us(datetime(2025, 3, 1, 14, 30, 15, 123456, tzinfo=timezone(timedelta(hours=2)))) == \
+        to_epoch_us(moment)
+
+def test_orm_insert_fills_timestamp_us(database):
+    moment = datetime(2025, 3, 1, 8, 0, 0, 250000)
+    session = get_session()
+    try:
+        session.add(SensorReading(timestamp=moment, sen0611_cct=5000.0))
+        session.commit()
+    finally:
+        session.close()
+    with get_engine().connect() as conn:
+        assert conn.execute(select(READINGS.c.timestamp_us)).scalar() == to_epoch_us(moment)
+
+def test_migration_backfills_timestamp_us(database, make_rows):
+    start = datetime(2025, 3, 1, 0, 0, 0, 1)
+    rows = make_rows([start + timedelta(seconds=90 * i, microseconds=7 * i) for i in range(20)])
+    insert_sensor_rows(rows)
+    with get_engine().begin() as conn:
+        conn.execute(text("UPDATE sensor_readings SET timestamp_us = NULL"))
+    assert count_rows(start, start + timedelta(hours=1)) == 0
+
+    db.init_db()
+    with get_engine().connect() as conn:
+        restored = [row[0] for row in conn.execute(select(READINGS.c.timestamp_us).order_by(READINGS.c.id))]
+    assert restored == [row['timestamp_us'] for row in rows]
+    assert count_rows(start, start + timedelta(hours=1)) == 20
+    indexes = {index['name'] for index in inspect(get_engine()).get_indexes('sensor_readings')}
+    assert 'ix_sensor_readings_timestamp_us' in indexes
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from database.histograms import get_histograms
+from database.operations import (insert_sensor_rows, save_sensor_reading, save_sensor_readings_bulk,
+                                 upsert_sensor_rows)
+from database.query import count_rows
+from database.rollups import get_rollup_statistics
+from database.schema import ROLLUP_COLUMNS
+
+START = datetime(2025, 2, 1)
+
+def _state():
+    end = START + timedelta(days=1)
+    return (
+        count_rows(START, end, end_inclusive=False),
+        get_rollup_statistics(START, end, ROLLUP_COLUMNS)['count'],
+        int(get_histograms(['sen0611_cct'], START, end)['sen0611_cct']['counts'].sum())
+    )
+
+def test_upsert_is_idempotent(database, make_rows):
+    rows = make_rows([START + timedelta(minutes=i) for i in range(50)])
+    assert upsert_sensor_rows(rows) == 50
+    state = _state()
+    assert state == (50, 50, 50)
+
+    # Powtórka całej paczki i paczka mieszana: zapisywane są tylko nowe klucze
+    assert upsert_sensor_rows([dict(row) for row in rows]) == 0
+    more = make_rows([START + timedelta(minutes=50 + i) for i in range(10)])
+    assert upsert_sensor_rows([dict(row) for row in rows[:5]] + more) == 10
+    assert _state() == (60, 60, 60)
+
+def test_duplicates_within_batch(database, make_rows):
+    rows = make_rows([START, START + timedelta(seconds=1)])
+    assert upsert_sensor_rows(rows + [dict(rows[0])]) == 2
+    assert count_rows() == 2
+
+def test_same_time_on_different_devices(database, make_rows):
+    rows = make_rows([START], 'lab') + make_rows([START], 'field')
+    assert upsert_sensor_rows(rows) == 2
+    assert count_rows(device_id='lab') == 1
+    assert count_rows(device_id='field') == 1
+
+def test_public_save_functions_skip_duplicates(database, make_readings):
+    readings = make_readings([START + timedelta(seconds=i) for i in range(3)])
+    save_sensor_reading(readings[0])
+    save_sensor_reading(readings[0])
+    assert save_sensor_readings_bulk(readings + readings[1:2]) == 2
+    assert count_rows() == 3
+
+def test_insert_rejects_whole_batch_on_duplicate(database, make_rows):
+    rows = make_rows([START, START + timedelta(seconds=1)])
+    insert_sensor_rows(rows[:1])
+    with pytest.raises(IntegrityError):
+        insert_sensor_rows([dict(row) for row in rows])
+    assert count_rows() == 1
+    assert get_rollup_statistics(START, START + timedelta(days=1), ROLLUP_COLUMNS)['count'] == 1
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from database.operations import insert_sensor_rows
+from services import visualization
+from services.visualization import ColumnRingBuffer, RealTimeVisualizer
+
+START = datetime(2025, 10, 1, 12)
+
+class _Root:
+    """Okno Tk zastępowane w testach (brak wyświetlacza)."""
+
+    def title(self, text):
+        pass
+
+class _Canvas(FigureCanvasAgg):
+    """Płótno Agg z interfejsem FigureCanvasTkAgg; liczy pełne rysowania i blity."""
+
+    def __init__(self, figure, master=None):
+        super().__init__(figure)
+        self.draws = 0
+        self.blits = 0
+
+    def draw(self):
+        self.draws += 1
+        super().draw()
+
+    def blit(self, bbox=None):
+        self.blits += 1
+
+    def get_tk_widget(self):
+        return self
+
+    def pack(self, **kwargs):
+        pass
+
+@pytest.fixture
+def make_visualizer(database, monkeypatch):
+    monkeypatch.setattr(visualization.tk, 'Tk', _Root)
+    monkeypatch.setattr(visualization, 'FigureCanvasTkAgg', _Canvas)
+    created = []
+
+    def factory(**kwargs) -> RealTimeVisualizer:
+        created.append(RealTimeVisualizer(**kwargs))
+        return created[-1]
+
+    yield factory
+    for viz in created:
+        visualization.plt.close(viz.fig)
+
+@pytest.fixture
+def visualizer(make_visualizer):
+    return make_visualizer(window=50)
+
+def _insert(make_rows, first: int, count: int):
+    rows = make_rows([START + timedelta(seconds=first + i) for i in range(count)])
+    insert_sensor_rows(rows)
+    return rows
+
+def test_ring_buffer_wraps_around():
+    buffer = ColumnRingBuffer(5, {'a': np.dtype(np.int64)})
+    assert buffer.view('a').tolist() == []
+    buffer.extend({'a': np.arange(3)})
+    buffer.extend({'a': np.arange(3, 7)})
+    assert buffer.size == 5
+    assert buffer.view('a').tolist() == [2, 3, 4, 5, 6]
+    assert buffer.view('a', 2).tolist() == [5, 6]
+    # Ostatnie wiersze są ciągłym widokiem tablicy, bez kopii
+    assert np.shares_memory(buffer.view('a'), buffer._arrays['a'])
+    # Paczka większa niż pojemność zostawia tylko najnowsze wiersze
+    buffer.extend({'a': np.arange(100, 112)})
+    assert buffer.view('a').tolist() == [107, 108, 109, 110, 111]
+    expected = list(range(107, 112))
+    for start in range(0, 23, 3):
+        buffer.extend({'a': np.arange(start, start + 3)})
+        expected = (expected + list(range(start, start + 3)))[-5:]
+        assert buffer.view('a').tolist() == expected
+
+def test_poll_fetches_only_new_readings(visualizer, make_rows):
+    rows = _insert(make_rows, 0, 80)
+    assert visualizer.poll() == 50
+    assert visualizer.buffer.view('timestamp_us').tolist() == [row['timestamp_us'] for row in rows[-50:]]
+    assert visualizer.poll() == 0
+
+    rows += _insert(make_rows, 80, 7)
+    assert visualizer.poll() == 7
+    assert visualizer.buffer.view('timestamp_us').tolist() == [row['timestamp_us'] for row in rows[-50:]]
+    assert visualizer.buffer.view('sen0611_cct').tolist() == pytest.approx([row['sen0611_cct'] for row in rows[-50:]])
+    # Odczyt spóźniony o więcej niż late_lookback nie jest dociągany
+    _insert(make_rows, -10, 1)
+    assert visualizer.poll() == 0
+
+def test_poll_picks_up_same_timestamp_and_late_readings(visualizer, make_rows):
+    rows = _insert(make_rows, 0, 10)
+    assert visualizer.poll() == 10
+    # Inne urządzenie z czasem ostatniego widzianego odczytu
+    other = make_rows([START + timedelta(seconds=9)], device_id='sensor-2')
+    insert_sensor_rows(other)
+    assert visualizer.poll() == 1
+    # Odczyt spóźniony o mniej niż late_lookback trafia na swoje miejsce
+    late = make_rows([START + timedelta(seconds=4, milliseconds=500)])
+    insert_sensor_rows(late)
+    assert visualizer.poll() == 1
+    assert visualizer.poll() == 0
+    expected = sorted(rows + other + late, key=lambda row: row['timestamp_us'])
+    assert visualizer.buffer.view('timestamp_us').tolist() == [row['timestamp_us'] for row in expected]
+    assert visualizer.buffer.view('device_id').tolist() == [row['device_id'] for row in expected]
+
+def test_frames_reuse_artists_and_blit(visualizer, make_rows):
+    canvas = visualizer.canvas
+    _insert(make_rows, 0, 40)
+    artists = visualizer.update_plots()
+    assert canvas.draws == 2  # pierwsze rysowanie w __init__ i nowe osie w pierwszej klatce
+    assert visualizer.cct_line.get_xydata().shape == (40, 2)
+
+    # Brak nowych odczytów: bez rysowania i bez klatki
+    assert visualizer.update_plots() == artists
+    assert visualizer.get_frame_stats()['frames'] == 1
+
+    # Nowe odczyty w granicach osi: tylko blit, ci sami artyści
+    _insert(make_rows, 40, 2)
+    visualizer.ax1.set_ylim(0, 1e6)
+    visualizer.ax2.set_ylim(0, 1e6)
+    visualizer.ax4.set_ylim(-100, 1e3)
+    visualizer.ax3.set_ylim(0, 1e6)
+    canvas.draw()
+    draws = canvas.draws
+    new_artists = visualizer.update_plots()
+    assert all(a is b for a, b in zip(new_artists, artists))
+    assert canvas.draws == draws
+    assert canvas.blits == 1
+    assert visualizer.cct_line.get_xydata().shape == (42, 2)
+    assert visualizer.frame_text.get_text().startswith('klatka ')
+    stats = visualizer.get_frame_stats()
+    assert (stats['frames'], stats['full_redraws']) == (2, 1)
+
+def test_window_span_sets_buffer_capacity(make_visualizer, make_rows):
+    now = datetime.utcnow().replace(microsecond=0)
+    rows = make_rows([now - timedelta(seconds=30 * i) for i in range(1, 400)][::-1])
+    insert_sensor_rows(rows)
+    # 24 h przy 1 odczycie/s: bufor mieści cały okres, a nie PLOT_WINDOW odczytów
+    viz = make_visualizer(window_span=timedelta(hours=24))
+    assert viz.buffer.capacity == 86400
+    assert viz.poll() == 399
+    assert viz.buffer.view('timestamp_us').tolist() == [row['timestamp_us'] for row in rows]
+
+def test_window_span_that_does_not_fit_raises(make_visualizer):
+    with pytest.raises(ValueError):
+        make_visualizer(window=100, window_span=timedelta(hours=1))
+    with pytest.raises(ValueError):
+        make_visualizer(window_span=timedelta(days=365), sample_rate=10.0)
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import insert
+from database import db
+from database.db import create_db_engine, get_engine
+from database.operations import insert_sensor_rows
+from database.query import fetch_columns
+from database.schema import SensorReading
+from database.window_cache import WindowCache, get_window_cache, invalidate_window_cache
+
+COLUMNS = ['timestamp', 'sen0611_cct']
+
+@pytest.fixture
+def now():
+    return datetime.utcnow().replace(microsecond=0)
+
+@pytest.fixture
+def history(database, make_rows, now):
+    """Odczyty co 10 s z ostatnich 3 godzin."""
+    insert_sensor_rows(make_rows([now - timedelta(seconds=10 * i) for i in range(1, 3 * 360)]))
+
+def _assert_same(cached, expected):
+    for name in COLUMNS:
+        np.testing.assert_array_equal(cached[name], expected[name])
+
+def test_repeated_window_is_served_from_memory(history, now):
+    cache = WindowCache(settle_seconds=0)
+    start, end = now - timedelta(hours=2), now - timedelta(hours=1)
+    first = cache.fetch_columns(COLUMNS, start, end)
+    # Okno zawarte we wpisie: wycinek bez zapytania
+    second = cache.fetch_columns(COLUMNS, start + timedelta(minutes=10), end - timedelta(minutes=10))
+    assert cache.get_stats()['hits'] == 1
+    _assert_same(first, fetch_columns(COLUMNS, start, end))
+    _assert_same(second, fetch_columns(COLUMNS, start + timedelta(minutes=10), end - timedelta(minutes=10)))
+    assert not first['sen0611_cct'].flags.writeable
+
+def test_sliding_window_extends_and_trims_entry(history, now):
+    cache = WindowCache(settle_seconds=0)
+    sizes = []
+    for step in range(6):
+        end = now - timedelta(hours=1) + timedelta(minutes=5 * step)
+        start = end - timedelta(hours=1)
+        _assert_same(cache.fetch_columns(COLUMNS, start, end), fetch_columns(COLUMNS, start, end))
+        sizes.append(cache.get_stats()['rows'])
+    # Wpis jest rozszerzany o koniec okna i przycinany do jego początku
+    assert cache.get_stats()['entries'] == 1
+    assert max(sizes) - min(sizes) <= 1
+
+def test_single_entry_respects_max_rows(history, now):
+    cache = WindowCache(max_rows=100, settle_seconds=0)
+    data = cache.fetch_columns(COLUMNS, now - timedelta(hours=2), now - timedelta(hours=1))
+    assert len(data['timestamp']) > 100
+    assert cache.get_stats()['entries'] == 0
+
+def test_writes_in_process_are_appended(history, make_rows, now):
+    cache = get_window_cache()
+    start, end = now - timedelta(hours=2), now - timedelta(minutes=10)
+    before = len(cache.fetch_columns(COLUMNS, start, end)['timestamp'])
+    hits = cache.get_stats()['hits']
+    # Spóźnione odczyty trafiają do wpisu przez słuchacza zapisu, w kolejności czasu
+    insert_sensor_rows(make_rows([now - timedelta(minutes=30, seconds=5), now - timedelta(hours=1, seconds=5)]))
+    data = cache.fetch_columns(COLUMNS, start, end)
+    assert cache.get_stats()['hits'] == hits + 1
+    assert len(data['timestamp']) == before + 2
+    _assert_same(data, fetch_columns(COLUMNS, start, end))
+
+def test_invalidate_clears_entries(history, now):
+    cache = get_window_cache()
+    cache.fetch_columns(COLUMNS, now - timedelta(hours=2), now - timedelta(hours=1))
+    assert cache.get_stats()['entries'] == 1
+    invalidate_window_cache()
+    assert cache.get_stats()['entries'] == 0
+
+def test_recent_tail_sees_writes_from_other_processes(history, make_rows, now):
+    cache = WindowCache(settle_seconds=60)
+    start = now - timedelta(hours=1)
+    cache.fetch_columns(COLUMNS, start, now)
+    # Zapis z pominięciem słuchaczy (jak z innego procesu) w ostatniej minucie
+    with get_engine().begin() as conn:
+        conn.execute(insert(SensorReading.__table__), make_rows([now - timedelta(seconds=15)]))
+    data = cache.fetch_columns(COLUMNS, start, now)
+    assert np.datetime64(now - timedelta(seconds=15)) in data['timestamp']
+    _assert_same(data, fetch_columns(COLUMNS, start, now))
+
+def test_old_rows_from_another_engine_drop_entry(history, make_rows, now):
+    cache = WindowCache(settle_seconds=60)
+    start, end = now - timedelta(hours=2), now - timedelta(hours=1)
+    before = len(cache.fetch_columns(COLUMNS, start, end)['timestamp'])
+    # Spóźniony odczyt sprzed settle_seconds zapisany przez osobny silnik (jak inny proces)
+    other = create_db_engine(get_engine().url.render_as_string(hide_password=False))
+    try:
+        with other.begin() as conn:
+            conn.execute(insert(SensorReading.__table__), make_rows([now - timedelta(hours=1, minutes=30, seconds=5)]))
+    finally:
+        other.dispose()
+    data = cache.fetch_columns(COLUMNS, start, end)
+    assert cache.get_stats()['stale'] == 1
+    assert len(data['timestamp']) == before + 1
+    _assert_same(data, fetch_columns(COLUMNS, start, end))
+
+def test_unrelated_commit_keeps_entry(history, make_rows, now):
+    cache = WindowCache(settle_seconds=60)
+    start, end = now - timedelta(hours=2), now - timedelta(hours=1)
+    cache.fetch_columns(COLUMNS, start, end)
+    # Zapis poza przedziałem wpisu zmienia data_version, ale nie liczbę odczytów wpisu
+    with get_engine().begin() as conn:
+        conn.execute(insert(SensorReading.__table__), make_rows([now - timedelta(seconds=5)]))
+    cache.fetch_columns(COLUMNS, start, end)
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['stale'] == 0
+
+def test_entries_expire_after_max_age(history, now):
+    cache = WindowCache(settle_seconds=0, max_age_seconds=0)
+    start, end = now - timedelta(hours=2), now - timedelta(hours=1)
+    cache.fetch_columns(COLUMNS, start, end)
+    cache.fetch_columns(COLUMNS, start, end)
+    assert cache.get_stats()['hits'] == 0
+    assert cache.get_stats()['misses'] == 2
+
+def test_configure_engine_clears_entries(history, tmp_path, now):
+    cache = get_window_cache()
+    cache.fetch_columns(COLUMNS, now - timedelta(hours=2), now - timedelta(hours=1))
+    assert cache.get_stats()['entries'] == 1
+    db.configure_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    db.init_db()
+    assert cache.get_stats()['entries'] == 0
+    assert len(cache.fetch_columns(COLUMNS, now - timedelta(hours=2), now - timedelta(hours=1))['timestamp']) == 0
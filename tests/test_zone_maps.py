@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import delete
+from database import db, partitions
+from database.archive import archive_before
+from database.operations import insert_sensor_rows
+from database.query import fetch_columns, fetch_matching, matching_sources
+from database.zonemaps import ZONES, may_match, partition_zone_maps, validate_predicates
+
+START = datetime(2025, 1, 13)
+COLUMNS = ['timestamp_us', 'tsl2591_lux', 'sen0611_cct']
+
+@pytest.fixture
+def readings(database, make_rows):
+    """Cztery doby; natężenie światła rośnie z dniem, doba 0 w archiwum."""
+    partitions.configure_partitioning('day')
+    rows = make_rows([START + timedelta(minutes=20 * i) for i in range(4 * 72)])
+    for i, row in enumerate(rows):
+        day = i // 72
+        row['tsl2591_lux'] = 10000.0 * day + (i % 72) * 10.0
+        if i % 9 == 0:
+            row['sen0611_cct'] = None
+    insert_sensor_rows(rows)
+    archive_before(START + timedelta(days=1))
+    return rows
+
+@pytest.mark.parametrize('predicate, expected', [
+    (('tsl2591_lux', '>', 20.0), False),
+    (('tsl2591_lux', '>=', 20.0), True),
+    (('tsl2591_lux', '<', 10.0), False),
+    (('tsl2591_lux', '<=', 10.0), True),
+    (('tsl2591_lux', '==', 15.0), True),
+    (('tsl2591_lux', 'between', (21.0, 30.0)), False),
+    (('tsl2591_lux', 'outside', (10.0, 20.0)), False),
+    (('tsl2591_lux', 'outside', (11.0, 20.0)), True),
+])
+def test_may_match(predicate, expected):
+    zone_map = {'tsl2591_lux': {'min': 10.0, 'max': 20.0, 'count': 5, 'null_count': 0}}
+    assert may_match(zone_map, [predicate]) is expected
+    assert may_match(None, [predicate])
+
+def test_all_null_zone_never_matches():
+    assert not may_match({'sen0611_cct': {'min': None, 'max': None, 'count': 0, 'null_count': 3}},
+                         [('sen0611_cct', '>', 0.0)])
+
+def test_invalid_predicates():
+    for predicates in ([('device_id', '==', 'a')], [('tsl2591_lux', '!=', 1.0)],
+                       [('tsl2591_lux', 'between', (1.0,))]):
+        with pytest.raises(ValueError):
+            validate_predicates(predicates)
+
+@pytest.mark.parametrize('predicates', [
+    [('tsl2591_lux', '>', 25000.0)],
+    [('tsl2591_lux', 'between', (100.0, 10300.0)), ('sen0611_cct', '<', 6000.0)],
+    [('tsl2591_lux', 'outside', (200.0, 30000.0))],
+])
+def test_fetch_matching_equals_full_scan(readings, predicates):
+    data = fetch_columns(COLUMNS)
+    mask = np.ones(len(data['timestamp_us']), dtype=bool)
+    for column, op, value in predicates:
+        values = data[column]
+        with np.errstate(invalid='ignore'):
+            mask &= {
+                '>': lambda: values > value,
+                '<': lambda: values < value,
+                'between': lambda: (values >= value[0]) & (values <= value[1]),
+                'outside': lambda: (values < value[0]) | (values > value[1]),
+            }[op]()
+    result = fetch_matching(COLUMNS, predicates)
+    assert mask.any()
+    assert result['timestamp_us'].tolist() == data['timestamp_us'][mask].tolist()
+
+def test_pruning_skips_segments_and_partitions(readings):
+    segments, tables = matching_sources([('tsl2591_lux', '>', 25000.0)])
+    assert segments == []
+    assert [table.name for table in tables] == ['sensor_readings', 'sensor_readings_20250116']
+
+    segments, tables = matching_sources([('tsl2591_lux', '<', 500.0)])
+    assert len(segments) == 1
+    assert [table.name for table in tables] == ['sensor_readings']
+
+def test_init_db_backfills_missing_zone_maps(readings):
+    with db.get_engine().connect() as conn:
+        expected = partition_zone_maps(conn, ['sensor_readings_20250114', 'sensor_readings_20250115'])
+    with db.get_engine().begin() as conn:
+        conn.execute(delete(ZONES))
+    db.init_db()
+    with db.get_engine().connect() as conn:
+        restored = partition_zone_maps(conn, list(expected))
+    assert restored == expected
+    assert restored['sensor_readings_20250114']['sen0611_cct']['null_count'] == 8